@@ -2,21 +2,39 @@ import streamlit as st
 import pandas as pd
 import datetime
 import os
-import math
 import time
 import urllib.parse
 import uuid
 import re
 import html as _html
-from korean_lunar_calendar import KoreanLunarCalendar
+import hashlib
+import concurrent.futures
+import base64
+import json
+import functools
+import importlib.util
+import itertools
+import threading
+import sqlite3
+import asyncio
+import queue
+import csv
+import glob
+import atexit
+from contextlib import closing, nullcontext
+from collections import defaultdict
 from io import BytesIO
+from engine import (
+    DATA_PATH, ELEMENTS, TAG_TO_KEYWORDS, ELEMENT_KEYWORDS, GENDER_FILTER_OPTIONS, BRAND_FILTER_OPTIONS,
+    safe_text, get_real_saju_elements, compute_perfume_element_vector, compute_compatibility_score,
+    load_catalogue_frame, recommend_rows, recommendation_frame, build_retriever, _data_signature,
+    normalize_text, normalize_brand, PerfumeIndex, find_perfume_in_db, perfume_notes_messages,
+)
+import metrics
+import profiling
 
-# OpenAI SDK
-try:
-    from openai import OpenAI
-    OPENAI_SDK_AVAILABLE = True
-except Exception:
-    OPENAI_SDK_AVAILABLE = False
+# OpenAI SDK: import 비용이 커서(수백 ms) 설치 여부만 보고, 실제 import 는 첫 LLM 호출 때 한다
+OPENAI_SDK_AVAILABLE = importlib.util.find_spec("openai") is not None
 
 
 # =========================================================
@@ -178,75 +196,134 @@ div[data-baseweb="tab-panel"] { padding-top: 10px; }
 # 1) 경로 / 상수 / OpenAI 설정
 # =========================================================
 base_dir = os.path.dirname(os.path.abspath(__file__))
-# 🚨 [수정 완료] 최신 DB 파일명으로 변경
-DATA_PATH = os.path.join(base_dir, "fatescent_master_db_v2_fixed.csv")
-LOG_PATH = os.path.join(base_dir, "recommendation_logs.csv")
+LOG_PATH = os.path.join(base_dir, "recommendation_logs.csv")  # 예전 CSV 로그 (저장소로 한 번 옮김)
+LOG_DB_PATH = os.path.join(base_dir, "recommendation_logs.sqlite3")
+NOTES_CACHE_PATH = os.path.join(base_dir, "ai_notes_cache.sqlite3")
+LLM_CACHE_PATH = os.path.join(base_dir, "llm_cache.sqlite3")
+
+FONT_DIR = os.path.join(base_dir, "assets", "fonts")
 
+APP_LINK = "[https://fate-scent-mvp.streamlit.app/](https://fate-scent-mvp.streamlit.app/)"
 SURVEY_BASE_URL = "https://docs.google.com/forms/d/e/1FAIpQLSfLuBSOMDSbph7vY3qfOeW-1yvFvKVnGIsWjkMBRZ8w-SdE5w/viewform?usp=pp_url&entry.1954804504="
 
-ELEMENTS = ["Wood", "Fire", "Earth", "Metal", "Water"]
 ELEMENTS_KO = {
     "Wood": "목(木/나무)", "Fire": "화(火/불)", "Earth": "토(土/흙)",
     "Metal": "금(金/쇠)", "Water": "수(水/물)"
 }
 ELEMENT_EMOJI = {"Wood": "🌳", "Fire": "🔥", "Earth": "🪨", "Metal": "⚙️", "Water": "💧"}
 
-TAG_TO_KEYWORDS = {
-    "꽃향기(플로럴)": ["floral", "rose", "jasmine", "white floral", "neroli", "ylang", "tuberose", "iris"],
-    "과일향(프루티)": ["fruity", "berry", "apple", "pear", "peach", "plum", "fig", "blackcurrant"],
-    "나무향(우디)": ["woody", "cedar", "sandalwood", "vetiver", "patchouli", "moss", "oud"],
-    "상큼한(시트러스)": ["citrus", "bergamot", "lemon", "orange", "grapefruit", "yuzu", "lime", "mandarin"],
-    "포근한(머스크)": ["musk", "white musk", "clean musk", "soft musk"],
-    "달콤한(앰버/바닐라)": ["amber", "vanilla", "tonka", "benzoin", "gourmand", "sweet"],
-    "시원한(아쿠아/마린)": ["aquatic", "marine", "sea", "sea salt", "watery", "ozonic"],
-    "스모키/가죽": ["smoky", "incense", "leather", "tobacco", "animalic"]
-}
-
-ELEMENT_KEYWORDS = {
-    "Wood": ["green", "herbal", "leafy", "tea", "vetiver", "pine", "grass"],
-    "Fire": ["citrus", "spicy", "warm spicy", "pepper", "ginger", "cinnamon", "rose"],
-    "Earth": ["woody", "musk", "amber", "powdery", "patchouli", "vanilla", "oud"],
-    "Metal": ["aldehyde", "mineral", "mint", "cool", "soapy", "white floral"],
-    "Water": ["aquatic", "marine", "sea", "watery", "ozonic", "salty"]
-}
-
-FAMOUS_BRANDS = [
-    "Jo Malone", "Diptyque", "Byredo", "Aesop", "Chanel", "Dior", "Clean",
-    "Forment", "Tamburins", "Nonfiction", "Le Labo", "Maison Francis Kurkdjian",
-    "Tom Ford", "Hermes", "Creed", "Penhaligon", "Acqua di Parma"
-]
-
 HAS_AI = False
-client = None
+OPENAI_API_KEY = None
 if OPENAI_SDK_AVAILABLE:
     try:
-        client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
+        OPENAI_API_KEY = st.secrets["OPENAI_API_KEY"]
         HAS_AI = True
     except Exception:
         HAS_AI = False
 
+# LLM 호출은 백그라운드 이벤트 루프 하나에서 AsyncOpenAI로 처리 (동시 호출 수 제한 + 호출별 타임아웃)
+LLM_MODEL = "gpt-4o-mini"
+LLM_TIMEOUT_SEC = 40
+LLM_MAX_CONCURRENCY = 8
+
+@st.cache_resource
+def llm_runtime():
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="llm-loop", daemon=True).start()
+    return {
+        "loop": loop,
+        "sem": asyncio.Semaphore(LLM_MAX_CONCURRENCY),
+        "client": None,
+        "lock": threading.Lock(),
+    }
+
+LLM_RT = llm_runtime()
+
+def llm_client():
+    """AsyncOpenAI 는 처음 필요할 때 import · 생성한다 (첫 화면 렌더링 전에 openai 를 올리지 않음)."""
+    if LLM_RT["client"] is None and HAS_AI:
+        with LLM_RT["lock"]:
+            if LLM_RT["client"] is None:
+                from openai import AsyncOpenAI
+                LLM_RT["client"] = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    return LLM_RT["client"]
+
+@st.cache_resource
+def warm_up_llm_client():
+    """첫 화면을 다 그린 뒤 백그라운드에서 openai import · 클라이언트 생성을 미리 해 둔다 (프로세스당 한 번)."""
+    if HAS_AI:
+        threading.Thread(target=llm_client, name="llm-client-warmup", daemon=True).start()
+    return True
+
+def submit_llm(coro):
+    """코루틴을 LLM 루프에 올리고 concurrent.futures.Future 반환 (취소는 future.cancel())."""
+    return asyncio.run_coroutine_threadsafe(coro, LLM_RT["loop"])
+
+def run_llm(coro):
+    fut = submit_llm(coro)
+    try:
+        return fut.result()
+    except BaseException:
+        fut.cancel()
+        raise
+
+async def _achat_stream(messages, temperature, on_delta):
+    """stream=True 응답 조각을 on_delta로 넘기고 (전체 텍스트, 토큰 수) 반환."""
+    async def _consume():
+        parts, tokens = [], 0
+        stream = await llm_client().chat.completions.create(
+            model=LLM_MODEL, messages=messages, temperature=temperature,
+            stream=True, stream_options={"include_usage": True}
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                on_delta(chunk.choices[0].delta.content)
+            if getattr(chunk, "usage", None):
+                tokens = int(chunk.usage.total_tokens or 0)
+        return "".join(parts), tokens
+
+    async with LLM_RT["sem"]:
+        return await asyncio.wait_for(_consume(), LLM_TIMEOUT_SEC)
+
+async def _achat(messages, temperature, max_tokens=None):
+    kwargs = {"model": LLM_MODEL, "messages": messages, "temperature": temperature}
+    if max_tokens is not None:
+        kwargs["max_tokens"] = max_tokens
+    async with LLM_RT["sem"]:
+        return await asyncio.wait_for(llm_client().chat.completions.create(**kwargs), LLM_TIMEOUT_SEC)
+
+# 단계별 계측 (metrics.py): FATESCENT_METRICS=1 일 때만 기록하고,
+# FATESCENT_METRICS_FILE 이 있으면 Prometheus 텍스트 형식 파일로 주기적으로 내보낸다
+METRICS_FILE = os.environ.get("FATESCENT_METRICS_FILE")
+METRICS_INTERVAL_SEC = float(os.environ.get("FATESCENT_METRICS_INTERVAL", "15"))
+
+@st.cache_resource
+def metrics_file_exporter():
+    if metrics.ENABLED and METRICS_FILE:
+        metrics.start_file_exporter(METRICS_FILE, METRICS_INTERVAL_SEC)
+    return True
+
+metrics_file_exporter()
+
+# 느린 요청 프로파일링 (profiling.py): step 1/3 제출 처리 한 번을 cProfile + 스택 샘플링으로 남긴다
+#   FATESCENT_PROFILE=1            → 모든 제출을 프로파일링
+#   FATESCENT_PROFILE_TOKEN=비밀값 → 주소에 ?profile=비밀값 을 붙인 세션만 프로파일링
+PROFILE_ALL = os.environ.get("FATESCENT_PROFILE") == "1"
+PROFILE_TOKEN = os.environ.get("FATESCENT_PROFILE_TOKEN", "")
+
+def profiling_requested() -> bool:
+    if PROFILE_ALL:
+        return True
+    return bool(PROFILE_TOKEN) and st.query_params.get("profile") == PROFILE_TOKEN
+
+def profile_submit(label: str, session_id: str):
+    return profiling.profile(session_id, label) if profiling_requested() else nullcontext()
+
 
 # =========================================================
 # 2) 유틸 함수
 # =========================================================
-def safe_text(x):
-    if pd.isna(x):
-        return ""
-    return str(x).strip()
-
-def tags_to_keywords(tags):
-    kws = []
-    for t in tags:
-        kws.extend(TAG_TO_KEYWORDS.get(t, []))
-    return sorted(set([k.lower().strip() for k in kws if k]))
-
-def keyword_hit_score(text, keywords):
-    if not keywords:
-        return 0.0
-    text = safe_text(text).lower()
-    hits = sum(1 for kw in keywords if kw in text)
-    return hits / len(keywords)
-
 def extract_matching_notes(row, target_element, top_n=3):
     text = f"{safe_text(row.get('matched_keywords', ''))} {safe_text(row.get('Notes', ''))} {safe_text(row.get('Description', ''))}".lower()
     candidates = ELEMENT_KEYWORDS.get(target_element, [])
@@ -323,125 +400,159 @@ def build_east_asian_note_reason(weak_element: str, matched_notes: list) -> str:
     return f"당신의 부족한 <b>{weak_ko}</b> 기운을 채우는 데 도움이 되는 계열로 추천됐어요. {lore.get(weak_element, '')}"
 
 
-# =========================================================
-# 3) 사주 계산
-# =========================================================
-def get_real_saju_elements(year, month, day, hour=None, minute=None):
-    cal = KoreanLunarCalendar()
-    cal.setSolarDate(year, month, day)
-    gapja_str = cal.getGapJaString()
-    gapja = gapja_str.split()
-    if len(gapja) < 3:
-        return None, None, None, None, None
-
-    year_char, month_char, day_char = gapja[0], gapja[1], gapja[2]
-    saju_chars = [year_char[0], year_char[1], month_char[0], month_char[1], day_char[0], day_char[1]]
-    saju_name = f"{year_char} {month_char} {day_char}"
-
-    if hour is not None and minute is not None:
-        stems, branches = "갑을병정무기경신임계", "자축인묘진사오미신유술해"
-        total_mins = hour * 60 + minute
-        time_branch_idx = 0 if total_mins >= 1410 or total_mins < 90 else ((total_mins - 90) // 120 + 1) % 12
-        time_branch = branches[time_branch_idx]
-        day_stem_idx = stems.find(day_char[0])
-        time_stem = stems[((day_stem_idx % 5) * 2 + time_branch_idx) % 10] if day_stem_idx != -1 else "갑"
-        saju_chars.extend([time_stem, time_branch])
-        saju_name += f" {time_stem}{time_branch}시"
-    else:
-        saju_name += " (시간 모름·6글자 기준)"
+# LLM 응답 캐시: 이름 대신 자리표시자로 만든 프롬프트를 해시해 검증된 응답을 SQLite에 보관 (LRU)
+USER_NAME_TOKEN = "[[USER]]"
+LLM_CACHE_MAX_ROWS = 2000
+LLM_NAME_RULE = f"사용자 이름은 {USER_NAME_TOKEN} 자리표시자로 주어져. 이름을 쓸 때는 {USER_NAME_TOKEN} 를 그대로 써."
 
-    element_map = {
-        '갑':'Wood','을':'Wood','병':'Fire','정':'Fire','무':'Earth','기':'Earth',
-        '경':'Metal','신':'Metal','임':'Water','계':'Water',
-        '인':'Wood','묘':'Wood','사':'Fire','오':'Fire','진':'Earth','술':'Earth',
-        '축':'Earth','미':'Earth','신':'Metal','유':'Metal','해':'Water','자':'Water','申':'Metal'
-    }
-    counts = {e: 0 for e in ELEMENTS}
-    for c in saju_chars:
-        if c in element_map:
-            counts[element_map[c]] += 1
+@st.cache_resource
+def llm_cache_stats():
+    """프로세스 단위 적중/미스 카운터와 캐시로 아낀 토큰·시간."""
+    return {"lock": threading.Lock(), "hits": 0, "misses": 0, "saved_tokens": 0, "saved_sec": 0.0}
 
-    sorted_e = sorted(counts.items(), key=lambda x: x[1], reverse=True)
-    return saju_name, counts, sorted_e[0][0], sorted_e[-1][0], gapja_str
+def _bump_llm_cache_stats(**deltas):
+    stats = llm_cache_stats()
+    with stats["lock"]:
+        for k, v in deltas.items():
+            stats[k] += v
 
+def _llm_cache_connect():
+    conn = sqlite3.connect(LLM_CACHE_PATH, timeout=5)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS llm_cache ("
+        "key TEXT PRIMARY KEY, kind TEXT, value TEXT, tokens INTEGER, elapsed REAL, last_used REAL)"
+    )
+    return conn
 
-# =========================================================
-# 4) 궁합 분석 (NEW)
-# =========================================================
-def find_perfume_in_db(df, brand_input: str, name_input: str):
-    """DB에서 향수 검색. 퍼지 매칭(소문자 포함 여부)."""
-    if df.empty:
-        return None
-    brand_q = brand_input.strip().lower()
-    name_q = name_input.strip().lower()
+def llm_cache_key(kind: str, model: str, messages: list, temperature: float) -> str:
+    payload = json.dumps([kind, model, messages, temperature], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
-    # 🚨 [수정 완료] regex=False 추가로 특수문자 에러 방어
-    mask = (
-        df["Brand"].str.lower().str.contains(brand_q, regex=False, na=False) &
-        df["Name"].str.lower().str.contains(name_q, regex=False, na=False)
-    )
-    hits = df[mask]
-    if len(hits) == 0:
-        mask2 = df["Name"].str.lower().str.contains(name_q, regex=False, na=False)
-        hits = df[mask2]
-    if len(hits) == 0:
+def llm_cache_get(key: str):
+    try:
+        with closing(_llm_cache_connect()) as conn, conn:
+            row = conn.execute("SELECT value, tokens, elapsed FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+    except Exception:
+        row = None
+    if row is None:
+        _bump_llm_cache_stats(misses=1)
         return None
-        
-    hits = hits.copy()
-    hits["_name_len"] = hits["Name"].str.len()
-    return hits.sort_values("_name_len").iloc[0]
+    _bump_llm_cache_stats(hits=1, saved_tokens=row[1] or 0, saved_sec=row[2] or 0.0)
+    return row[0]
 
+def llm_cache_put(key: str, kind: str, value: str, tokens: int, elapsed: float):
+    try:
+        with closing(_llm_cache_connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?, ?)",
+                (key, kind, value, tokens, elapsed, time.time())
+            )
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key NOT IN "
+                "(SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT ?)",
+                (LLM_CACHE_MAX_ROWS,)
+            )
+    except Exception:
+        pass
 
-def get_perfume_notes_via_ai(brand: str, name: str) -> str:
-    if not HAS_AI or client is None:
+def _usage_tokens(resp) -> int:
+    usage = getattr(resp, "usage", None)
+    return int(getattr(usage, "total_tokens", 0) or 0)
+
+def fill_user_name(value, user_name: str):
+    """캐시된 응답의 이름 자리표시자를 실제 이름으로 치환 (dict/list/str 재귀)."""
+    if isinstance(value, str):
+        return value.replace(USER_NAME_TOKEN, user_name)
+    if isinstance(value, list):
+        return [fill_user_name(v, user_name) for v in value]
+    if isinstance(value, dict):
+        return {k: fill_user_name(v, user_name) for k, v in value.items()}
+    return value
+
+
+# =========================================================
+# 4) 궁합 분석 (NEW)
+# =========================================================
+async def aget_perfume_notes_via_ai(brand: str, name: str) -> str:
+    if not HAS_AI:
         return ""
     try:
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "너는 향수 전문가야. 향수의 주요 노트를 영어로 콤마 구분해서만 답해. 예: bergamot, rose, sandalwood, musk. 다른 말은 하지 마."},
-                {"role": "user", "content": f"향수: {brand} - {name}\n이 향수의 주요 향 노트를 알려줘."}
-            ],
-            temperature=0.3,
-            max_tokens=150
-        )
+        with metrics.stage("ai_notes"):
+            resp = await _achat(perfume_notes_messages(brand, name), temperature=0.3, max_tokens=150)
+        metrics.add_tokens("notes", _usage_tokens(resp))
         return resp.choices[0].message.content.strip() if resp and resp.choices else ""
     except Exception:
         return ""
 
+def get_perfume_notes_via_ai(brand: str, name: str) -> str:
+    return run_llm(aget_perfume_notes_via_ai(brand, name))
 
-def compute_perfume_element_vector(notes_text: str) -> dict:
-    t = notes_text.lower()
-    vec = {}
-    for elem, kws in ELEMENT_KEYWORDS.items():
-        hits = sum(1 for kw in kws if kw in t)
-        vec[elem] = hits
-    total = sum(vec.values())
-    if total > 0:
-        vec = {k: round(v / total, 3) for k, v in vec.items()}
-    else:
-        vec = {k: 0.0 for k in ELEMENTS}
-    return vec
 
+# AI 노트 영구 캐시 (SQLite). 같은 미등록 향수는 한 번만 AI에 묻는다
+NOTES_CACHE_TTL_SEC = 30 * 24 * 3600
+NOTES_CACHE_MAX_ROWS = 5000
+
+def _notes_cache_connect():
+    conn = sqlite3.connect(NOTES_CACHE_PATH, timeout=5)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS notes_cache ("
+        "key TEXT PRIMARY KEY, brand TEXT, name TEXT, notes TEXT, created_at REAL, last_used REAL)"
+    )
+    return conn
 
-def compute_compatibility_score(user_counts: dict, perfume_vec: dict, weak: str, strong: str) -> int:
-    total_user = sum(user_counts.values()) or 1
-    user_norm = {e: user_counts[e] / total_user for e in ELEMENTS}
+def _notes_cache_key(brand: str, name: str) -> str:
+    return f"{normalize_brand(brand)}|{normalize_text(name)}"
 
-    total_perf = sum(perfume_vec.values()) or 1
-    perf_norm = {e: perfume_vec.get(e, 0) / total_perf for e in ELEMENTS}
+def notes_cache_get(brand: str, name: str):
+    try:
+        now = time.time()
+        with closing(_notes_cache_connect()) as conn, conn:
+            key = _notes_cache_key(brand, name)
+            row = conn.execute(
+                "SELECT notes FROM notes_cache WHERE key = ? AND created_at >= ?",
+                (key, now - NOTES_CACHE_TTL_SEC)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE notes_cache SET last_used = ? WHERE key = ?", (now, key))
+            return row[0]
+    except Exception:
+        return None
 
-    dot = sum(user_norm[e] * perf_norm[e] for e in ELEMENTS)
-    mag_u = math.sqrt(sum(v**2 for v in user_norm.values()))
-    mag_p = math.sqrt(sum(v**2 for v in perf_norm.values()))
-    cosine = dot / (mag_u * mag_p) if mag_u * mag_p > 0 else 0.0
+def notes_cache_put(brand: str, name: str, notes: str):
+    try:
+        now = time.time()
+        with closing(_notes_cache_connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO notes_cache VALUES (?, ?, ?, ?, ?, ?)",
+                (_notes_cache_key(brand, name), brand, name, notes, now, now)
+            )
+            # TTL 만료분 삭제 후, 최대 개수를 넘으면 가장 오래 안 쓰인 것부터 삭제
+            conn.execute("DELETE FROM notes_cache WHERE created_at < ?", (now - NOTES_CACHE_TTL_SEC,))
+            conn.execute(
+                "DELETE FROM notes_cache WHERE key NOT IN "
+                "(SELECT key FROM notes_cache ORDER BY last_used DESC LIMIT ?)",
+                (NOTES_CACHE_MAX_ROWS,)
+            )
+    except Exception:
+        pass
 
-    complement_score = perf_norm.get(weak, 0.0)
-    overload_penalty = perf_norm.get(strong, 0.0) * user_norm.get(strong, 0.0)
+async def aget_cached_perfume_notes(brand: str, name: str, index: PerfumeIndex = None) -> str:
+    """노트 캐시 → AI 순으로 조회. 얻은 노트는 색인에도 넣어 다음부터 find_perfume_in_db에서 바로 찾게 한다."""
+    notes = notes_cache_get(brand, name)
+    metrics.cache_lookup("ai_notes", notes is not None)
+    if notes is None:
+        notes = await aget_perfume_notes_via_ai(brand, name)
+        if notes:
+            notes_cache_put(brand, name, notes)
+    if notes and index is not None:
+        index.add(brand, name, {"Brand": brand, "Name": name, "Notes": notes, "_source": "ai"})
+    return notes
 
-    raw = (0.35 * cosine) + (0.50 * complement_score) - (0.25 * overload_penalty)
-    score = max(0.0, min(1.0, raw + 0.3)) 
-    return int(round(score * 100))
+def get_cached_perfume_notes(brand: str, name: str, index: PerfumeIndex = None) -> str:
+    return run_llm(aget_cached_perfume_notes(brand, name, index))
 
 
 def build_compatibility_prompt(
@@ -481,7 +592,7 @@ def build_compatibility_prompt(
 """.strip()
 
 
-def generate_compatibility_result(
+async def agenerate_compatibility_result(
     user_name, gender, saju_name, strong, weak,
     perf_brand, perf_name, notes_text, score, perf_vec
 ) -> dict:
@@ -504,35 +615,49 @@ def generate_compatibility_result(
         "compatibility_detail": f"궁합 점수 {score}점은 {'좋은 편이에요. 지금 컨디션에 잘 맞는 향이에요.' if score >= 70 else '보통 수준이에요. 기분에 따라 잘 맞을 수도 있어요.' if score >= 50 else '조금 아쉬운 편이에요. 부족한 기운을 더 잘 채우는 향이 있어요.'}"
     }
 
-    if not HAS_AI or client is None:
+    if not HAS_AI:
         return fallback
 
     prompt = build_compatibility_prompt(
-        user_name, gender, saju_name, strong, weak,
+        USER_NAME_TOKEN, gender, saju_name, strong, weak,
         perf_brand, perf_name, notes_text, score, perf_vec
     )
+    messages = [
+        {"role": "system", "content": f"너는 명리학+조향 전문가야. 반드시 JSON만 출력해. {LLM_NAME_RULE}"},
+        {"role": "user", "content": prompt}
+    ]
+    cache_key = llm_cache_key("compat", LLM_MODEL, messages, 0.7)
+    cached = llm_cache_get(cache_key)
+    metrics.cache_lookup("llm_compat", cached is not None)
+    if cached is not None:
+        return fill_user_name(json.loads(cached), user_name)
     try:
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "너는 명리학+조향 전문가야. 반드시 JSON만 출력해."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=600
-        )
+        t0 = time.perf_counter()
+        with metrics.stage("compat_llm"):
+            resp = await _achat(messages, temperature=0.7, max_tokens=600)
+        metrics.add_tokens("compat", _usage_tokens(resp))
         raw = resp.choices[0].message.content if resp and resp.choices else ""
         raw = _strip_code_fences(raw)
-        import json
         data = json.loads(raw)
         required = ["one_liner", "good_reasons", "bad_reasons", "perf_element_summary", "compatibility_detail"]
         if all(k in data for k in required):
-            return data
+            llm_cache_put(cache_key, "compat", json.dumps(data, ensure_ascii=False), _usage_tokens(resp), time.perf_counter() - t0)
+            return fill_user_name(data, user_name)
         return fallback
     except Exception:
         return fallback
 
 
+def generate_compatibility_result(
+    user_name, gender, saju_name, strong, weak,
+    perf_brand, perf_name, notes_text, score, perf_vec
+) -> dict:
+    return run_llm(agenerate_compatibility_result(
+        user_name, gender, saju_name, strong, weak,
+        perf_brand, perf_name, notes_text, score, perf_vec
+    ))
+
+
 # =========================================================
 # 5) AI 사주 풀이
 # =========================================================
@@ -655,160 +780,368 @@ def generate_local_fallback_reading(user_name, gender, saju_name, strongest, wea
 """.strip()
 
 
-def generate_comprehensive_reading(user_name, gender, saju_name, strongest, weakest, top3_df, know_time):
-    if not HAS_AI or client is None:
+async def agenerate_comprehensive_reading(user_name, gender, saju_name, strongest, weakest, top3_df, know_time, on_delta=None):
+    if not HAS_AI:
         return generate_local_fallback_reading(user_name, gender, saju_name, strongest, weakest, top3_df, know_time)
-    prompt = build_ai_reading_prompt_html(user_name, gender, saju_name, strongest, weakest, top3_df, know_time)
+    prompt = build_ai_reading_prompt_html(USER_NAME_TOKEN, gender, saju_name, strongest, weakest, top3_df, know_time)
+    messages = [
+        {"role": "system", "content": f"너는 사용자가 이해하기 쉽게 풀어주는 '명리학+조향' 전문가야. 결과는 반드시 HTML만 출력해. {LLM_NAME_RULE}"},
+        {"role": "user", "content": prompt}
+    ]
+    cache_key = llm_cache_key("reading", LLM_MODEL, messages, 0.75)
+    cached = llm_cache_get(cache_key)
+    metrics.cache_lookup("llm_reading", cached is not None)
+    if cached is not None:
+        return fill_user_name(cached, _html.escape(user_name))
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "너는 사용자가 이해하기 쉽게 풀어주는 '명리학+조향' 전문가야. 결과는 반드시 HTML만 출력해."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.75
-        )
-        out = response.choices[0].message.content if response and response.choices else ""
+        t0 = time.perf_counter()
+        with metrics.stage("reading_llm"):
+            if on_delta is None:
+                response = await _achat(messages, temperature=0.75)
+                out = response.choices[0].message.content if response and response.choices else ""
+                tokens = _usage_tokens(response)
+            else:
+                out, tokens = await _achat_stream(messages, 0.75, on_delta)
+        metrics.add_tokens("reading", tokens)
         out = _strip_code_fences(out)
         if "<h2" not in out or "<h3" not in out:
             return generate_local_fallback_reading(user_name, gender, saju_name, strongest, weakest, top3_df, know_time)
-        return out
+        llm_cache_put(cache_key, "reading", out, tokens, time.perf_counter() - t0)
+        return fill_user_name(out, _html.escape(user_name))
     except Exception:
         return generate_local_fallback_reading(user_name, gender, saju_name, strongest, weakest, top3_df, know_time)
 
 
+def generate_comprehensive_reading(user_name, gender, saju_name, strongest, weakest, top3_df, know_time):
+    return run_llm(agenerate_comprehensive_reading(user_name, gender, saju_name, strongest, weakest, top3_df, know_time))
+
+
+def start_reading_job(user_name, gender, saju_name, strongest, weakest, top3_df, know_time) -> dict:
+    """사주풀이 생성을 백그라운드로 시작. 스트리밍 조각은 queue, 최종(검증/대체 포함) HTML은 future로 받는다."""
+    q = queue.Queue()
+    fut = submit_llm(agenerate_comprehensive_reading(
+        user_name, gender, saju_name, strongest, weakest, top3_df, know_time, on_delta=q.put
+    ))
+    return {"future": fut, "queue": q, "text": "", "user_name": user_name}
+
+
+def sanitize_reading_fragment(text: str) -> str:
+    """스트리밍 중인 HTML 조각 정리: 코드펜스/잘린 태그·이름 자리표시자/script·style/이벤트 속성/h2(히어로로 따로 표시) 제거."""
+    t = _strip_code_fences(re.sub(r"^\s*`{1,3}(html)?", "", text))
+    if t.rfind("<") > t.rfind(">"):
+        t = t[:t.rfind("<")]
+    for i in range(len(USER_NAME_TOKEN) - 1, 0, -1):
+        if t.endswith(USER_NAME_TOKEN[:i]):
+            t = t[:-i]
+            break
+    t = re.sub(r"<(script|style)\b.*?(</\1>|$)", "", t, flags=re.S | re.I)
+    t = re.sub(r"\son\w+\s*=\s*(\"[^\"]*\"|'[^']*'|[^\s>]+)", "", t, flags=re.I)
+    return re.sub(r"<h2[^>]*>.*?(</h2>|$)", "", t, flags=re.S | re.I)
+
+
+def stream_reading_job(job: dict, on_update, min_interval: float = 0.1) -> str:
+    """job의 조각을 모아 min_interval마다 on_update(정리된 HTML)를 호출하고, 끝나면 최종 HTML 반환.
+    중간에 스크립트가 중단돼도 job은 계속 돌고 받은 텍스트는 job에 남아 다음 실행에서 이어 그린다."""
+    fut, q = job["future"], job["queue"]
+    last = 0.0
+    while not (fut.done() and q.empty()):
+        try:
+            job["text"] += q.get(timeout=0.05)
+        except queue.Empty:
+            continue
+        if time.monotonic() - last >= min_interval:
+            on_update(fill_user_name(sanitize_reading_fragment(job["text"]), _html.escape(job["user_name"])))
+            last = time.monotonic()
+    return fut.result()
+
+
 # =========================================================
 # 6) 로그 저장
 # =========================================================
+LOG_COLUMNS = [
+    "timestamp", "session_id", "user_name", "gender", "birth_date", "know_time", "saju_name",
+    "strongest_element", "weakest_element", "rank", "perfume_name", "brand", "rec_score"
+]
+LOG_QUEUE_MAX = 10000    # 대기 중인 배치 수 상한. 넘치면 버리고 dropped 로 센다
+LOG_FLUSH_ROWS = 200     # 이만큼 모이거나
+LOG_FLUSH_SEC = 2.0      # 첫 행 이후 이만큼 지나면 한 트랜잭션으로 기록
+
+# 로그 저장소 (SQLite WAL). rec_log_stats 는 기록과 같은 트랜잭션에서 갱신하는 누적 집계라
+# 관리자 화면은 로그가 몇 달 치 쌓여도 작은 집계 행만 읽는다
+LOG_DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rec_logs (
+    id INTEGER PRIMARY KEY, timestamp TEXT, session_id TEXT, user_name TEXT, gender TEXT, birth_date TEXT,
+    know_time INTEGER, saju_name TEXT, strongest_element TEXT, weakest_element TEXT, rank INTEGER,
+    perfume_name TEXT, brand TEXT, rec_score REAL
+);
+CREATE INDEX IF NOT EXISTS rec_logs_timestamp ON rec_logs (timestamp);
+CREATE INDEX IF NOT EXISTS rec_logs_session ON rec_logs (session_id);
+CREATE TABLE IF NOT EXISTS rec_log_stats (metric TEXT, key TEXT, n INTEGER, PRIMARY KEY (metric, key)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS rec_log_stats_rank ON rec_log_stats (metric, n);
+CREATE TABLE IF NOT EXISTS rec_log_imports (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER);
+"""
+LOG_INSERT_SQL = f"INSERT INTO rec_logs ({', '.join(LOG_COLUMNS)}) VALUES ({', '.join('?' * len(LOG_COLUMNS))})"
+LOG_STATS_UPSERT_SQL = (
+    "INSERT INTO rec_log_stats VALUES (?, ?, ?) "
+    "ON CONFLICT (metric, key) DO UPDATE SET n = n + excluded.n"
+)
+
+def _log_db_connect():
+    conn = sqlite3.connect(LOG_DB_PATH, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(LOG_DB_SCHEMA)
+    return conn
+
+def _log_batch_stats(rows: list) -> list:
+    """로그 행 묶음 → rec_log_stats 증분. 추천 1회 = rank 1 행 하나로 센다."""
+    stats = defaultdict(int)
+    for row in rows:
+        ts, gender, strongest, weakest, rank, name, brand = row[0], row[3], row[7], row[8], row[9], row[10], row[11]
+        stats[("rows", "all")] += 1
+        stats[("brand", brand)] += 1
+        stats[("perfume", f"{brand}\t{name}")] += 1
+        if rank == 1:
+            stats[("events", "all")] += 1
+            stats[("month", ts[:7])] += 1
+            stats[("weakest", weakest)] += 1
+            stats[("strongest", strongest)] += 1
+            stats[("gender", gender)] += 1
+            stats[("top1", f"{brand}\t{name}")] += 1
+    return [(metric, key, n) for (metric, key), n in stats.items()]
+
+def insert_log_rows(conn, rows: list):
+    """행과 집계를 함께 넣는다. 트랜잭션(with conn)은 호출하는 쪽에서 연다."""
+    conn.executemany(LOG_INSERT_SQL, rows)
+    conn.executemany(LOG_STATS_UPSERT_SQL, _log_batch_stats(rows))
+
+def _legacy_log_files() -> list:
+    """예전 CSV 로그 (교체된 파일 포함). 처음 한 번 저장소로 옮긴다."""
+    stem, ext = os.path.splitext(LOG_PATH)
+    return sorted(glob.glob(f"{glob.escape(stem)}*{ext}"))
+
+def _legacy_log_imported(conn, path: str, stat) -> bool:
+    return conn.execute("SELECT 1 FROM rec_log_imports WHERE path = ? AND size = ? AND mtime_ns = ?",
+                        (path, stat.st_size, stat.st_mtime_ns)).fetchone() is not None
+
+def import_legacy_csv_logs(conn):
+    for path in _legacy_log_files():
+        try:
+            stat = os.stat(path)
+            if _legacy_log_imported(conn, path, stat):
+                continue
+            with open(path, encoding="utf-8-sig", newline="") as f:
+                records = [[rec.get(c) or "" for c in LOG_COLUMNS] for rec in csv.DictReader(f)]
+            rows = [[*r[:5], int(r[5] or 0), *r[6:9], int(r[9] or 0), r[10], r[11], float(r[12] or 0.0)] for r in records]
+            with conn:
+                # 같은 디렉터리를 쓰는 다른 프로세스가 먼저 옮겼을 수 있으니 쓰기 잠금을 잡은 뒤 다시 확인
+                conn.execute("BEGIN IMMEDIATE")
+                if _legacy_log_imported(conn, path, stat):
+                    continue
+                insert_log_rows(conn, rows)
+                conn.execute("INSERT OR REPLACE INTO rec_log_imports VALUES (?, ?, ?)", (path, stat.st_size, stat.st_mtime_ns))
+        except Exception:
+            pass
+
+
+class RecommendationLogWriter:
+    """요청 스레드는 큐에 넣기만 하고, 백그라운드 스레드 하나가 모아서 SQLite(WAL)에 한 트랜잭션으로 넣는다."""
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=LOG_QUEUE_MAX)
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._thread = threading.Thread(target=self._run, name="rec-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, rows: list):
+        try:
+            self.queue.put_nowait(rows)
+        except queue.Full:
+            self.dropped += len(rows)
+
+    def close(self, timeout: float = 5.0):
+        if self._thread.is_alive():
+            try:
+                self.queue.put(None, timeout=timeout)
+            except queue.Full:
+                return
+            self._thread.join(timeout)
+
+    def _run(self):
+        try:
+            conn = _log_db_connect()
+            import_legacy_csv_logs(conn)
+        except Exception:
+            conn = None
+        stop = False
+        while not stop:
+            item = self.queue.get()
+            if item is None:
+                break
+            batch = list(item)
+            deadline = time.monotonic() + LOG_FLUSH_SEC
+            while len(batch) < LOG_FLUSH_ROWS:
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.extend(item)
+            try:
+                with metrics.stage("log_flush"), conn:
+                    insert_log_rows(conn, batch)
+                self.written += len(batch)
+            except Exception:
+                self.failed += len(batch)
+        if conn is not None:
+            conn.close()
+
+
+@st.cache_resource
+def recommendation_log_writer() -> RecommendationLogWriter:
+    return RecommendationLogWriter()
+
+def load_log_analytics(top_n: int = 10) -> dict:
+    """관리자 화면용 집계. 누적 집계 테이블에서 상위 몇 행만 읽으므로 로그 양과 무관하게 일정한 시간."""
+    with closing(_log_db_connect()) as conn:
+        def _metric(metric, limit=None):
+            sql = "SELECT key, n FROM rec_log_stats WHERE metric = ? ORDER BY n DESC"
+            return conn.execute(sql + (" LIMIT ?" if limit else ""), (metric, limit) if limit else (metric,)).fetchall()
+        totals = dict(conn.execute("SELECT metric, n FROM rec_log_stats WHERE key = 'all'").fetchall())
+        return {
+            "events": totals.get("events", 0), "rows": totals.get("rows", 0),
+            "weakest": dict(_metric("weakest")), "strongest": dict(_metric("strongest")),
+            "gender": dict(_metric("gender")), "months": dict(_metric("month", 24)),
+            "top_perfumes": [(*k.split("\t", 1), n) for k, n in _metric("perfume", top_n)],
+            "top1_perfumes": [(*k.split("\t", 1), n) for k, n in _metric("top1", top_n)],
+            "top_brands": _metric("brand", top_n),
+        }
+
+def export_logs_csv() -> bytes:
+    with closing(_log_db_connect()) as conn:
+        logs = pd.read_sql_query(f"SELECT {', '.join(LOG_COLUMNS)} FROM rec_logs ORDER BY id", conn)
+    return logs.to_csv(index=False).encode("utf-8-sig")
+
 def save_recommendation_log(session_id, user_name, gender, birth_date, know_time, saju_name, strongest, weakest, top3_df):
     now_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    rows = []
-    for rank_idx, (_, row) in enumerate(top3_df.iterrows(), start=1):
-        rows.append({
-            "timestamp": now_str, "session_id": session_id,
-            "user_name": user_name, "gender": gender,
-            "birth_date": str(birth_date), "know_time": 0 if know_time else 1,
-            "saju_name": saju_name, "strongest_element": strongest, "weakest_element": weakest,
-            "rank": rank_idx, "perfume_name": safe_text(row.get("Name", "")),
-            "brand": safe_text(row.get("Brand", "")), "rec_score": float(row.get("score", 0.0))
-        })
-    df_log = pd.DataFrame(rows)
-    df_log.to_csv(
-        LOG_PATH, mode="a" if os.path.exists(LOG_PATH) else "w",
-        header=not os.path.exists(LOG_PATH), index=False, encoding="utf-8-sig"
-    )
+    n = len(top3_df)
+    names = top3_df["Name"].tolist() if "Name" in top3_df else [""] * n
+    brands = top3_df["Brand"].tolist() if "Brand" in top3_df else [""] * n
+    scores = top3_df["score"].tolist() if "score" in top3_df else [0.0] * n
+    rows = [
+        [
+            now_str, session_id, user_name, gender, str(birth_date), 0 if know_time else 1, saju_name,
+            strongest, weakest, rank_idx, safe_text(name), safe_text(brand), float(score)
+        ]
+        for rank_idx, (name, brand, score) in enumerate(zip(names, brands, scores), start=1)
+    ]
+    recommendation_log_writer().submit(rows)
 
 
 # =========================================================
-# 7) 데이터 로드 및 추천 엔진 (🚨 최종 진화형으로 완벽 교체)
+# 7) 데이터 로드 및 추천 엔진 (로직은 engine.py)
 # =========================================================
-MIN_AFTER_GENDER_FILTER = 30
-MIN_AFTER_BRAND_FILTER = 20
-GENDER_THRESHOLDS = [0.45, 0.35, 0.25]
-DROP_DUP_KEYS = ["Brand", "Name"]
-
-@st.cache_data
-def load_data():
-    if not os.path.exists(DATA_PATH):
-        return pd.DataFrame()
-    try:
-        df = pd.read_csv(DATA_PATH, encoding="utf-8-sig")
-    except Exception:
-        df = pd.read_csv(DATA_PATH)
-
-    text_columns = ["Name", "Brand", "Notes", "Description", "matched_keywords", "Top", "Middle", "Base", "Gender"]
-    for c in text_columns:
-        if c not in df.columns:
-            df[c] = ""
-        df[c] = df[c].fillna("").astype(str)
-
-    # 성별 스코어 (신규 DB 완벽 호환)
-    for c in ["Female_Score", "Male_Score"]:
-        if c not in df.columns:
-            df[c] = 0.5
-        df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0.5)
-
-    for e in ELEMENTS:
-        if e not in df.columns:
-            df[e] = 0.0
-        df[e] = pd.to_numeric(df[e], errors="coerce").fillna(0.0)
-
-    df["all_text"] = (
-        df["Name"] + " " + df["Brand"] + " " +
-        df["Notes"] + " " + df["matched_keywords"] + " " +
-        df["Top"] + " " + df["Middle"] + " " + df["Base"] + " " +
-        df["Gender"]
-    ).str.lower().fillna("")
-
-    df["element_sum"] = df[ELEMENTS].sum(axis=1)
-    df = df[df["element_sum"] > 0].copy()
-
-    ban_words = ["sample", "discovery", "set", "gift", "miniature"]
-    mask = ~df["Name"].str.lower().apply(lambda x: any(w in x for w in ban_words))
-    df = df[mask].copy()
-
-    for c in DROP_DUP_KEYS:
-        if c not in df.columns:
-            df[c] = ""
-    df = df.drop_duplicates(subset=DROP_DUP_KEYS).reset_index(drop=True)
-    return df
+REC_CACHE_SIZE = 4096
+# 후보 검색 인덱스 (retrieval.py): 비우면 전체 카탈로그를 점수 매기는 정확 경로. brute / ivf 를 주면
+# 감점 전 점수 상위 후보만 다시 점수 매긴다 (ivf 는 근사 — retrieval_report.py 로 recall 을 확인하고 켤 것)
+RETRIEVER_KIND = os.environ.get("FATESCENT_RETRIEVER", "")
+
+@st.cache_resource
+def catalogue_loader(data_signature: str = ""):
+    """카탈로그는 백그라운드 스레드에서 읽는다. 첫 화면(step 1)은 기다리지 않고 먼저 그린다."""
+    future = concurrent.futures.Future()
 
-df = load_data()
-
-def _apply_gender_filter(work: pd.DataFrame, user_gender: str) -> pd.DataFrame:
-    if work.empty or user_gender not in ["남성향", "여성향"]:
-        return work  
-    score_col = "Male_Score" if user_gender == "남성향" else "Female_Score"
-    
-    # 성별 필터 단계적 완화 로직 적용
-    for thr in GENDER_THRESHOLDS:
-        filtered = work[work[score_col] >= thr]
-        if len(filtered) >= MIN_AFTER_GENDER_FILTER:
-            return filtered.copy()
-    return work
-
-def recommend_perfumes(df, weakest, strongest, pref_tags, dislike_tags, brand_filter_mode, gender_filter="전체"):
+    def _load():
+        try:
+            future.set_result(load_catalogue_frame(DATA_PATH, data_signature))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=_load, name="catalogue-loader", daemon=True).start()
+    return future
+
+def load_data(data_signature: str = ""):
+    """카탈로그가 실제로 필요한 시점에만 로드 완료를 기다린다. 실패하면 다음 실행에서 다시 읽는다."""
+    future = catalogue_loader(data_signature)
+    if future.exception() is not None:
+        catalogue_loader.clear()
+    return future.result()
+
+def require_catalogue():
+    df = load_data(DATA_SIGNATURE)
     if df.empty:
-        return pd.DataFrame()
-    work = df.copy()
-
-    work = _apply_gender_filter(work, gender_filter)
-
-    if brand_filter_mode == "유명 브랜드 위주":
-        filtered = work[work["Brand"].apply(lambda b: any(f.lower() in str(b).lower() for f in FAMOUS_BRANDS))]
-        if len(filtered) >= MIN_AFTER_BRAND_FILTER:
-            work = filtered.copy()
-
-    pref_keywords = tags_to_keywords(pref_tags)
-    dislike_keywords = tags_to_keywords(dislike_tags)
-    target = [1.0 if e == weakest else (0.1 if e == strongest else 0.5) for e in ELEMENTS]
-
-    rows = []
-    for _, row in work.iterrows():
-        text = row.get("all_text", "")
-        dislike_score = keyword_hit_score(text, dislike_keywords)
-        pref_score = keyword_hit_score(text, pref_keywords)
-        vec = [float(row.get(e, 0.0)) for e in ELEMENTS]
-
-        denom = math.sqrt(sum(t*t for t in target)) * math.sqrt(sum(v*v for v in vec))
-        sim = sum(t * v for t, v in zip(target, vec)) / denom if denom > 0 else 0.0
-        brand_bonus = 0.15 if any(b.lower() in str(row.get("Brand", "")).lower() for b in FAMOUS_BRANDS) else 0.0
-
-        final_score = (0.55 * sim) + (0.20 * float(row.get(weakest, 0.0))) + (0.18 * pref_score) - (0.20 * dislike_score) + brand_bonus
-        if dislike_score >= 0.4:
-            final_score -= 0.5
-
-        r = row.to_dict()
-        r.update({"score": float(final_score), f"{weakest}_fill": float(row.get(weakest, 0.0))})
-        rows.append(r)
-
-    out = (
-        pd.DataFrame(rows)
-        .sort_values("score", ascending=False)
-        .drop_duplicates(subset=DROP_DUP_KEYS)
-        .reset_index(drop=True)
-    )
-    return out
+        st.error("향수 데이터베이스를 불러오지 못했습니다.")
+        st.stop()
+    return df
+
+DATA_SIGNATURE = _data_signature()
+catalogue_loader(DATA_SIGNATURE)
+
+
+# 추천 결과 캐시: 결과는 (오행, 태그, 필터)에만 의존하므로 프로세스 단위 LRU로 공유
+def _common_profiles(k=3):
+    """워밍업 대상: 태그 없이 들어오는 가장 흔한 조합 (오행 쌍 x 성별 x 브랜드 필터)."""
+    for weakest, strongest in itertools.permutations(ELEMENTS, 2):
+        for gender_filter in GENDER_FILTER_OPTIONS:
+            for brand_filter_mode in BRAND_FILTER_OPTIONS:
+                yield weakest, strongest, (), (), brand_filter_mode, gender_filter, k
+
+@st.cache_resource(max_entries=1)
+def load_retriever(data_signature: str):
+    catalogue = load_data(data_signature)
+    if not RETRIEVER_KIND or catalogue.empty:
+        return None
+    return build_retriever(catalogue, RETRIEVER_KIND)
+
+# 이 스레드의 마지막 캐시 조회가 실제 계산(미스)이었는지. 다른 세션 · 워밍업 스레드의 조회와 섞이지 않게 스레드별로 둔다
+_rec_cache_call = threading.local()
+
+@st.cache_resource(max_entries=1)
+def _recommendation_cache(data_signature: str):
+    catalogue = load_data(data_signature)
+    retriever = load_retriever(data_signature)
+
+    @functools.lru_cache(maxsize=REC_CACHE_SIZE)
+    def _cached(weakest, strongest, pref_key, dislike_key, brand_filter_mode, gender_filter, k):
+        _rec_cache_call.missed = True
+        return tuple(recommend_rows(
+            catalogue, weakest, strongest, list(pref_key), list(dislike_key), brand_filter_mode, gender_filter,
+            k=k, retriever=retriever
+        ))
+
+    if os.environ.get("FATESCENT_REC_WARMUP") == "1":
+        def _warm_up():
+            for args in _common_profiles():
+                _cached(*args)
+        threading.Thread(target=_warm_up, name="rec-cache-warmup", daemon=True).start()
+    return _cached
+
+def cached_recommend_rows(weakest, strongest, pref_tags, dislike_tags, brand_filter_mode, gender_filter="전체", k=3):
+    """recommend_rows 앞단 LRU 캐시 → (Recommendation, ...). 태그 순서는 점수에 영향이 없으므로 정렬해 키로 쓴다."""
+    cached = _recommendation_cache(DATA_SIGNATURE)
+    _rec_cache_call.missed = False
+    with metrics.stage("scoring"):
+        recs = cached(
+            weakest, strongest, tuple(sorted(set(pref_tags))), tuple(sorted(set(dislike_tags))),
+            brand_filter_mode, gender_filter, k
+        )
+    metrics.cache_lookup("recommend", not _rec_cache_call.missed)
+    return recs
+
+def top3_frame(recs, weakest, data_signature: str = "") -> pd.DataFrame:
+    """세션의 추천 기록(행 번호 + 점수)을 공유 카탈로그에서 표시용 DataFrame 으로 꺼낸다."""
+    return recommendation_frame(load_data(data_signature or DATA_SIGNATURE), recs, weakest)
+
+
+@st.cache_resource(max_entries=1)
+def load_perfume_index(data_signature: str) -> PerfumeIndex:
+    catalogue = load_data(data_signature)
+    return PerfumeIndex(catalogue["Brand"], catalogue["Name"], extra_ttl_sec=NOTES_CACHE_TTL_SEC, extra_max=NOTES_CACHE_MAX_ROWS)
 
 
 # =========================================================
@@ -861,6 +1194,213 @@ def render_loading(placeholder, current_step: int, title: str, percent: int, ste
 """, unsafe_allow_html=True)
 
 
+# 로딩 화면 최소 표시 시간(초): 작업이 이보다 빨리 끝나면 깜빡이지 않도록 남은 시간만 기다린다 (0이면 기다리지 않음)
+try:
+    LOADING_MIN_DISPLAY_SEC = max(0.0, float(os.environ.get("FATESCENT_LOADING_MIN_SEC", "0.3")))
+except ValueError:
+    LOADING_MIN_DISPLAY_SEC = 0.3
+
+class LoadingProgress:
+    """실제 작업 단계가 끝났다는 이벤트(done)가 올 때만 render_loading 을 다음 단계로 넘긴다.
+
+    steps: [(단계 키, 단계 문구, 진행 중 제목)]. done(key) 는 그 단계까지를 완료로 표시한다.
+    """
+
+    def __init__(self, placeholder, steps: list, min_display_sec: float = LOADING_MIN_DISPLAY_SEC):
+        self.placeholder = placeholder
+        self.keys = [s[0] for s in steps]
+        self.step_texts = [s[1] for s in steps]
+        self.titles = [s[2] for s in steps]
+        self.min_display_sec = min_display_sec
+        self.n_done = 0
+        self.started = time.monotonic()
+        self._render()
+
+    def _render(self, ai_mode: bool = False):
+        n = len(self.keys)
+        current = min(self.n_done, n - 1)
+        percent = 100 if self.n_done >= n else round(100 * (self.n_done + 0.5) / n)
+        title = "마무리 정리 중이에요…" if self.n_done >= n else self.titles[current]
+        render_loading(self.placeholder, self.n_done + 1, title, percent, self.step_texts, ai_mode=ai_mode)
+
+    def done(self, key: str, ai_mode: bool = False):
+        """key 단계 완료. ai_mode=True 면 다음 단계(LLM 응답 대기)를 진행률 대신 흐르는 막대로 보여 준다."""
+        self.n_done = max(self.n_done, self.keys.index(key) + 1)
+        self._render(ai_mode=ai_mode)
+
+    def finish(self):
+        remaining = self.min_display_sec - (time.monotonic() - self.started)
+        if remaining > 0:
+            time.sleep(remaining)
+        self.placeholder.empty()
+
+
+def render_result_hero(placeholder, reading_result: str, strong, weak, know_time):
+    hero_text = ""
+    m = re.search(r"<h2[^>]*>(.*?)</h2>", reading_result, flags=re.S | re.I)
+    if m:
+        hero_text = re.sub(r"<[^>]+>", "", m.group(1))
+        hero_text = _html.unescape(hero_text).strip()
+
+    # 🚨 [수정 완료] 큰따옴표 안의 큰따옴표로 인한 Syntax Error 해결
+    if not hero_text:
+        hero_text = f"{ELEMENTS_KO.get(strong,strong)} — '당신의 흐름은 분명합니다.'"
+
+    time_line = "⏰ 태어난 시간이 입력되었습니다." if not know_time else "⏰ 시간 미입력: 정오 기준(오차 가능)으로 분석했어요."
+
+    placeholder.markdown(f"""
+    <div class="hero">
+      <div class="hero-title">{_html.escape(hero_text)}</div>
+      <div class="hero-sub">{_html.escape(time_line)}</div>
+      <div class="kpi-row">
+        <div class="kpi"><b>가장 강한 기운</b><div class="val">{ELEMENT_EMOJI[strong]} {ELEMENTS_KO[strong]}</div></div>
+        <div class="kpi"><b>보완할 기운</b><div class="val">{ELEMENT_EMOJI[weak]} {ELEMENTS_KO[weak]}</div></div>
+      </div>
+      <div class="small-note" style="margin-top:10px;">원하는 것만 빠르게 볼 수 있게 <b>탭</b>으로 나눴어요.</div>
+    </div>
+    """, unsafe_allow_html=True)
+
+
+def render_reading_body(placeholder, reading_html: str):
+    reading_body = re.sub(r"<h2[^>]*>.*?</h2>", "", reading_html, flags=re.S | re.I)
+    placeholder.markdown(f'<div class="saju-magazine">\n{reading_body}\n</div>', unsafe_allow_html=True)
+
+
+# --- 공유 탭: QR / 공유 카드 이미지 (재실행마다 다시 그리지 않도록 캐시) ---
+@st.cache_resource
+def share_qr_assets(link: str) -> dict:
+    """앱 링크 QR 은 프로세스당 한 번만 만든다. qrcode 가 없으면 빈 값."""
+    try:
+        import qrcode
+        qr = qrcode.QRCode(box_size=4, border=0)
+        qr.add_data(link)
+        qr.make(fit=True)
+        img = qr.make_image(fill_color="#3182f6", back_color="transparent")
+        buf = BytesIO()
+        img.save(buf, format="PNG")
+        png = buf.getvalue()
+    except Exception:
+        png = b""
+    return {"png": png, "b64": base64.b64encode(png).decode("ascii")}
+
+
+@st.cache_resource
+def share_card_fonts():
+    """Pretendard 폰트 (용도별 크기). Pillow 나 폰트 파일이 없으면 None → 카드 이미지 버튼을 숨긴다."""
+    try:
+        from PIL import ImageFont
+        bold = os.path.join(FONT_DIR, "Pretendard-Bold.otf")
+        regular = os.path.join(FONT_DIR, "Pretendard-Regular.otf")
+        return {
+            "title": ImageFont.truetype(bold, 54),
+            "brand": ImageFont.truetype(bold, 78),
+            "name": ImageFont.truetype(regular, 44),
+            "label": ImageFont.truetype(bold, 32),
+            "body": ImageFont.truetype(bold, 40),
+            "button": ImageFont.truetype(bold, 42),
+            "qr_title": ImageFont.truetype(bold, 36),
+            "qr_sub": ImageFont.truetype(regular, 32),
+        }
+    except Exception:
+        return None
+
+
+def _wrap_text(draw, text: str, font, max_width: int) -> list:
+    """단어 단위로 줄바꿈, 한 단어가 너무 길면 글자 단위로 자른다."""
+    lines, line = [], ""
+    for word in text.split(" "):
+        candidate = f"{line} {word}" if line else word
+        if draw.textlength(candidate, font=font) <= max_width:
+            line = candidate
+            continue
+        if line:
+            lines.append(line)
+        line = ""
+        for ch in word:
+            if line and draw.textlength(line + ch, font=font) > max_width:
+                lines.append(line)
+                line = ""
+            line += ch
+    if line:
+        lines.append(line)
+    return lines
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def render_share_card(user_name: str, best_brand: str, best_name: str, weak: str):
+    """'송금 요청서' 카드를 1080x1920 PNG 로 그린다. (사용자, 1위 향수, 부족 오행) 별로 캐시. 못 그리면 None."""
+    fonts = share_card_fonts()
+    if fonts is None:
+        return None
+    try:
+        from PIL import Image, ImageDraw
+    except Exception:
+        return None
+
+    W, H = 1080, 1920
+    img = Image.new("RGB", (W, H), "#f9fafb")
+    draw = ImageDraw.Draw(img)
+    left, right = 110, W - 110
+    draw.rounded_rectangle((left - 20, 150, right + 20, H - 150), radius=48, fill="#ffffff")
+    cx, inner = W // 2, right - left - 80
+
+    def center(y, text, font, fill):
+        draw.text((cx, y), text, font=font, fill=fill, anchor="mt")
+
+    draw.ellipse((cx - 60, 230, cx + 60, 350), fill="#e8f3ff")
+    center(290 - 24, "₩", fonts["brand"], "#3182f6")
+
+    # "{이름}님이" 는 이름만 파란색
+    y = 410
+    name_part, tail = user_name, "님이"
+    while len(name_part) > 1 and draw.textlength(name_part + tail, font=fonts["title"]) > inner:
+        name_part = name_part.rstrip("…")[:-1] + "…"  # 글자는 한 번에 하나씩만 줄인다
+    total = draw.textlength(name_part + tail, font=fonts["title"])
+    x0 = cx - total / 2
+    draw.text((x0, y), name_part, font=fonts["title"], fill="#3182f6")
+    draw.text((x0 + draw.textlength(name_part, font=fonts["title"]), y), tail, font=fonts["title"], fill="#191f28")
+    center(y + 72, "결제를 요청했어요", fonts["title"], "#191f28")
+
+    y = 620
+    for line in _wrap_text(draw, best_brand, fonts["brand"], inner):
+        center(y, line, fonts["brand"], "#191f28")
+        y += 92
+    y += 8
+    for line in _wrap_text(draw, best_name, fonts["name"], inner):
+        center(y, line, fonts["name"], "#4e5968")
+        y += 58
+
+    # 요청 사유 (Pretendard 에 한자가 없어 '목(나무)' 처럼 한글만 쓴다)
+    weak_ko = re.sub(r"[一-鿿]+/", "", ELEMENTS_KO.get(weak, weak))
+    reason = _wrap_text(draw, f"내 사주에 {weak_ko} 기운이 부족하대요.", fonts["body"], inner - 40)
+    reason += _wrap_text(draw, "나 이거 안 뿌리면 진짜 큰일남 사쥬!!!", fonts["body"], inner - 40)
+    y += 50
+    box_h = 110 + 58 * len(reason)
+    draw.rounded_rectangle((left + 20, y, right - 20, y + box_h), radius=32, fill="#f2f4f6")
+    draw.text((left + 60, y + 36), "요청 사유", font=fonts["label"], fill="#8b95a1")
+    for i, line in enumerate(reason):
+        draw.text((left + 60, y + 90 + 58 * i), line, font=fonts["body"], fill="#333d4b")
+    y += box_h + 50
+
+    for label, bg, fg in (("쿨하게 결제해주기", "#3182f6", "#ffffff"), ("쌩까기 (위험)", "#f2f4f6", "#4e5968")):
+        draw.rounded_rectangle((left + 20, y, right - 20, y + 112), radius=32, fill=bg)
+        draw.text((cx, y + 56), label, font=fonts["button"], fill=fg, anchor="mm")
+        y += 132
+
+    qr_png = share_qr_assets(APP_LINK)["png"]
+    if qr_png:
+        y = max(y + 20, H - 150 - 60 - 200)
+        draw.rounded_rectangle((left + 20, y, right - 20, y + 200), radius=32, fill="#f2f4f6")
+        draw.text((left + 60, y + 52), "나도 운명 향수 찾기", font=fonts["qr_title"], fill="#3182f6")
+        draw.text((left + 60, y + 108), "QR 스캔하고 테스트하기", font=fonts["qr_sub"], fill="#4e5968")
+        qr = Image.open(BytesIO(qr_png)).convert("RGBA").resize((140, 140), Image.NEAREST)
+        img.paste(qr, (right - 60 - 140, y + 30), qr)
+
+    buf = BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
 # =========================================================
 # 9) 스텝 초기화
 # =========================================================
@@ -873,9 +1413,9 @@ if "step" not in st.session_state:
 # =========================================================
 st.markdown("<h1>🥺 이 향수 사쥬!!</h1>", unsafe_allow_html=True)
 
-if df.empty:
-    st.error("향수 데이터베이스를 불러오지 못했습니다.")
-    st.stop()
+# step 1 첫 화면은 카탈로그 로드를 기다리지 않는다 (제출할 때 확인)
+if st.session_state["step"] != 1 or catalogue_loader(DATA_SIGNATURE).done():
+    require_catalogue()
 
 
 # =========================================================
@@ -917,71 +1457,82 @@ if st.session_state["step"] == 1:
             st.warning("브랜드명과 향수명을 모두 입력해주세요.")
             st.stop()
 
-        calc_hour = None if know_time else b_hour
-        calc_min = None if know_time else b_min
-
-        loading = st.empty()
-        step_texts = ["🔮 만세력 스캐닝", "🌿 오행 분석", "🧴 향수 노트 분석", "💘 궁합 계산 중"]
-
-        render_loading(loading, 1, "만세력을 확인하고 있어요…", 20, step_texts)
-        time.sleep(0.2)
-
-        result = get_real_saju_elements(birth_date.year, birth_date.month, birth_date.day, calc_hour, calc_min)
-        if result[0] is None:
-            loading.empty()
-            st.error("사주 계산에 실패했습니다.")
-            st.stop()
-        saju_name, e_counts, strong, weak, gapja_str = result
-
-        render_loading(loading, 2, "오행 에너지를 분석하고 있어요…", 45, step_texts)
-        time.sleep(0.2)
-
-        render_loading(loading, 3, "향수 노트를 찾고 있어요…", 65, step_texts)
-        time.sleep(0.1)
-
-        db_row = find_perfume_in_db(df, perf_brand.strip(), perf_name.strip())
-        if db_row is not None:
-            notes_text = safe_text(db_row.get("Notes", ""))
-            notes_source = "db"
-        else:
-            notes_text = get_perfume_notes_via_ai(perf_brand.strip(), perf_name.strip())
-            notes_source = "ai"
-
-        perf_vec = compute_perfume_element_vector(notes_text)
-
-        render_loading(loading, 4, "궁합을 계산하고 있어요…", 85, step_texts, ai_mode=True)
-        time.sleep(0.1)
-
-        score = compute_compatibility_score(e_counts, perf_vec, weak, strong)
-        compat_result = generate_compatibility_result(
-            user_name.strip(), gender, saju_name, strong, weak,
-            perf_brand.strip(), perf_name.strip(), notes_text, score, perf_vec
-        )
-
-        loading.empty()
-
-        st.session_state.update({
-            "step": 2,
-            "user_name": user_name.strip(),
-            "gender": gender,
-            "birth_date": birth_date,
-            "know_time": know_time,
-            "b_hour": None if know_time else b_hour,
-            "b_min": None if know_time else b_min,
-            "saju_name": saju_name,
-            "e_counts": e_counts,
-            "strong": strong,
-            "weak": weak,
-            "session_id": f"{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}",
-            "perf_brand": perf_brand.strip(),
-            "perf_name": perf_name.strip(),
-            "notes_text": notes_text,
-            "notes_source": notes_source,
-            "perf_vec": perf_vec,
-            "compat_score": score,
-            "compat_result": compat_result,
-        })
-        st.rerun()
+        session_id = f"{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        # st.stop()/st.rerun() 으로 빠져나가도 걸린 시간은 기록된다
+        with profile_submit("step1", session_id), metrics.stage("step1_submit"):
+            calc_hour = None if know_time else b_hour
+            calc_min = None if know_time else b_min
+            catalogue = require_catalogue()
+
+            loading = st.empty()
+            progress = LoadingProgress(loading, [
+                ("saju", "🔮 만세력 스캐닝", "만세력을 확인하고 있어요…"),
+                ("elements", "🌿 오행 분석", "오행 에너지를 분석하고 있어요…"),
+                ("notes", "🧴 향수 노트 분석", "향수 노트를 찾고 있어요…"),
+                ("compat", "💘 궁합 계산 중", "궁합을 계산하고 있어요…"),
+            ])
+
+            # DB에 없는 향수면 AI 노트 조회를 먼저 띄워 두고, 그동안 사주를 계산
+            with metrics.stage("db_lookup"):
+                perfume_index = load_perfume_index(DATA_SIGNATURE)
+                db_row = find_perfume_in_db(catalogue, perf_brand.strip(), perf_name.strip(), index=perfume_index)
+            metrics.cache_lookup("perfume_db", db_row is not None)
+            notes_future = None
+            if db_row is None:
+                notes_future = submit_llm(aget_cached_perfume_notes(perf_brand.strip(), perf_name.strip(), index=perfume_index))
+
+            with metrics.stage("saju"):
+                result = get_real_saju_elements(birth_date.year, birth_date.month, birth_date.day, calc_hour, calc_min)
+            if result[0] is None:
+                if notes_future is not None:
+                    notes_future.cancel()
+                loading.empty()
+                st.error("사주 계산에 실패했습니다.")
+                st.stop()
+            saju_name, e_counts, strong, weak, gapja_str = result
+            # 사주 조회가 오행 개수까지 돌려주므로 두 단계가 함께 끝난다
+            progress.done("elements", ai_mode=notes_future is not None)
+
+            if db_row is not None:
+                notes_text = safe_text(db_row.get("Notes", ""))
+                notes_source = "ai" if db_row.get("_source") == "ai" else "db"
+            else:
+                notes_text = notes_future.result()
+                notes_source = "ai"
+
+            perf_vec = compute_perfume_element_vector(notes_text)
+            progress.done("notes", ai_mode=HAS_AI)
+
+            score = compute_compatibility_score(e_counts, perf_vec, weak, strong)
+            compat_result = generate_compatibility_result(
+                user_name.strip(), gender, saju_name, strong, weak,
+                perf_brand.strip(), perf_name.strip(), notes_text, score, perf_vec
+            )
+            progress.done("compat")
+            progress.finish()
+
+            st.session_state.update({
+                "step": 2,
+                "user_name": user_name.strip(),
+                "gender": gender,
+                "birth_date": birth_date,
+                "know_time": know_time,
+                "b_hour": None if know_time else b_hour,
+                "b_min": None if know_time else b_min,
+                "saju_name": saju_name,
+                "e_counts": e_counts,
+                "strong": strong,
+                "weak": weak,
+                "session_id": session_id,
+                "perf_brand": perf_brand.strip(),
+                "perf_name": perf_name.strip(),
+                "notes_text": notes_text,
+                "notes_source": notes_source,
+                "perf_vec": perf_vec,
+                "compat_score": score,
+                "compat_result": compat_result,
+            })
+            st.rerun()
 
 
 # =========================================================
@@ -1088,6 +1639,17 @@ elif st.session_state["step"] == 3:
     s = st.session_state
     weak_ko = ELEMENTS_KO.get(s["weak"], s["weak"])
 
+    # 기본 필터 그대로 제출하는 경우가 많으므로, 그 Top3 기준 사주풀이를 미리 생성해 둔다
+    if HAS_AI and "reading_prefetch" not in s:
+        guess = cached_recommend_rows(s["weak"], s["strong"], [], [], BRAND_FILTER_OPTIONS[1], GENDER_FILTER_OPTIONS[0], k=3)
+        if len(guess) >= 3:
+            s["reading_prefetch"] = {
+                "top3_rows": [r.row for r in guess],
+                "job": start_reading_job(
+                    s["user_name"], s["gender"], s["saju_name"], s["strong"], s["weak"], top3_frame(guess, s["weak"]), s["know_time"]
+                ),
+            }
+
     st.markdown(f'<div class="step-header">🌿 향수 취향 설정</div>', unsafe_allow_html=True)
     st.markdown(f'<div class="step-sub"><b>{_html.escape(s["user_name"])}</b>님의 부족한 <b>{_html.escape(weak_ko)}</b> 기운을 채울<br>향수를 골라드릴게요!</div>', unsafe_allow_html=True)
 
@@ -1100,13 +1662,13 @@ elif st.session_state["step"] == 3:
 
         gender_filter = st.radio(
             "향수 성향",
-            ["전체", "여성향", "남성향", "중성향"],
+            GENDER_FILTER_OPTIONS,
             horizontal=True,
             index=0
         )
         brand_filter_mode = st.radio(
             "브랜드 범위",
-            ["전체 브랜드", "유명 브랜드 위주"],
+            BRAND_FILTER_OPTIONS,
             horizontal=True,
             index=1
         )
@@ -1114,53 +1676,65 @@ elif st.session_state["step"] == 3:
         submit3 = st.form_submit_button("🔮 향수 3개 추천받기")
 
     if submit3:
-        loading = st.empty()
-        step_texts = ["🌿 오행 필터 적용", "🧴 향수 매칭", "✍️ 처방전 작성"]
-
-        render_loading(loading, 1, "조건에 맞는 향수를 찾고 있어요…", 30, step_texts)
-        time.sleep(0.2)
-
-        calc_hour = s.get("b_hour")
-        calc_min = s.get("b_min")
-
-        rec_df = recommend_perfumes(df.copy(), s["weak"], s["strong"], pref_tags, dislike_tags, brand_filter_mode, gender_filter)
-        if rec_df.empty or len(rec_df) < 3:
-            loading.empty()
-            st.error("조건에 맞는 향수가 부족해요. 필터를 줄여주세요.")
-            st.stop()
-        top3 = rec_df.head(3).copy()
-
-        render_loading(loading, 2, "향수를 고르고 있어요…", 60, step_texts)
-        time.sleep(0.2)
-
-        render_loading(loading, 3, "사쥬 마스터가 처방전을 쓰는 중이에요…", 85, step_texts, ai_mode=True)
-        time.sleep(0.1)
-
-        reading_result = generate_comprehensive_reading(
-            s["user_name"], s["gender"], s["saju_name"], s["strong"], s["weak"], top3, s["know_time"]
-        )
-
-        render_loading(loading, 3, "마무리 정리 중이에요…", 100, step_texts)
-        time.sleep(0.15)
-        loading.empty()
-
-        try:
-            save_recommendation_log(
-                s["session_id"], s["user_name"], s["gender"], s["birth_date"],
-                s["know_time"], s["saju_name"], s["strong"], s["weak"], top3
-            )
-        except Exception:
-            pass
+        # st.stop()/st.rerun() 으로 빠져나가도 걸린 시간은 기록된다
+        with profile_submit("step3", s["session_id"]), metrics.stage("step3_submit"):
+            loading = st.empty()
+            progress = LoadingProgress(loading, [
+                ("filter", "🌿 오행 필터 적용", "조건에 맞는 향수를 찾고 있어요…"),
+                ("match", "🧴 향수 매칭", "향수를 고르고 있어요…"),
+                ("reading", "✍️ 처방전 작성", "처방전을 준비하고 있어요…"),
+            ])
+
+            calc_hour = s.get("b_hour")
+            calc_min = s.get("b_min")
+
+            top3_recs = cached_recommend_rows(s["weak"], s["strong"], pref_tags, dislike_tags, brand_filter_mode, gender_filter, k=3)
+            if len(top3_recs) < 3:
+                loading.empty()
+                st.error("조건에 맞는 향수가 부족해요. 필터를 줄여주세요.")
+                st.stop()
+            top3 = top3_frame(top3_recs, s["weak"])
+            # 필터와 점수 계산은 한 번의 벡터 연산으로 끝난다
+            progress.done("match")
+
+            # 사주풀이는 여기서 시작만 하고 결과 화면(사주풀이 탭)에서 스트리밍으로 그린다
+            prefetch = st.session_state.pop("reading_prefetch", None)
+            if prefetch is not None and prefetch["top3_rows"] == [r.row for r in top3_recs]:
+                reading_job = prefetch["job"]
+            else:
+                if prefetch is not None:
+                    prefetch["job"]["future"].cancel()
+                reading_job = start_reading_job(
+                    s["user_name"], s["gender"], s["saju_name"], s["strong"], s["weak"], top3, s["know_time"]
+                )
 
-        st.session_state.update({
-            "step": 4,
-            "top3": top3,
-            "reading_result": reading_result,
-        })
-        st.rerun()
+            progress.done("reading")
+            progress.finish()
+
+            try:
+                with metrics.stage("logging"):
+                    save_recommendation_log(
+                        s["session_id"], s["user_name"], s["gender"], s["birth_date"],
+                        s["know_time"], s["saju_name"], s["strong"], s["weak"], top3
+                    )
+            except Exception:
+                pass
+
+            # 세션에는 행 번호 + 점수만 둔다 (표시 필드는 step 4 에서 카탈로그로부터 꺼냄)
+            st.session_state.update({
+                "step": 4,
+                "top3": top3_recs,
+                "catalogue_signature": DATA_SIGNATURE,
+                "reading_result": None,
+                "reading_job": reading_job,
+            })
+            st.rerun()
 
     st.markdown("<br>", unsafe_allow_html=True)
     if st.button("← 궁합 결과로 돌아가기", use_container_width=False):
+        prefetch = st.session_state.pop("reading_prefetch", None)
+        if prefetch is not None:
+            prefetch["job"]["future"].cancel()
         st.session_state["step"] = 2
         st.rerun()
 
@@ -1170,7 +1744,7 @@ elif st.session_state["step"] == 3:
 # =========================================================
 elif st.session_state["step"] == 4:
     s = st.session_state
-    top3 = s["top3"]
+    top3 = top3_frame(s["top3"], s["weak"], s.get("catalogue_signature", ""))
     saju_name = s["saju_name"]
     strong = s["strong"]
     weak = s["weak"]
@@ -1178,36 +1752,14 @@ elif st.session_state["step"] == 4:
     user_name = s["user_name"]
     gender = s["gender"]
     session_id = s["session_id"]
-    reading_result = s.get("reading_result", "") or ""
+    reading_result = s.get("reading_result")
 
     survey_url = f"{SURVEY_BASE_URL}{urllib.parse.quote(session_id)}"
-    app_link = "[https://fate-scent-mvp.streamlit.app/](https://fate-scent-mvp.streamlit.app/)"
 
     st.markdown(f"### {_html.escape(user_name)}님의 향수 추천 결과")
 
-    hero_text = ""
-    m = re.search(r"<h2[^>]*>(.*?)</h2>", reading_result, flags=re.S | re.I)
-    if m:
-        hero_text = re.sub(r"<[^>]+>", "", m.group(1))
-        hero_text = _html.unescape(hero_text).strip()
-    
-    # 🚨 [수정 완료] 큰따옴표 안의 큰따옴표로 인한 Syntax Error 해결
-    if not hero_text:
-        hero_text = f"{ELEMENTS_KO.get(strong,strong)} — '당신의 흐름은 분명합니다.'"
-
-    time_line = "⏰ 태어난 시간이 입력되었습니다." if not know_time else "⏰ 시간 미입력: 정오 기준(오차 가능)으로 분석했어요."
-
-    st.markdown(f"""
-    <div class="hero">
-      <div class="hero-title">{_html.escape(hero_text)}</div>
-      <div class="hero-sub">{_html.escape(time_line)}</div>
-      <div class="kpi-row">
-        <div class="kpi"><b>가장 강한 기운</b><div class="val">{ELEMENT_EMOJI[strong]} {ELEMENTS_KO[strong]}</div></div>
-        <div class="kpi"><b>보완할 기운</b><div class="val">{ELEMENT_EMOJI[weak]} {ELEMENTS_KO[weak]}</div></div>
-      </div>
-      <div class="small-note" style="margin-top:10px;">원하는 것만 빠르게 볼 수 있게 <b>탭</b>으로 나눴어요.</div>
-    </div>
-    """, unsafe_allow_html=True)
+    hero_slot = st.empty()
+    render_result_hero(hero_slot, reading_result or "", strong, weak, know_time)
 
     tab1, tab2, tab3, tab4 = st.tabs(["✨ 요약", "📜 사주풀이(자세히)", "🧴 향수 Top3", "🥺 사쥬!!!(공유)"])
 
@@ -1256,8 +1808,11 @@ elif st.session_state["step"] == 4:
         """
         st.markdown(magazine_css, unsafe_allow_html=True)
         st.markdown('<div class="section-card">', unsafe_allow_html=True)
-        reading_body = re.sub(r"<h2[^>]*>.*?</h2>", "", reading_result, flags=re.S | re.I)
-        st.markdown(f'<div class="saju-magazine">\n{reading_body}\n</div>', unsafe_allow_html=True)
+        reading_slot = st.empty()
+        if reading_result is None:
+            reading_slot.markdown('<div class="small-muted">✍️ 사쥬 마스터가 처방전을 쓰는 중이에요…</div>', unsafe_allow_html=True)
+        else:
+            render_reading_body(reading_slot, reading_result)
         st.markdown('</div>', unsafe_allow_html=True)
 
     # --- 향수 Top3 탭 ---
@@ -1279,19 +1834,8 @@ elif st.session_state["step"] == 4:
         best_brand = safe_text(row0.get("Brand"))
         best_name = safe_text(row0.get("Name"))
 
-        qr_img_b64 = ""
-        try:
-            import qrcode
-            import base64
-            qr = qrcode.QRCode(box_size=4, border=0)
-            qr.add_data(app_link)
-            qr.make(fit=True)
-            img = qr.make_image(fill_color="#3182f6", back_color="transparent")
-            buf = BytesIO()
-            img.save(buf, format="PNG")
-            qr_img_b64 = base64.b64encode(buf.getvalue()).decode("utf-8")
-        except Exception:
-            qr_img_b64 = ""
+        with metrics.stage("qr"):
+            qr_img_b64 = share_qr_assets(APP_LINK)["b64"]
 
         qr_block = ""
         if qr_img_b64:
@@ -1316,11 +1860,35 @@ elif st.session_state["step"] == 4:
 </div>
 </div>"""
         st.markdown(toss_ui_html, unsafe_allow_html=True)
+
+        # 캡처가 어려운 기기용 카드 이미지 자리. 사주풀이 스트리밍이 끝난 뒤에 채운다
+        card_slot = st.container()
         st.markdown("---")
         st.markdown("### 📝 서비스 개선에 참여하기")
         st.info("결과가 맘에 드셨다면 1분 설문 부탁드려요! 여러분의 피드백이 다음 업데이트에 바로 반영됩니다.")
         st.link_button("📝 1분 설문 참여하기 (세션ID 자동입력)", survey_url, use_container_width=True)
 
+    # 나머지 탭을 먼저 그린 뒤, 사주풀이를 받는 대로 탭에 흘려 넣는다
+    if reading_result is None:
+        reading_result = stream_reading_job(s["reading_job"], lambda html: render_reading_body(reading_slot, html))
+        s["reading_result"] = reading_result
+        s.pop("reading_job", None)
+        render_reading_body(reading_slot, reading_result)
+        render_result_hero(hero_slot, reading_result, strong, weak, know_time)
+
+    # 같은 카드를 서버에서 이미지로 그려 저장 (Pillow + Pretendard 있을 때만, 버튼을 누른 사람만 그린다)
+    with card_slot:
+        if share_card_fonts() is not None:
+            if s.get("share_card_requested") or st.button("🖼️ 송금 요청서 이미지 만들기", use_container_width=True):
+                s["share_card_requested"] = True
+                with metrics.stage("share_card"):
+                    card_png = render_share_card(user_name, best_brand, best_name, weak)
+                if card_png:
+                    st.download_button(
+                        "🖼️ 송금 요청서 이미지 저장하기", card_png,
+                        file_name=f"fate_scent_{weak.lower()}.png", mime="image/png", use_container_width=True
+                    )
+
     st.markdown("<br>", unsafe_allow_html=True)
     if st.button("← 처음부터 다시 하기", use_container_width=False):
         for k in list(st.session_state.keys()):
@@ -1331,18 +1899,104 @@ elif st.session_state["step"] == 4:
 # =========================================================
 # 11) 관리자용 로그
 # =========================================================
+def render_metrics_panel():
+    if not metrics.ENABLED:
+        st.caption("계측이 꺼져 있어요. FATESCENT_METRICS=1 로 실행하면 이 프로세스의 단계별 시간이 쌓입니다.")
+        return
+    snap = metrics.REGISTRY.snapshot()
+    st.caption(f"프로세스 시작 후 {snap['uptime_sec'] / 60:,.0f}분 누적 · p50/p95 는 히스토그램 버킷 보간값")
+    if snap["stages"]:
+        st.dataframe(
+            pd.DataFrame(snap["stages"]).rename(columns={
+                "stage": "단계", "count": "횟수", "mean_ms": "평균 ms", "p50_ms": "p50 ms", "p95_ms": "p95 ms", "max_ms": "최대 ms"
+            }).round(1),
+            hide_index=True, use_container_width=True
+        )
+    if snap["caches"]:
+        caches = pd.DataFrame(snap["caches"]).rename(columns={"cache": "캐시", "hits": "적중", "misses": "미스", "hit_rate": "적중률"})
+        caches["적중률"] = caches["적중률"].map("{:.1%}".format)
+        st.dataframe(caches, hide_index=True, use_container_width=True)
+    if snap["tokens"]:
+        st.caption(" · ".join(f"{t['kind']} {t['calls']:,}회 / {t['tokens']:,} 토큰" for t in snap["tokens"]))
+    prom_text = metrics.REGISTRY.render_prometheus()
+    st.download_button("📥 Prometheus 텍스트 내려받기", prom_text, file_name="fatescent.prom", mime="text/plain")
+
+
+def render_profiles_panel():
+    runs = profiling.list_profiles()
+    if not runs:
+        st.caption("저장된 프로파일이 없어요. FATESCENT_PROFILE=1 또는 FATESCENT_PROFILE_TOKEN + ?profile= 로 켭니다.")
+        return
+    st.caption(f"{len(runs)}개 · {sum(r[2] for r in runs) / 1e6:,.1f} MB (보관 한도 {profiling.PROFILE_MAX_RUNS}개)")
+    stem = st.selectbox("프로파일", [r[0] for r in runs])
+    c1, c2 = st.columns(2)
+    for col, suffix, label in ((c1, ".folded", "🔥 플레임 그래프용 (.folded)"), (c2, ".prof", "📊 cProfile (.prof)")):
+        try:
+            with open(os.path.join(profiling.PROFILE_DIR, stem + suffix), "rb") as f:
+                col.download_button(label, f.read(), file_name=stem + suffix, use_container_width=True)
+        except FileNotFoundError:
+            pass
+
+
 st.markdown("<br><br><br>", unsafe_allow_html=True)
 with st.expander("🔐 [관리자용] 추천 로그 데이터 확인"):
     admin_pw = st.text_input("관리자 암호를 입력하세요", type="password")
     if admin_pw == "saju1234":
         st.success("인증 완료!")
-        if os.path.exists(LOG_PATH):
-            with open(LOG_PATH, "rb") as f:
+        llm_stats = llm_cache_stats()
+        st.caption(
+            f"LLM 캐시 적중 {llm_stats['hits']}회 / 미스 {llm_stats['misses']}회 · "
+            f"절약 토큰 {llm_stats['saved_tokens']:,} · 절약 시간 {llm_stats['saved_sec']:.1f}초"
+        )
+        log_writer = recommendation_log_writer()
+        st.caption(
+            f"로그 기록 {log_writer.written:,}행 · 대기 {log_writer.queue.qsize():,}건 · "
+            f"유실 {log_writer.dropped:,}행 · 실패 {log_writer.failed:,}행"
+        )
+        if st.toggle("⏱️ 단계별 지연 시간 · 캐시 적중률 보기", value=False):
+            render_metrics_panel()
+        if st.toggle("🧪 저장된 프로파일 보기", value=False):
+            render_profiles_panel()
+        try:
+            stats = load_log_analytics()
+        except Exception:
+            stats = None
+        if stats and stats["events"]:
+            m1, m2, m3 = st.columns(3)
+            m1.metric("누적 추천", f"{stats['events']:,}회")
+            m2.metric("누적 로그 행", f"{stats['rows']:,}")
+            this_month = datetime.datetime.now().strftime("%Y-%m")
+            m3.metric("이번 달 추천", f"{stats['months'].get(this_month, 0):,}회")
+
+            st.markdown("##### 부족한 오행 분포")
+            st.bar_chart(pd.DataFrame(
+                {"추천 수": [stats["weakest"].get(e, 0) for e in ELEMENTS]},
+                index=[ELEMENTS_KO[e] for e in ELEMENTS]
+            ))
+            c1, c2 = st.columns(2)
+            with c1:
+                st.markdown("##### 많이 추천된 향수")
+                st.dataframe(
+                    pd.DataFrame(stats["top_perfumes"], columns=["브랜드", "향수", "추천 수"]),
+                    hide_index=True, use_container_width=True
+                )
+            with c2:
+                st.markdown("##### 브랜드 점유율")
+                brands = pd.DataFrame(stats["top_brands"], columns=["브랜드", "추천 수"])
+                brands["점유율"] = (brands["추천 수"] / max(stats["rows"], 1)).map("{:.1%}".format)
+                st.dataframe(brands, hide_index=True, use_container_width=True)
+
+            # 전체 내보내기는 로그 양에 비례하므로 버튼을 눌렀을 때만 만든다
+            if st.button("📦 누적 추천 로그 CSV 만들기"):
                 st.download_button(
                     label="📥 누적 추천 로그 CSV 다운로드",
-                    data=f, file_name="recommendation_logs.csv", mime="text/csv"
+                    data=export_logs_csv(), file_name="recommendation_logs.csv", mime="text/csv"
                 )
         else:
             st.write("아직 저장된 로그가 없습니다.")
     elif admin_pw != "":
         st.error("비밀번호가 틀렸습니다.")
+
+
+# 화면을 다 보낸 다음에 무거운 import 를 미리 해 둔다
+warm_up_llm_client()
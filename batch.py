@@ -0,0 +1,232 @@
+# =========================================================
+# 설문 응답자 일괄 채점 CLI
+#   python batch.py respondents.csv results.parquet --workers 4 --k 3
+#   입력 컬럼: birth_date(YYYY-MM-DD), birth_time(HH:MM, 비우면 시간 모름),
+#             pref_tags / dislike_tags ('|' 구분), gender_filter, brand_filter, id (모두 선택)
+#   id 가 없으면 입력 전체 기준 행 번호(0부터). 필터 값이 선택지에 없는 행은 건너뛴 행으로 센다.
+#   입력은 청크 단위로 읽고, 프로세스 풀에 넘기는 청크 수를 제한해 메모리를 일정하게 유지한다.
+# =========================================================
+import argparse
+import datetime
+import functools
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from engine import (
+    DATA_PATH, ELEMENTS, GENDER_FILTER_OPTIONS, BRAND_FILTER_OPTIONS,
+    safe_text, get_real_saju_elements, compute_perfume_element_vector, compute_compatibility_score,
+    load_catalogue_frame, load_saju_table, recommend_perfumes, _data_signature,
+)
+
+TAG_SEP = "|"
+REC_CACHE_SIZE = 4096
+OUTPUT_COLUMNS = (
+    ["id", "birth_date", "birth_time", "saju_name", "strongest", "weakest"]
+    + [f"count_{e}" for e in ELEMENTS]
+    + ["rank", "brand", "name", "rec_score", "compatibility"]
+)
+
+# 워커 프로세스별 상태 (initializer 에서 한 번 채움)
+_WORKER = {}
+
+
+def _init_worker(data_path, signature, k, gender_filter, brand_filter):
+    catalogue = load_catalogue_frame(data_path, signature)  # 부모가 만든 컴파일본을 mmap으로 연다
+    load_saju_table()
+    _WORKER.update(
+        k=k, gender_filter=gender_filter, brand_filter=brand_filter,
+        top_k=functools.lru_cache(maxsize=REC_CACHE_SIZE)(functools.partial(_top_k_records, catalogue, k)),
+    )
+
+
+def _top_k_records(catalogue, k, weakest, strongest, pref_key, dislike_key, brand_filter_mode, gender_filter):
+    """같은 (오행, 태그, 필터) 조합은 응답자가 달라도 결과가 같으므로 워커 안에서 LRU로 재사용."""
+    rec = recommend_perfumes(catalogue, weakest, strongest, list(pref_key), list(dislike_key), brand_filter_mode, gender_filter, k=k)
+    return tuple(
+        (safe_text(r.get("Brand", "")), safe_text(r.get("Name", "")), float(r.get("score", 0.0)),
+         compute_perfume_element_vector(safe_text(r.get("Notes", ""))))
+        for _, r in rec.iterrows()
+    )
+
+
+def _split_tags(value) -> tuple:
+    return tuple(sorted({t.strip() for t in safe_text(value).split(TAG_SEP) if t.strip()}))
+
+
+def _parse_time(value):
+    """'HH:MM' → (시, 분). 비어 있거나 형식이 다르면 (None, None) = 시간 모름."""
+    try:
+        hour, minute = (int(p) for p in safe_text(value).split(":")[:2])
+        if 0 <= hour < 24 and 0 <= minute < 60:
+            return hour, minute
+    except Exception:
+        pass
+    return None, None
+
+
+def _parse_option(value, options: list, default: str):
+    """빈 값이면 기본값, 선택지에 없는 값(오타 등)이면 None → 그 행은 건너뛴다."""
+    value = safe_text(value) or default
+    return value if value in options else None
+
+
+def score_chunk(chunk: pd.DataFrame, offset: int = 0):
+    """응답자 청크 → (결과 DataFrame, 건너뛴 행 수). offset 은 이 청크 첫 행의 입력 전체 기준 번호 (id 가 없을 때 사용)."""
+    rows = []
+    skipped = 0
+    for i, r in enumerate(chunk.to_dict("records")):
+        brand_filter = _parse_option(r.get("brand_filter"), BRAND_FILTER_OPTIONS, _WORKER["brand_filter"])
+        gender_filter = _parse_option(r.get("gender_filter"), GENDER_FILTER_OPTIONS, _WORKER["gender_filter"])
+        if brand_filter is None or gender_filter is None:
+            skipped += 1
+            continue
+        try:
+            birth = datetime.date.fromisoformat(safe_text(r.get("birth_date"))[:10])
+        except Exception:
+            skipped += 1
+            continue
+        hour, minute = _parse_time(r.get("birth_time"))
+        saju_name, counts, strong, weak, _ = get_real_saju_elements(birth.year, birth.month, birth.day, hour, minute)
+        if saju_name is None:
+            skipped += 1
+            continue
+
+        top = _WORKER["top_k"](
+            weak, strong, _split_tags(r.get("pref_tags")), _split_tags(r.get("dislike_tags")), brand_filter, gender_filter,
+        )
+        base = {
+            "id": safe_text(r.get("id")) or str(offset + i),
+            "birth_date": birth.isoformat(),
+            "birth_time": f"{hour:02d}:{minute:02d}" if hour is not None else "",
+            "saju_name": saju_name, "strongest": strong, "weakest": weak,
+            **{f"count_{e}": counts[e] for e in ELEMENTS},
+        }
+        for rank, (brand, name, rec_score, perf_vec) in enumerate(top, start=1):
+            rows.append({
+                **base, "rank": rank, "brand": brand, "name": name, "rec_score": rec_score,
+                "compatibility": compute_compatibility_score(counts, perf_vec, weak, strong),
+            })
+    return pd.DataFrame(rows, columns=OUTPUT_COLUMNS), skipped
+
+
+def iter_input_chunks(path: str, chunk_size: int):
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+        return
+    yield from pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_size, encoding="utf-8-sig")
+
+
+class ResultWriter:
+    """청크 결과를 순서대로 이어 쓴다. .parquet 이면 row group 단위(pyarrow 필요), 그 외는 CSV."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.parquet = path.endswith(".parquet")
+        self._writer = None
+        self._wrote_csv = False
+        if self.parquet:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise SystemExit("Parquet 출력에는 pyarrow 가 필요합니다 (pip install pyarrow). 또는 .csv 로 저장하세요.")
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def write(self, frame: pd.DataFrame):
+        if frame.empty:
+            return
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table.cast(self._writer.schema))
+        else:
+            frame.to_csv(
+                self.path, mode="a" if self._wrote_csv else "w", header=not self._wrote_csv,
+                index=False, encoding="utf-8" if self._wrote_csv else "utf-8-sig",
+            )
+            self._wrote_csv = True
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def run(args) -> int:
+    signature = _data_signature(args.db)
+    catalogue = load_catalogue_frame(args.db, signature)  # 워커를 띄우기 전에 컴파일본/인덱스를 한 번 만들어 둔다
+    if catalogue.empty:
+        print(f"catalogue not found or empty: {args.db}", file=sys.stderr)
+        return 1
+    del catalogue
+    load_saju_table()
+
+    init_args = (args.db, signature, args.k, args.gender_filter, args.brand_filter)
+    writer = ResultWriter(args.output)
+    started = time.perf_counter()
+    n_in = n_skipped = 0
+
+    def _collect(result, n_rows):
+        nonlocal n_in, n_skipped
+        frame, skipped = result
+        writer.write(frame)
+        n_in += n_rows
+        n_skipped += skipped
+        rate = n_in / max(time.perf_counter() - started, 1e-9)
+        print(f"\r{n_in:,} rows · {rate:,.0f} rows/s", end="", file=sys.stderr)
+
+    try:
+        chunks = iter_input_chunks(args.input, args.chunk_size)
+        offset = 0  # 청크 첫 행의 입력 전체 기준 번호 (Parquet 배치는 인덱스가 매번 0부터라 직접 센다)
+        if args.workers <= 0:
+            _init_worker(*init_args)
+            for chunk in chunks:
+                _collect(score_chunk(chunk, offset), len(chunk))
+                offset += len(chunk)
+        else:
+            with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=init_args) as pool:
+                pending = deque()  # 입력 순서대로 쓰기 위해 오래된 청크부터 기다린다
+                for chunk in chunks:
+                    pending.append((pool.submit(score_chunk, chunk, offset), len(chunk)))
+                    offset += len(chunk)
+                    if len(pending) >= args.max_pending:
+                        future, n_rows = pending.popleft()
+                        _collect(future.result(), n_rows)
+                while pending:
+                    future, n_rows = pending.popleft()
+                    _collect(future.result(), n_rows)
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"\ndone: {n_in:,} rows ({n_skipped:,} skipped) in {elapsed:.1f}s → {args.output}", file=sys.stderr)
+    return 0
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Fate Scent 일괄 사주·향수 추천 채점")
+    p.add_argument("input", help="응답자 파일 (.csv 또는 .parquet)")
+    p.add_argument("output", help="결과 파일 (.parquet 이면 Parquet, 그 외 CSV)")
+    p.add_argument("--db", default=DATA_PATH, help="향수 카탈로그 CSV")
+    p.add_argument("--k", type=int, default=3, help="응답자별 추천 개수")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="프로세스 수 (0이면 현재 프로세스에서 실행)")
+    p.add_argument("--chunk-size", type=int, default=5000, help="한 번에 읽어 워커에 넘기는 행 수")
+    p.add_argument("--max-pending", type=int, default=None, help="동시에 처리 중인 청크 상한 (기본: workers x 2)")
+    p.add_argument("--gender-filter", default=GENDER_FILTER_OPTIONS[0], choices=GENDER_FILTER_OPTIONS)
+    p.add_argument("--brand-filter", default=BRAND_FILTER_OPTIONS[1], choices=BRAND_FILTER_OPTIONS)
+    args = p.parse_args(argv)
+    args.max_pending = args.max_pending or max(args.workers, 1) * 2
+    return args
+
+
+if __name__ == "__main__":
+    sys.exit(run(parse_args()))
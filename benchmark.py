@@ -0,0 +1,333 @@
+# =========================================================
+# 추천 · 검색 · 카탈로그 로드 · 사주 계산 벤치마크 (합성 카탈로그 1k ~ 1M)
+#   python benchmark.py                                   # 1k,10k,100k,1M 측정 후 표 출력
+#   python benchmark.py --sizes 1k,10k --save benchmark_baseline.json
+#   python benchmark.py --compare benchmark_baseline.json --threshold 20   # 최솟값이 20% 넘게 느려지면 exit 1
+#   합성 카탈로그는 실제 CSV 와 같은 컬럼(Brand, Name, Notes, Top/Middle/Base, Gender, Female/Male_Score, 오행)으로
+#   --data-dir 에 한 번 만들어 두고 재사용한다. 시간은 pytest-benchmark 처럼 라운드별 중앙값/최솟값/평균/표준편차.
+#   1 ms 도 안 걸리는 경로는 라운드마다 여러 번 묶어 재고 호출당 시간으로 나눈다 (타이머 오버헤드 제거).
+#   기준선은 절대 시간이라 머신마다 다르다: --compare 를 돌릴 머신에서 --save 로 기준선을 다시 만들어 쓸 것.
+#   라운드가 GATE_MIN_ROUNDS 보다 적은 결과(콜드 로드, 인덱스 빌드 등 한 번 재는 것)는 비교만 표시하고 실패로 치지 않는다.
+#   기준보다 느린 경로가 있으면 그 묶음(사주 / 카탈로그 크기)만 --retries 번까지 다시 재서 경로별 최솟값을 쓴다
+#   (공유 머신의 일시적인 잡음은 다시 재면 사라지고, 실제 회귀는 남는다).
+# =========================================================
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from engine import (
+    ELEMENTS, TAG_TO_KEYWORDS, ELEMENT_KEYWORDS, FAMOUS_BRANDS, GENDER_FILTER_OPTIONS, BRAND_FILTER_OPTIONS,
+    catalogue_artifact_paths, load_catalogue_frame, load_saju_table, get_real_saju_elements,
+    recommend_perfumes, PerfumeIndex, find_perfume_in_db,
+)
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1M": 1_000_000}
+GENERATOR_VERSION = 1
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), "fatescent-bench")
+MIN_ROUND_SEC = 0.002  # 한 라운드(묶음) 최소 시간. 이보다 빠른 호출은 여러 번 묶는다
+GATE_MIN_ROUNDS = 5
+
+NOTE_WORDS = sorted({kw for kws in TAG_TO_KEYWORDS.values() for kw in kws} | {kw for kws in ELEMENT_KEYWORDS.values() for kw in kws})
+NAME_WORDS = ["Rouge", "Blanc", "Noir", "Santal", "Fleur", "Bois", "Eau", "Nuit", "Soleil", "Ciel", "Mousse", "Ambre",
+              "Iris", "Velvet", "Garden", "Morning", "Wild", "Silver", "Golden", "Ocean"]
+NAME_SUFFIXES = ["", "Intense", "Extrait", "Eau de Parfum", "Cologne"]
+
+
+# =========================================================
+# 합성 카탈로그
+# =========================================================
+def make_catalogue(n: int, seed: int = 0) -> pd.DataFrame:
+    """실제 CSV 스키마의 합성 카탈로그. 브랜드 수는 카탈로그 크기에 따라 늘리고 유명 브랜드를 일부 섞는다."""
+    rng = np.random.default_rng(seed)
+    n_brands = max(20, n // 200)
+    brands = np.array(FAMOUS_BRANDS + [f"Maison {i:05d}" for i in range(n_brands)], dtype=object)
+    words = np.array(NOTE_WORDS, dtype=object)
+
+    def pick_notes(k):
+        idx = rng.integers(0, len(words), size=(n, k))
+        return [", ".join(row) for row in words[idx]]
+
+    name_a = rng.integers(0, len(NAME_WORDS), n)
+    name_b = rng.integers(0, len(NAME_WORDS), n)
+    suffix = rng.integers(0, len(NAME_SUFFIXES), n)
+    names = [f"{NAME_WORDS[a]} {NAME_WORDS[b]} {i} {NAME_SUFFIXES[s]}".strip() for i, (a, b, s) in enumerate(zip(name_a, name_b, suffix))]
+
+    elements = rng.random((n, len(ELEMENTS))) * (rng.random((n, len(ELEMENTS))) > 0.25)
+    elements[elements.sum(axis=1) == 0, 0] = 0.5  # 오행 합이 0인 행은 로드할 때 빠지므로 채워 둔다
+    df = pd.DataFrame({
+        "Brand": brands[rng.integers(0, len(brands), n)],
+        "Name": names,
+        "Notes": pick_notes(5),
+        "Description": "",
+        "matched_keywords": pick_notes(2),
+        "Top": pick_notes(2),
+        "Middle": pick_notes(2),
+        "Base": pick_notes(2),
+        "Gender": np.array(["women", "men", "unisex"], dtype=object)[rng.integers(0, 3, n)],
+        "Female_Score": rng.random(n).round(3),
+        "Male_Score": rng.random(n).round(3),
+    })
+    for i, e in enumerate(ELEMENTS):
+        df[e] = elements[:, i].round(3)
+    return df
+
+
+def catalogue_csv(label: str, data_dir: str, seed: int = 0) -> str:
+    path = os.path.join(data_dir, f"bench_{label}_s{seed}_v{GENERATOR_VERSION}.csv")
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        make_catalogue(SIZES[label], seed).to_csv(tmp_path, index=False, encoding="utf-8-sig")
+        os.replace(tmp_path, path)
+    return path
+
+
+def clear_artifacts(path: str):
+    index_path, catalogue_dir = catalogue_artifact_paths(path)
+    if os.path.exists(index_path):
+        os.remove(index_path)
+    shutil.rmtree(catalogue_dir, ignore_errors=True)
+
+
+# =========================================================
+# 측정
+# =========================================================
+def _calibrate(fn) -> int:
+    """라운드 하나가 MIN_ROUND_SEC 이상 걸리도록 묶을 호출 수."""
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= MIN_ROUND_SEC or number >= 1_000_000:
+            return number
+        number = max(number * 2, int(number * MIN_ROUND_SEC / max(elapsed, 1e-9)))
+
+def bench(fn, min_rounds: int = 5, max_time: float = 2.0, max_rounds: int = 200) -> dict:
+    """라운드마다 fn() 을 (보정한 횟수만큼) 실행하고 호출당 시간을 기록. 최소 min_rounds, 그 뒤로는 max_time 까지만 반복."""
+    number = _calibrate(fn)  # 워밍업 겸 (캐시 · 지연 import)
+    times = []
+    started = time.perf_counter()
+    while len(times) < max_rounds and (len(times) < min_rounds or time.perf_counter() - started < max_time):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - t0) / number)
+    return _stats(times, number)
+
+def bench_once(fn, rounds: int = 1) -> dict:
+    """워밍업 없이 rounds 번 (콜드 로드처럼 매번 상태를 지우고 재는 경우)."""
+    times = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return _stats(times)
+
+def _stats(times: list, iterations: int = 1) -> dict:
+    ms = [t * 1000 for t in times]
+    return {
+        "rounds": len(ms),
+        "iterations": iterations,
+        "min_ms": round(min(ms), 4),
+        "median_ms": round(statistics.median(ms), 4),
+        "mean_ms": round(statistics.fmean(ms), 4),
+        "stddev_ms": round(statistics.stdev(ms), 4) if len(ms) > 1 else 0.0,
+        "ops": round(1000 / statistics.median(ms), 2) if statistics.median(ms) > 0 else None,
+    }
+
+
+class _Cycle:
+    """호출마다 다음 입력을 돌려 준다 (한 입력만 반복해 캐시 효과로 빨라 보이지 않게)."""
+
+    def __init__(self, items):
+        self.items = items
+        self.i = 0
+
+    def next(self):
+        item = self.items[self.i % len(self.items)]
+        self.i += 1
+        return item
+
+
+def recommend_profiles(seed: int = 0, n: int = 24) -> list:
+    rng = np.random.default_rng(seed)
+    tags = list(TAG_TO_KEYWORDS)
+    out = []
+    for _ in range(n):
+        weak, strong = rng.choice(ELEMENTS, 2, replace=False)
+        pref = list(rng.choice(tags, rng.integers(0, 3), replace=False))
+        dislike = list(rng.choice([t for t in tags if t not in pref], rng.integers(0, 2), replace=False))
+        out.append((str(weak), str(strong), pref, dislike))
+    return out
+
+
+def bench_size(label: str, args) -> dict:
+    results = {}
+    path = catalogue_csv(label, args.data_dir, args.seed)
+    cold_rounds = 1 if SIZES[label] >= 100_000 else 3
+
+    def _cold_load():
+        clear_artifacts(path)
+        load_catalogue_frame(path)
+    results[f"load_data_cold[{label}]"] = bench_once(_cold_load, cold_rounds)
+    results[f"load_data_warm[{label}]"] = bench(lambda: load_catalogue_frame(path), max_time=args.max_time)
+
+    df = load_catalogue_frame(path)
+    profiles = _Cycle(recommend_profiles(args.seed))
+
+    def _recommend(brand_filter, gender_filter):
+        def _run():
+            weak, strong, pref, dislike = profiles.next()
+            recommend_perfumes(df, weak, strong, pref, dislike, brand_filter, gender_filter, k=3)
+        return _run
+    results[f"recommend_k3[{label}]"] = bench(_recommend(BRAND_FILTER_OPTIONS[0], GENDER_FILTER_OPTIONS[0]), max_time=args.max_time)
+    results[f"recommend_k3_filtered[{label}]"] = bench(_recommend(BRAND_FILTER_OPTIONS[1], GENDER_FILTER_OPTIONS[1]), max_time=args.max_time)
+
+    results[f"perfume_index_build[{label}]"] = bench_once(lambda: PerfumeIndex(df["Brand"], df["Name"]))
+    index = PerfumeIndex(df["Brand"], df["Name"])
+    rng = np.random.default_rng(args.seed)
+    sample = [(str(df["Brand"].iloc[i]), str(df["Name"].iloc[i])) for i in rng.integers(0, len(df), 32)]
+    exact = _Cycle(sample)
+    typo = _Cycle([(b, n[:-2] + n[-1:] if len(n) > 3 else n) for b, n in sample])  # 한 글자 빠진 오타
+    missing = _Cycle([("Nowhere Parfum", f"zq{i}x unknown") for i in range(32)])
+    for name, cycle in (("exact", exact), ("typo", typo), ("miss", missing)):
+        results[f"find_perfume_{name}[{label}]"] = bench(lambda c=cycle: find_perfume_in_db(df, *c.next(), index=index), max_time=args.max_time)
+    return results
+
+
+def bench_saju(args) -> dict:
+    if load_saju_table() is None:
+        print("WARNING saju_table.npy not found: saju_table measures the calendar fallback (run python saju_table.py)", file=sys.stderr)
+    rng = np.random.default_rng(args.seed)
+    in_table = _Cycle([
+        (int(y), int(m), int(d), int(h), int(mi))
+        for y, m, d, h, mi in zip(rng.integers(1950, 2020, 64), rng.integers(1, 13, 64), rng.integers(1, 29, 64),
+                                   rng.integers(0, 24, 64), rng.integers(0, 60, 64))
+    ])
+    before_table = _Cycle([(1930 + i % 19, 1 + i % 12, 1 + i % 28, None, None) for i in range(64)])  # 테이블 밖 → 만세력
+    return {
+        "saju_table": bench(lambda: get_real_saju_elements(*in_table.next()), max_time=args.max_time),
+        "saju_calendar": bench(lambda: get_real_saju_elements(*before_table.next()), max_time=args.max_time),
+    }
+
+
+# =========================================================
+# 리포트 / 기준선 비교
+# =========================================================
+def environment() -> dict:
+    return {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+        "machine": platform.machine(), "system": platform.system(), "cpus": os.cpu_count(),
+    }
+
+def compare(results: dict, baseline: dict, threshold_pct: float) -> list:
+    """기준선보다 최솟값이 threshold_pct 넘게 느려진 경로 목록 [(이름, 기준 ms, 현재 ms, 변화율 %)].
+    최솟값은 같은 머신에서 잡음(다른 프로세스, 스케줄링)의 영향을 가장 덜 받는다.
+    양쪽 중 라운드가 GATE_MIN_ROUNDS 보다 적은 결과는 변화율만 적고 실패로 치지 않는다."""
+    slower = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if not base or not base.get("min_ms"):
+            continue
+        change = (r["min_ms"] / base["min_ms"] - 1) * 100
+        r["baseline_min_ms"] = base["min_ms"]
+        r["change_pct"] = round(change, 1)
+        r["gated"] = min(r["rounds"], base.get("rounds", 0)) >= GATE_MIN_ROUNDS
+        if r["gated"] and change > threshold_pct:
+            slower.append((name, base["min_ms"], r["min_ms"], change))
+    return slower
+
+def environment_mismatch(baseline_env: dict) -> list:
+    """기준선을 만든 환경과 지금 환경이 다른 항목 (날짜 제외)."""
+    now = environment()
+    return [f"{k}: {baseline_env.get(k)} → {now[k]}" for k in now if k != "date" and baseline_env.get(k) != now[k]]
+
+def _group(name: str) -> str:
+    """결과 이름 → 다시 잴 묶음 ("saju" 또는 카탈로그 크기 라벨)."""
+    return name[name.index("[") + 1:-1] if "[" in name else "saju"
+
+def merge_best(results: dict, rerun: dict):
+    """다시 잰 결과 중 최솟값이 더 작은 것만 바꿔 넣는다."""
+    for name, r in rerun.items():
+        if name in results and r["min_ms"] < results[name]["min_ms"]:
+            results[name] = r
+
+def print_report(results: dict):
+    header = f"{'benchmark':<36}{'rounds':>8}{'min ms':>12}{'median ms':>12}{'mean ms':>12}{'stddev':>10}{'ops/s':>11}{'min vs base':>13}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        change = f"{r['change_pct']:+.1f}%" if "change_pct" in r else "-"
+        if "change_pct" in r and not r["gated"]:
+            change = f"({change})"  # 라운드가 적어 게이트에서 제외
+        ops = f"{r['ops']:,.1f}" if r["ops"] is not None else "-"
+        print(f"{name:<36}{r['rounds']:>8}{r['min_ms']:>12,.3f}{r['median_ms']:>12,.3f}{r['mean_ms']:>12,.3f}"
+              f"{r['stddev_ms']:>10,.3f}{ops:>11}{change:>13}")
+
+
+def main():
+    p = argparse.ArgumentParser(description="Fate Scent 성능 벤치마크")
+    p.add_argument("--sizes", default=",".join(SIZES), help=f"카탈로그 크기 ({', '.join(SIZES)})")
+    p.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="합성 카탈로그 CSV 와 컴파일본을 둘 곳")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--max-time", type=float, default=2.0, help="벤치마크 하나당 최대 측정 시간(초)")
+    p.add_argument("--no-saju", action="store_true", help="사주 계산 벤치마크 생략")
+    p.add_argument("--save", default=None, help="결과를 기준선 JSON 으로 저장할 경로")
+    p.add_argument("--compare", default=None, help="비교할 기준선 JSON")
+    p.add_argument("--threshold", type=float, default=20.0, help="최솟값이 이 비율(%%) 넘게 느려지면 실패")
+    p.add_argument("--retries", type=int, default=4, help="기준보다 느린 묶음을 다시 재는 횟수")
+    args = p.parse_args()
+
+    labels = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in labels if s not in SIZES]
+    if unknown:
+        p.error(f"unknown size: {', '.join(unknown)}")
+
+    results = {}
+    if not args.no_saju:
+        results.update(bench_saju(args))
+    for label in labels:
+        print(f"… {label} ({SIZES[label]:,} perfumes)", file=sys.stderr)
+        results.update(bench_size(label, args))
+
+    slower = []
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        slower = compare(results, baseline["results"], args.threshold)
+        for _ in range(args.retries):
+            if not slower:
+                break
+            for group in sorted({_group(name) for name, *_ in slower}):
+                print(f"… re-measuring {group}", file=sys.stderr)
+                merge_best(results, bench_saju(args) if group == "saju" else bench_size(group, args))
+            slower = compare(results, baseline["results"], args.threshold)
+        mismatch = environment_mismatch(baseline.get("environment", {}))
+        if mismatch:
+            print(f"WARNING baseline was recorded in a different environment ({'; '.join(mismatch)}); "
+                  f"regenerate it here with --save before trusting --compare", file=sys.stderr)
+    print_report(results)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"environment": environment(), "results": results}, f, ensure_ascii=False, indent=2)
+    for name, base_ms, now_ms, change in slower:
+        print(f"FAIL {name}: {base_ms:,.3f} ms → {now_ms:,.3f} ms ({change:+.1f}% > {args.threshold:.0f}%)", file=sys.stderr)
+    return 1 if slower else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
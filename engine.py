@@ -0,0 +1,896 @@
+# =========================================================
+# Fate Scent 추천 엔진 (Streamlit 없이 import 가능)
+#   app.py 와 배치 CLI(batch.py)가 함께 쓴다: 사주 계산, 카탈로그 로드, 추천 점수, 궁합 점수
+# =========================================================
+import os
+import re
+import math
+import json
+import shutil
+import sys
+import hashlib
+import heapq
+import functools
+import threading
+import time
+import unicodedata
+import weakref
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+import pandas as pd
+
+from saju_table import SajuTable
+import retrieval
+
+
+# =========================================================
+# 1) 경로 / 상수
+# =========================================================
+base_dir = os.path.dirname(os.path.abspath(__file__))
+# 🚨 [수정 완료] 최신 DB 파일명으로 변경
+DATA_PATH = os.path.join(base_dir, "fatescent_master_db_v2_fixed.csv")
+SAJU_TABLE_PATH = os.path.join(base_dir, "saju_table.npy")
+
+def catalogue_artifact_paths(path: str):
+    """CSV 옆에 두는 파생 파일 경로: (키워드 인덱스 .npz, 컴파일된 카탈로그 디렉터리)."""
+    stem = os.path.splitext(path)[0]
+    return stem + ".kwidx.npz", stem + ".catalogue"
+
+KEYWORD_INDEX_PATH, CATALOGUE_DIR = catalogue_artifact_paths(DATA_PATH)
+
+ELEMENTS = ["Wood", "Fire", "Earth", "Metal", "Water"]
+
+TAG_TO_KEYWORDS = {
+    "꽃향기(플로럴)": ["floral", "rose", "jasmine", "white floral", "neroli", "ylang", "tuberose", "iris"],
+    "과일향(프루티)": ["fruity", "berry", "apple", "pear", "peach", "plum", "fig", "blackcurrant"],
+    "나무향(우디)": ["woody", "cedar", "sandalwood", "vetiver", "patchouli", "moss", "oud"],
+    "상큼한(시트러스)": ["citrus", "bergamot", "lemon", "orange", "grapefruit", "yuzu", "lime", "mandarin"],
+    "포근한(머스크)": ["musk", "white musk", "clean musk", "soft musk"],
+    "달콤한(앰버/바닐라)": ["amber", "vanilla", "tonka", "benzoin", "gourmand", "sweet"],
+    "시원한(아쿠아/마린)": ["aquatic", "marine", "sea", "sea salt", "watery", "ozonic"],
+    "스모키/가죽": ["smoky", "incense", "leather", "tobacco", "animalic"]
+}
+
+ELEMENT_KEYWORDS = {
+    "Wood": ["green", "herbal", "leafy", "tea", "vetiver", "pine", "grass"],
+    "Fire": ["citrus", "spicy", "warm spicy", "pepper", "ginger", "cinnamon", "rose"],
+    "Earth": ["woody", "musk", "amber", "powdery", "patchouli", "vanilla", "oud"],
+    "Metal": ["aldehyde", "mineral", "mint", "cool", "soapy", "white floral"],
+    "Water": ["aquatic", "marine", "sea", "watery", "ozonic", "salty"]
+}
+
+FAMOUS_BRANDS = [
+    "Jo Malone", "Diptyque", "Byredo", "Aesop", "Chanel", "Dior", "Clean",
+    "Forment", "Tamburins", "Nonfiction", "Le Labo", "Maison Francis Kurkdjian",
+    "Tom Ford", "Hermes", "Creed", "Penhaligon", "Acqua di Parma"
+]
+
+
+# 한글 브랜드 표기 → 영문 표기 (공백 제거한 한글 기준)
+BRAND_ALIASES = {
+    "조말론": "jo malone", "딥티크": "diptyque", "바이레도": "byredo", "이솝": "aesop",
+    "샤넬": "chanel", "디올": "dior", "크리스찬디올": "dior", "클린": "clean", "포맨트": "forment",
+    "탬버린즈": "tamburins", "논픽션": "nonfiction", "르라보": "le labo", "메종프란시스커정": "maison francis kurkdjian",
+    "톰포드": "tom ford", "에르메스": "hermes", "크리드": "creed", "펜할리곤스": "penhaligon",
+    "아쿠아디파르마": "acqua di parma",
+}
+
+
+# =========================================================
+# 2) 유틸 함수
+# =========================================================
+def safe_text(x):
+    if pd.isna(x):
+        return ""
+    return str(x).strip()
+
+def tags_to_keywords(tags):
+    kws = []
+    for t in tags:
+        kws.extend(TAG_TO_KEYWORDS.get(t, []))
+    return sorted(set([k.lower().strip() for k in kws if k]))
+
+def keyword_hit_score(text, keywords):
+    if not keywords:
+        return 0.0
+    text = safe_text(text).lower()
+    hits = sum(1 for kw in keywords if kw in text)
+    return hits / len(keywords)
+
+
+# =========================================================
+# 3) 사주 계산
+# =========================================================
+@functools.lru_cache(maxsize=None)
+def load_saju_table(path=SAJU_TABLE_PATH):
+    """배포할 때 python saju_table.py 로 만들어 둔 테이블을 mmap. 없으면 None → 만세력으로 계산 (요청 중에 만들지 않는다)."""
+    try:
+        return SajuTable(path)
+    except Exception:
+        return None
+
+def get_real_saju_elements(year, month, day, hour=None, minute=None):
+    table = load_saju_table()
+    hit = table.lookup(year, month, day, hour, minute) if table is not None else None
+    if hit is None:
+        hit = _calc_saju_with_calendar(year, month, day, hour, minute)
+        if hit is None:
+            return None, None, None, None, None
+    saju_name, counts, gapja_str = hit
+
+    sorted_e = sorted(counts.items(), key=lambda x: x[1], reverse=True)
+    return saju_name, counts, sorted_e[0][0], sorted_e[-1][0], gapja_str
+
+def _calc_saju_with_calendar(year, month, day, hour=None, minute=None):
+    """테이블 범위 밖 날짜용: 만세력으로 직접 계산해 (saju_name, counts, gapja_str)."""
+    from korean_lunar_calendar import KoreanLunarCalendar  # 범위 밖 날짜에서만 필요하므로 처음 쓸 때 import
+
+    cal = KoreanLunarCalendar()
+    cal.setSolarDate(year, month, day)
+    gapja_str = cal.getGapJaString()
+    gapja = gapja_str.split()
+    if len(gapja) < 3:
+        return None
+
+    year_char, month_char, day_char = gapja[0], gapja[1], gapja[2]
+    saju_chars = [year_char[0], year_char[1], month_char[0], month_char[1], day_char[0], day_char[1]]
+    saju_name = f"{year_char} {month_char} {day_char}"
+
+    if hour is not None and minute is not None:
+        stems, branches = "갑을병정무기경신임계", "자축인묘진사오미신유술해"
+        total_mins = hour * 60 + minute
+        time_branch_idx = 0 if total_mins >= 1410 or total_mins < 90 else ((total_mins - 90) // 120 + 1) % 12
+        time_branch = branches[time_branch_idx]
+        day_stem_idx = stems.find(day_char[0])
+        time_stem = stems[((day_stem_idx % 5) * 2 + time_branch_idx) % 10] if day_stem_idx != -1 else "갑"
+        saju_chars.extend([time_stem, time_branch])
+        saju_name += f" {time_stem}{time_branch}시"
+    else:
+        saju_name += " (시간 모름·6글자 기준)"
+
+    element_map = {
+        '갑':'Wood','을':'Wood','병':'Fire','정':'Fire','무':'Earth','기':'Earth',
+        '경':'Metal','신':'Metal','임':'Water','계':'Water',
+        '인':'Wood','묘':'Wood','사':'Fire','오':'Fire','진':'Earth','술':'Earth',
+        '축':'Earth','미':'Earth','신':'Metal','유':'Metal','해':'Water','자':'Water','申':'Metal'
+    }
+    counts = {e: 0 for e in ELEMENTS}
+    for c in saju_chars:
+        if c in element_map:
+            counts[element_map[c]] += 1
+    return saju_name, counts, gapja_str
+
+
+# =========================================================
+# 4) 궁합 점수
+# =========================================================
+def perfume_notes_messages(brand: str, name: str) -> list:
+    """DB에 없는 향수의 노트를 묻는 LLM 메시지 (앱과 HTTP 서비스가 같이 쓴다)."""
+    return [
+        {"role": "system", "content": "너는 향수 전문가야. 향수의 주요 노트를 영어로 콤마 구분해서만 답해. 예: bergamot, rose, sandalwood, musk. 다른 말은 하지 마."},
+        {"role": "user", "content": f"향수: {brand} - {name}\n이 향수의 주요 향 노트를 알려줘."}
+    ]
+
+
+def compute_perfume_element_vector(notes_text: str) -> dict:
+    t = notes_text.lower()
+    vec = {}
+    for elem, kws in ELEMENT_KEYWORDS.items():
+        hits = sum(1 for kw in kws if kw in t)
+        vec[elem] = hits
+    total = sum(vec.values())
+    if total > 0:
+        vec = {k: round(v / total, 3) for k, v in vec.items()}
+    else:
+        vec = {k: 0.0 for k in ELEMENTS}
+    return vec
+
+
+def compute_compatibility_score(user_counts: dict, perfume_vec: dict, weak: str, strong: str) -> int:
+    total_user = sum(user_counts.values()) or 1
+    user_norm = {e: user_counts[e] / total_user for e in ELEMENTS}
+
+    total_perf = sum(perfume_vec.values()) or 1
+    perf_norm = {e: perfume_vec.get(e, 0) / total_perf for e in ELEMENTS}
+
+    dot = sum(user_norm[e] * perf_norm[e] for e in ELEMENTS)
+    mag_u = math.sqrt(sum(v**2 for v in user_norm.values()))
+    mag_p = math.sqrt(sum(v**2 for v in perf_norm.values()))
+    cosine = dot / (mag_u * mag_p) if mag_u * mag_p > 0 else 0.0
+
+    complement_score = perf_norm.get(weak, 0.0)
+    overload_penalty = perf_norm.get(strong, 0.0) * user_norm.get(strong, 0.0)
+
+    raw = (0.35 * cosine) + (0.50 * complement_score) - (0.25 * overload_penalty)
+    score = max(0.0, min(1.0, raw + 0.3)) 
+    return int(round(score * 100))
+
+
+# =========================================================
+# 5) 데이터 로드 및 추천 엔진
+# =========================================================
+MIN_AFTER_GENDER_FILTER = 30
+MIN_AFTER_BRAND_FILTER = 20
+GENDER_THRESHOLDS = [0.45, 0.35, 0.25]
+# 성별 필터별 기준 점수 컬럼. 중성향은 두 점수 중 작은 쪽 (양쪽 다 높아야 중성적)
+GENDER_SCORE_COLUMNS = {"여성향": ["Female_Score"], "남성향": ["Male_Score"], "중성향": ["Female_Score", "Male_Score"]}
+GENDER_FILTER_OPTIONS = ["전체", "여성향", "남성향", "중성향"]
+BRAND_FILTER_OPTIONS = ["전체 브랜드", "유명 브랜드 위주"]
+DROP_DUP_KEYS = ["Brand", "Name"]
+RETRIEVAL_CANDIDATES = 256  # 후보 검색 인덱스를 쓸 때 최종 점수로 다시 매길 후보 수
+RETRIEVAL_SCORE_EPS = 1e-5  # float32 특성 내적과 float64 점수의 차이 여유
+
+# 카탈로그 메모리 레이아웃: 값 종류가 적은 컬럼은 category, 점수는 float32, 나머지 문자열은 Arrow 문자열
+TEXT_COLUMNS = ["Name", "Brand", "Notes", "Description", "matched_keywords", "Top", "Middle", "Base", "Gender"]
+SEARCH_TEXT_COLUMNS = ["Name", "Brand", "Notes", "matched_keywords", "Top", "Middle", "Base", "Gender"]
+CATEGORY_COLUMNS = ["Brand", "Gender"]
+FLOAT32_COLUMNS = ELEMENTS + ["Female_Score", "Male_Score"]
+
+# 취향 태그 키워드 인덱스: 향수별 키워드 포함 여부를 uint64 비트맵 컬럼으로 보관
+KEYWORD_VOCAB = tags_to_keywords(TAG_TO_KEYWORDS.keys())
+KEYWORD_POS = {kw: i for i, kw in enumerate(KEYWORD_VOCAB)}
+KW_BITS_COLS = [f"_kw_bits{i}" for i in range((len(KEYWORD_VOCAB) + 63) // 64)]
+
+# 필터 비트맵: 유명 브랜드 · (성별 필터, 기준 점수) 마스크를 행마다 uint16 비트 하나씩으로 보관
+FILTER_BITS_COL = "_filter_bits"
+FILTER_MASK_KEYS = ["famous"] + [(option, thr) for option in GENDER_SCORE_COLUMNS for thr in GENDER_THRESHOLDS]
+
+def _data_signature(path=DATA_PATH) -> str:
+    """CSV 크기/수정시각 + 키워드 사전 해시. CSV가 바뀌면 값이 달라져 인덱스를 다시 만든다."""
+    if not os.path.exists(path):
+        return ""
+    stat = os.stat(path)
+    vocab_hash = hashlib.sha1("|".join(KEYWORD_VOCAB).encode("utf-8")).hexdigest()[:12]
+    return f"{stat.st_size}:{stat.st_mtime_ns}:{vocab_hash}"
+
+def catalogue_search_text(df: pd.DataFrame, rows=None) -> pd.Series:
+    """키워드 검색용 소문자 텍스트 (예전 all_text 컬럼). 카탈로그에 보관하지 않고 필요할 때만 만든다."""
+    part = df if rows is None else df.iloc[rows]
+    text = part[SEARCH_TEXT_COLUMNS[0]].astype(str)
+    for c in SEARCH_TEXT_COLUMNS[1:]:
+        text = text + " " + part[c].astype(str)
+    return text.str.lower()
+
+def _text_array(values: list):
+    """문자열 컬럼 값 → Arrow 문자열 배열. pyarrow 가 없으면 intern 한 str 의 object 배열."""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return np.array([sys.intern(v) for v in values], dtype=object)
+    return pd.arrays.ArrowExtensionArray(pa.array(values, type=pa.string()))
+
+def compact_catalogue(df: pd.DataFrame) -> pd.DataFrame:
+    """CATEGORY_COLUMNS 는 category, FLOAT32_COLUMNS 는 float32, 나머지 TEXT_COLUMNS 는 Arrow 문자열로 바꾼다."""
+    data = {}
+    for c in df.columns:
+        col = df[c]
+        if c in CATEGORY_COLUMNS:
+            data[c] = pd.Categorical(col.astype(str).tolist())
+        elif c in FLOAT32_COLUMNS:
+            data[c] = col.to_numpy(dtype=np.float32)
+        elif c in TEXT_COLUMNS:
+            data[c] = _text_array(col.astype(str).tolist())
+        else:
+            data[c] = col.to_numpy()
+    return pd.DataFrame(data, copy=False)
+
+def build_keyword_bits(texts: pd.Series) -> np.ndarray:
+    """텍스트마다 KEYWORD_VOCAB 포함 여부를 (N x W) uint64 비트맵으로 계산."""
+    lowered = texts.fillna("").astype(str).str.lower()
+    bits = np.zeros((len(lowered), len(KW_BITS_COLS)), dtype=np.uint64)
+    for i, kw in enumerate(KEYWORD_VOCAB):
+        hit = lowered.str.contains(kw, regex=False, na=False).to_numpy(dtype=bool)
+        bits[hit, i // 64] |= np.uint64(1 << (i % 64))
+    return bits
+
+def _load_or_build_keyword_bits(df: pd.DataFrame, signature: str, index_path=KEYWORD_INDEX_PATH) -> np.ndarray:
+    try:
+        with np.load(index_path, allow_pickle=False) as z:
+            if str(z["signature"]) == signature and z["bits"].shape == (len(df), len(KW_BITS_COLS)):
+                return z["bits"]
+    except Exception:
+        pass
+
+    bits = build_keyword_bits(catalogue_search_text(df))
+    try:
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, signature=np.array(signature), bits=bits)
+        os.replace(tmp_path, index_path)
+    except Exception:
+        pass  # 읽기 전용 배포 환경이면 메모리 인덱스만 사용
+    return bits
+
+# 컴파일된 카탈로그 (모두 mmap 으로 열어 워커 프로세스끼리 페이지 캐시를 공유)
+#   array   : 숫자 컬럼 .npy
+#   category: 코드 .npy + 사전(NUL 구분 UTF-8)
+#   text    : 이어 붙인 UTF-8 바이트 .txt + 시작 위치 .off.npy (Arrow 문자열 배열의 버퍼 그대로)
+CATALOGUE_FORMAT = 3  # 3: 필터 비트맵 컬럼 추가
+
+def _write_text_column(values, path: str):
+    encoded = [v.replace("\x00", "").encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    with open(f"{path}.txt", "wb") as f:
+        f.write(b"".join(encoded))
+    np.save(f"{path}.off.npy", offsets.astype(np.int32) if offsets[-1] < 2**31 else offsets)
+
+def _read_text_column(path: str, n: int):
+    offsets = np.load(f"{path}.off.npy", mmap_mode="r")
+    size = os.path.getsize(f"{path}.txt")
+    data = np.memmap(f"{path}.txt", dtype=np.uint8, mode="r") if size else np.zeros(0, dtype=np.uint8)
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raw = bytes(data)
+        return np.array([sys.intern(raw[offsets[i]:offsets[i + 1]].decode("utf-8")) for i in range(n)], dtype=object)
+    text_type = pa.string() if offsets.dtype == np.int32 else pa.large_string()
+    arr = pa.Array.from_buffers(text_type, n, [None, pa.py_buffer(offsets), pa.py_buffer(data)])
+    return pd.arrays.ArrowExtensionArray(arr)
+
+def save_catalogue(df: pd.DataFrame, out_dir: str, signature: str):
+    tmp_dir = f"{out_dir}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    columns = []
+    for i, c in enumerate(df.columns):
+        col = df[c]
+        path = os.path.join(tmp_dir, str(i))
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            np.save(f"{path}.npy", col.cat.codes.to_numpy())
+            with open(f"{path}.txt", "w", encoding="utf-8") as f:
+                f.write("\x00".join(str(v).replace("\x00", "") for v in col.cat.categories))
+            columns.append({"name": c, "kind": "category", "categories": len(col.cat.categories)})
+        elif pd.api.types.is_numeric_dtype(col) or pd.api.types.is_bool_dtype(col):
+            np.save(f"{path}.npy", col.to_numpy())
+            columns.append({"name": c, "kind": "array"})
+        else:
+            _write_text_column(col.fillna("").astype(str).tolist(), path)
+            columns.append({"name": c, "kind": "text"})
+    meta = {"format": CATALOGUE_FORMAT, "signature": signature, "rows": len(df), "columns": columns}
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+
+def load_catalogue(out_dir: str, signature: str):
+    """컴파일된 카탈로그를 연다. 없거나 오래됐으면 None."""
+    try:
+        with open(os.path.join(out_dir, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != CATALOGUE_FORMAT or meta.get("signature") != signature:
+            return None
+        data = {}
+        for i, col in enumerate(meta["columns"]):
+            path = os.path.join(out_dir, str(i))
+            if col["kind"] == "array":
+                data[col["name"]] = np.load(f"{path}.npy", mmap_mode="r")
+            elif col["kind"] == "category":
+                with open(f"{path}.txt", encoding="utf-8") as f:
+                    categories = f.read().split("\x00") if col["categories"] else []
+                data[col["name"]] = pd.Categorical.from_codes(np.load(f"{path}.npy", mmap_mode="r"), categories)
+            else:
+                data[col["name"]] = _read_text_column(path, meta["rows"])
+        return pd.DataFrame(data, copy=False)
+    except Exception:
+        return None
+
+def load_catalogue_frame(path=DATA_PATH, data_signature: str = ""):
+    """카탈로그 로드. 컴파일본이 최신이면 mmap으로 바로 열고, 아니면 CSV를 정제해 컴파일본을 다시 만든다."""
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    signature = data_signature or _data_signature(path)
+    index_path, catalogue_dir = catalogue_artifact_paths(path)
+    df = load_catalogue(catalogue_dir, signature)
+    if df is None:
+        df = _read_catalogue_csv(signature, path, index_path)
+        try:
+            save_catalogue(df, catalogue_dir, signature)
+        except Exception:
+            pass  # 읽기 전용 배포 환경이면 매번 CSV에서 로드
+    catalogue_filters(df)  # 필터 비트맵은 로드할 때 한 번 만든다
+    return df
+
+def _read_catalogue_csv(signature: str, path=DATA_PATH, index_path=KEYWORD_INDEX_PATH) -> pd.DataFrame:
+    try:
+        df = pd.read_csv(path, encoding="utf-8-sig")
+    except Exception:
+        df = pd.read_csv(path)
+
+    for c in TEXT_COLUMNS:
+        if c not in df.columns:
+            df[c] = ""
+        df[c] = df[c].fillna("").astype(str)
+
+    # 성별 스코어 (신규 DB 완벽 호환)
+    for c in ["Female_Score", "Male_Score"]:
+        if c not in df.columns:
+            df[c] = 0.5
+        df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0.5)
+
+    for e in ELEMENTS:
+        if e not in df.columns:
+            df[e] = 0.0
+        df[e] = pd.to_numeric(df[e], errors="coerce").fillna(0.0)
+
+    df = df[df[ELEMENTS].sum(axis=1) > 0].copy()
+
+    ban_words = ["sample", "discovery", "set", "gift", "miniature"]
+    mask = ~df["Name"].str.lower().apply(lambda x: any(w in x for w in ban_words))
+    df = df[mask].copy()
+
+    for c in DROP_DUP_KEYS:
+        if c not in df.columns:
+            df[c] = ""
+    df = df.drop_duplicates(subset=DROP_DUP_KEYS).reset_index(drop=True)
+
+    # 키워드 검색은 all_text 대신 비트맵 인덱스로 한다 (검색 텍스트는 인덱스를 만들 때만 잠깐 만듦)
+    bits = _load_or_build_keyword_bits(df, signature, index_path)
+    df = compact_catalogue(df)
+    for i, c in enumerate(KW_BITS_COLS):
+        df[c] = bits[:, i]
+    df[FILTER_BITS_COL] = build_filter_bits(df)
+    return df
+
+def _column(df: pd.DataFrame, col: str, rows=None) -> np.ndarray:
+    """컬럼 배열 (mmap 컬럼이면 뷰). rows 가 있으면 그 행만 모은다 — DataFrame 전체를 복사하지 않는다."""
+    values = df[col].to_numpy()
+    return values if rows is None else values[rows]
+
+def _famous_brand_mask(brands: pd.Series) -> np.ndarray:
+    """Brand 컬럼 전체에 대해 유명 브랜드 포함 여부를 한 번에 계산. category 면 브랜드 사전만 검사한다."""
+    if isinstance(brands.dtype, pd.CategoricalDtype):
+        per_brand = _famous_brand_mask(pd.Series(brands.cat.categories.astype(str)))
+        codes = brands.cat.codes.to_numpy()
+        return np.where(codes >= 0, per_brand[codes], False) if len(per_brand) else np.zeros(len(codes), dtype=bool)
+    lowered = brands.astype(str).str.lower()
+    mask = np.zeros(len(lowered), dtype=bool)
+    for b in FAMOUS_BRANDS:
+        mask |= lowered.str.contains(b.lower(), regex=False, na=False).to_numpy(dtype=bool)
+    return mask
+
+def build_filter_bits(df: pd.DataFrame) -> np.ndarray:
+    """FILTER_MASK_KEYS 순서대로 마스크를 비트로 묶은 uint16 배열. 중성향은 두 점수 중 작은 쪽을 기준과 비교한다."""
+    bits = np.zeros(len(df), dtype=np.uint16)
+    if len(df) == 0:
+        return bits
+    for i, key in enumerate(FILTER_MASK_KEYS):
+        if key == "famous":
+            mask = _famous_brand_mask(df["Brand"])
+        else:
+            option, thr = key
+            mask = functools.reduce(np.minimum, (_column(df, c) for c in GENDER_SCORE_COLUMNS[option])) >= thr
+        bits[mask] |= np.uint16(1 << i)
+    return bits
+
+class CatalogueFilters:
+    """카탈로그마다 한 번 펼치는 필터 마스크(bool 배열)와 그 개수.
+    비트는 카탈로그를 컴파일할 때 FILTER_BITS_COL 에 저장되고, 여기서는 마스크로 펼쳐 개수만 센다.
+    요청마다 마스크 AND 한 번으로 조합하고, 최소 개수 확인은 미리 센 개수로 한다."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.n = len(df)
+        bits = _column(df, FILTER_BITS_COL) if FILTER_BITS_COL in df.columns else build_filter_bits(df)
+        masks = {key: (bits & np.uint16(1 << i)) != 0 for i, key in enumerate(FILTER_MASK_KEYS)}
+        self.famous = masks.pop("famous")
+        self.n_famous = int(np.count_nonzero(self.famous))
+        self.gender = {}  # (성별 필터, 기준) → (마스크, 개수, 유명 브랜드 개수)
+        for key, mask in masks.items():
+            self.gender[key] = (mask, int(np.count_nonzero(mask)), int(np.count_nonzero(mask & self.famous)))
+
+    def select(self, brand_filter_mode, gender_filter):
+        """필터를 통과한 행 마스크 (None 이면 전체). 성별 기준은 남는 행이 MIN_AFTER_GENDER_FILTER 이상이 될 때까지
+        단계적으로 완화하고, 유명 브랜드 필터는 MIN_AFTER_BRAND_FILTER 이상 남을 때만 적용한다."""
+        mask, n_famous = None, self.n_famous
+        if gender_filter in GENDER_SCORE_COLUMNS:
+            for thr in GENDER_THRESHOLDS:
+                gender_mask, count, famous_count = self.gender[(gender_filter, thr)]
+                if count >= MIN_AFTER_GENDER_FILTER:
+                    mask, n_famous = gender_mask, famous_count
+                    break
+        if brand_filter_mode == "유명 브랜드 위주" and n_famous >= MIN_AFTER_BRAND_FILTER:
+            mask = self.famous if mask is None else mask & self.famous
+        return mask
+
+
+def _per_catalogue(cache: dict, df: pd.DataFrame, build):
+    """df 마다 build(df) 를 한 번만 한다 (카탈로그는 로드 후 바꾸지 않는다는 전제). df 가 사라지면 같이 버린다."""
+    key = id(df)
+    entry = cache.get(key)
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+    value = build(df)
+    cache[key] = (weakref.ref(df, lambda _, key=key: cache.pop(key, None)), value)
+    return value
+
+_FILTERS = {}
+
+def catalogue_filters(df: pd.DataFrame) -> CatalogueFilters:
+    return _per_catalogue(_FILTERS, df, CatalogueFilters)
+
+def _popcount(x: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x)
+    return np.unpackbits(x.view(np.uint8).reshape(*x.shape, 8), axis=-1).sum(axis=-1)
+
+def _keyword_query_bits(keywords) -> np.ndarray:
+    q = np.zeros(len(KW_BITS_COLS), dtype=np.uint64)
+    for kw in keywords:
+        i = KEYWORD_POS[kw]
+        q[i // 64] |= np.uint64(1 << (i % 64))
+    return q
+
+def _keyword_hit_scores(df: pd.DataFrame, keywords, rows=None) -> np.ndarray:
+    """keyword_hit_score 의 벡터 버전 (행별 적중 키워드 비율). 키워드 인덱스가 있으면 비트 연산으로 처리."""
+    n = len(df) if rows is None else len(rows)
+    if not keywords:
+        return np.zeros(n)
+    if all(kw in KEYWORD_POS for kw in keywords) and all(c in df.columns for c in KW_BITS_COLS):
+        query = _keyword_query_bits(keywords)
+        hits = np.zeros(n, dtype=np.int64)
+        for i, c in enumerate(KW_BITS_COLS):
+            if query[i]:
+                hits += _popcount(_column(df, c, rows).astype(np.uint64, copy=False) & query[i])
+        return hits / len(keywords)
+
+    # 인덱스가 없는 DataFrame이면 부분 문자열 스캔으로 대체
+    lowered = catalogue_search_text(df, rows).fillna("")
+    hits = np.zeros(n)
+    for kw in keywords:
+        hits += lowered.str.contains(kw, regex=False, na=False).to_numpy(dtype=bool)
+    return hits / len(keywords)
+
+def recommendation_target(weakest, strongest) -> np.ndarray:
+    """추천 목표 오행 벡터: 부족한 기운 1.0, 강한 기운 0.1, 나머지 0.5."""
+    return np.array([1.0 if e == weakest else (0.1 if e == strongest else 0.5) for e in ELEMENTS])
+
+def retrieval_features(df: pd.DataFrame) -> np.ndarray:
+    """score_perfumes 의 선형 부분을 내적 하나로 펼친 향수 특성 (N x (5 + 5 + 1 + 태그 수), float32).
+    [정규화 오행, 오행 원값, 유명 브랜드 여부, 태그별 적중 키워드 수] · retrieval_query(...) = 감점 전 점수."""
+    mat = np.column_stack([_column(df, e).astype(np.float32, copy=False) for e in ELEMENTS])
+    unit = retrieval.normalize_rows(mat)
+    famous = catalogue_filters(df).famous.astype(np.float32)
+    tag_hits = [_keyword_hit_scores(df, kws) * len(kws) for kws in map(tags_to_keywords, ([t] for t in TAG_TO_KEYWORDS))]
+    return np.column_stack([unit, mat, famous, *tag_hits]).astype(np.float32)
+
+def retrieval_query(weakest, strongest, pref_tags, dislike_tags) -> np.ndarray:
+    """retrieval_features 와 짝이 되는 질의 벡터 (점수식의 가중치를 그대로 옮긴 것)."""
+    target = recommendation_target(weakest, strongest)
+    n_pref = len(tags_to_keywords(pref_tags)) or 1
+    n_dislike = len(tags_to_keywords(dislike_tags)) or 1
+    tags = [(0.18 / n_pref if t in pref_tags else 0.0) - (0.20 / n_dislike if t in dislike_tags else 0.0) for t in TAG_TO_KEYWORDS]
+    weak = [0.20 if e == weakest else 0.0 for e in ELEMENTS]
+    return np.concatenate([0.55 * target / np.sqrt((target * target).sum()), weak, [0.15], tags])
+
+def build_retriever(df: pd.DataFrame, kind: str = "ivf", **params):
+    """추천 후보 검색 인덱스 (retrieval.py, 내적 기준). kind: brute(정확) / ivf(근사)."""
+    return retrieval.build_index(kind, retrieval_features(df), metric="ip", **params)
+
+def score_perfumes(df: pd.DataFrame, weakest, strongest, pref_keywords, dislike_keywords, rows=None, famous=None) -> np.ndarray:
+    """오행 행렬(N x 5)에 대해 추천 점수를 배열 연산으로 계산. rows 를 주면 그 행만 (famous 는 rows 기준 유명 브랜드 마스크)."""
+    mat = np.column_stack([_column(df, e, rows).astype(float, copy=False) for e in ELEMENTS])
+    target = recommendation_target(weakest, strongest)
+
+    dislike_score = _keyword_hit_scores(df, dislike_keywords, rows)
+    pref_score = _keyword_hit_scores(df, pref_keywords, rows)
+
+    denom = math.sqrt(float((target * target).sum())) * np.sqrt((mat * mat).sum(axis=1))
+    dot = (mat * target).sum(axis=1)
+    sim = np.divide(dot, denom, out=np.zeros(len(mat)), where=denom > 0)
+    if famous is None:
+        famous = catalogue_filters(df).famous
+        famous = famous if rows is None else famous[rows]
+    brand_bonus = np.where(famous, 0.15, 0.0)
+
+    final_score = (0.55 * sim) + (0.20 * mat[:, ELEMENTS.index(weakest)]) + (0.18 * pref_score) - (0.20 * dislike_score) + brand_bonus
+    final_score[dislike_score >= 0.4] -= 0.5
+    return final_score
+
+def _filter_rows(df, brand_filter_mode, gender_filter):
+    """성별 · 브랜드 필터를 통과한 행 번호와 그 행들의 유명 브랜드 마스크 (미리 만든 비트맵 조합)."""
+    filters = catalogue_filters(df)
+    mask = filters.select(brand_filter_mode, gender_filter)
+    if mask is None:
+        return np.arange(len(df)), filters.famous
+    rows = np.flatnonzero(mask)
+    return rows, filters.famous[rows]
+
+def _filter_and_score(df, weakest, strongest, pref_tags, dislike_tags, brand_filter_mode, gender_filter):
+    """필터를 통과한 카탈로그 행 번호와 그 행들의 점수. 카탈로그는 복사하지 않고 행 번호 배열만 좁혀 간다."""
+    rows, famous = _filter_rows(df, brand_filter_mode, gender_filter)
+    pref_keywords = tags_to_keywords(pref_tags)
+    dislike_keywords = tags_to_keywords(dislike_tags)
+    return rows, score_perfumes(df, weakest, strongest, pref_keywords, dislike_keywords, rows, famous)
+
+def _top_k_positions(scores: np.ndarray, k: int) -> np.ndarray:
+    """점수 내림차순(동점은 카탈로그 순서) 상위 k개 위치. argpartition으로 O(n + k log k)."""
+    n = len(scores)
+    if k <= 0:
+        return np.array([], dtype=np.int64)
+    if k >= n:
+        return np.argsort(-scores, kind="stable")
+    part = np.argpartition(-scores, k - 1)[:k]
+    cand = np.flatnonzero(scores >= scores[part].min())  # 경계 동점까지 포함
+    order = np.lexsort((cand, -scores[cand]))
+    return cand[order][:k]
+
+class Recommendation:
+    """추천 한 건의 최소 기록: 카탈로그 행 번호 + 점수. 세션에는 이것만 두고 표시 필드는 recommendation_frame 으로 꺼낸다."""
+    __slots__ = ("row", "score")
+
+    def __init__(self, row: int, score: float):
+        self.row = row
+        self.score = score
+
+    def __repr__(self):
+        return f"Recommendation(row={self.row}, score={self.score:.6f})"
+
+def _dedup_positions(df, rows: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    """순위대로 놓인 positions 에서 (Brand, Name) 이 앞 순위와 겹치는 것을 뺀다."""
+    keys = df[DROP_DUP_KEYS].iloc[rows[positions]]
+    return positions[~keys.duplicated().to_numpy()]
+
+def _ranked_frame(df, rows: np.ndarray, scores: np.ndarray, weakest) -> pd.DataFrame:
+    """선택된 행만 카탈로그에서 꺼내 score / {weakest}_fill 컬럼을 붙인다."""
+    out = df.iloc[rows].copy()
+    out["score"] = scores
+    out[f"{weakest}_fill"] = out[weakest].astype(float)
+    return out.reset_index(drop=True)
+
+def recommendation_frame(df, recs, weakest) -> pd.DataFrame:
+    """Recommendation 목록 → 표시용 DataFrame (recommend_perfumes 와 같은 컬럼)."""
+    rows = np.array([r.row for r in recs], dtype=np.int64)
+    return _ranked_frame(df, rows, np.array([r.score for r in recs], dtype=float), weakest)
+
+def _top_k_dedup(df, rows: np.ndarray, scores: np.ndarray, k: int) -> np.ndarray:
+    """중복(Brand, Name)을 뺀 상위 k 위치. 중복 제거로 k개가 안 되면 후보 폭을 넓혀 다시 선택."""
+    m = max(k, 1)
+    while True:
+        picked = _dedup_positions(df, rows, _top_k_positions(scores, m))
+        if len(picked) >= k or m >= len(scores):
+            return picked[:k]
+        m *= 2
+
+def _retrieve_and_score(df, retriever, weakest, strongest, pref_tags, dislike_tags, brand_filter_mode, gender_filter, m):
+    """후보 검색 인덱스로 필터 안에서 감점 전 점수 상위 m 개만 뽑고, 그 후보들만 기존 공식으로 다시 점수를 매긴다.
+    → (후보 행, 점수, 필터 통과 행 수, 후보 중 가장 낮은 감점 전 점수 = 후보 밖 행이 가질 수 있는 최고 점수)"""
+    rows, _ = _filter_rows(df, brand_filter_mode, gender_filter)
+    query = retrieval_query(weakest, strongest, pref_tags, dislike_tags)
+    cand, sims = retriever.search(query, m, None if len(rows) == len(df) else rows)
+    bound = float(sims.min()) if len(sims) else -np.inf
+    cand = np.sort(cand)  # 동점은 카탈로그 순서 (정확 계산과 같은 규칙)
+    famous = catalogue_filters(df).famous[cand]
+    scores = score_perfumes(df, weakest, strongest, tags_to_keywords(pref_tags), tags_to_keywords(dislike_tags), cand, famous)
+    return cand, scores, len(rows), bound
+
+def recommend_rows(df, weakest, strongest, pref_tags, dislike_tags, brand_filter_mode, gender_filter="전체", k=3,
+                   retriever=None, candidates=RETRIEVAL_CANDIDATES) -> list:
+    """상위 k개 추천을 Recommendation(행 번호, 점수) 목록으로. 전체 정렬 없이 부분 선택 후 중복 제거.
+    retriever(build_retriever) 를 주면 전체 대신 후보 candidates 개만 다시 점수 매긴다 (ivf 면 근사)."""
+    if df.empty:
+        return []
+    if retriever is not None:
+        m = max(candidates, k)
+        while True:
+            rows, scores, n_allowed, bound = _retrieve_and_score(
+                df, retriever, weakest, strongest, pref_tags, dislike_tags, brand_filter_mode, gender_filter, m
+            )
+            picked = _top_k_dedup(df, rows, scores, k)
+            # 싫어하는 향 감점(-0.5)은 감점 전 점수로 뽑은 후보 순서를 뒤집을 수 있다. 점수는 감점 전 점수보다 커질 수 없으므로
+            # k 위 점수가 후보 밖 최고 점수(bound)보다 높을 때만 후보 밖 행이 끼어들 수 없다. 아니면 후보를 넓힌다
+            settled = len(picked) >= k and scores[picked[-1]] > bound + RETRIEVAL_SCORE_EPS
+            if settled or m >= n_allowed:
+                return [Recommendation(int(rows[p]), float(scores[p])) for p in picked]
+            m *= 2
+
+    rows, scores = _filter_and_score(df, weakest, strongest, pref_tags, dislike_tags, brand_filter_mode, gender_filter)
+    return [Recommendation(int(rows[p]), float(scores[p])) for p in _top_k_dedup(df, rows, scores, k)]
+
+def recommend_perfumes(df, weakest, strongest, pref_tags, dislike_tags, brand_filter_mode, gender_filter="전체", k=None,
+                       retriever=None):
+    """추천 순위 DataFrame. k를 주면 전체 정렬 없이 상위 k개만 부분 선택 후 중복 제거."""
+    if df.empty:
+        return pd.DataFrame()
+    if k is not None:
+        recs = recommend_rows(df, weakest, strongest, pref_tags, dislike_tags, brand_filter_mode, gender_filter, k, retriever)
+        return recommendation_frame(df, recs, weakest)
+
+    rows, scores = _filter_and_score(df, weakest, strongest, pref_tags, dislike_tags, brand_filter_mode, gender_filter)
+    picked = _dedup_positions(df, rows, np.argsort(-scores, kind="stable"))
+    return _ranked_frame(df, rows[picked], scores[picked], weakest)
+
+def iter_recommendations(df, weakest, strongest, pref_tags, dislike_tags, brand_filter_mode, gender_filter="전체", page_size=10):
+    """전체 순위를 page_size 단위 DataFrame으로 지연 생성 (페이지 넘김용). 힙에서 필요한 만큼만 꺼낸다."""
+    if df.empty:
+        return
+    rows, scores = _filter_and_score(df, weakest, strongest, pref_tags, dislike_tags, brand_filter_mode, gender_filter)
+
+    heap = list(zip((-scores).tolist(), range(len(scores))))
+    heapq.heapify(heap)
+    keys = list(zip(*(_column(df, c, rows) for c in DROP_DUP_KEYS)))
+    seen = set()
+    page = []
+    while heap:
+        _, pos = heapq.heappop(heap)
+        if keys[pos] in seen:
+            continue
+        seen.add(keys[pos])
+        page.append(pos)
+        if len(page) == page_size:
+            yield _ranked_frame(df, rows[page], scores[page], weakest)
+            page = []
+    if page:
+        yield _ranked_frame(df, rows[page], scores[page], weakest)
+
+
+# =========================================================
+# 6) 향수 검색 (역색인)
+# =========================================================
+FUZZY_MIN_SIM = 0.5
+
+def normalize_text(text) -> str:
+    """소문자 + 악센트 제거 + 영숫자/한글 외 문자는 공백 하나로. 'Hermès' == 'hermes'."""
+    t = unicodedata.normalize("NFKD", safe_text(text).lower())
+    t = unicodedata.normalize("NFC", "".join(ch for ch in t if not unicodedata.combining(ch)))
+    return re.sub(r"[^0-9a-z가-힣]+", " ", t).strip()
+
+def normalize_brand(text) -> str:
+    t = normalize_text(text)
+    compact = t.replace(" ", "")
+    if compact in BRAND_ALIASES:
+        return BRAND_ALIASES[compact]
+    for ko, en in BRAND_ALIASES.items():
+        t = t.replace(ko, en)
+    return t
+
+def _word_runs(normalized: str) -> set:
+    """연속 단어 묶음의 공백 제거형. 'jo malone' → {'jo', 'malone', 'jomalone'}"""
+    words = normalized.split()
+    return {"".join(words[i:j]) for i in range(len(words)) for j in range(i + 1, len(words) + 1)}
+
+def _trigrams(compact: str) -> set:
+    padded = f"^{compact}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _dice(a: set, b: set) -> float:
+    return 2 * len(a & b) / (len(a) + len(b)) if a and b else 0.0
+
+
+# 카탈로그 밖 향수(AI 노트) 보관 한도. 앱의 SQLite 노트 캐시와 같은 값
+EXTRA_TTL_SEC = 30 * 24 * 3600
+EXTRA_MAX_ENTRIES = 5000
+
+class PerfumeIndex:
+    """브랜드/향수명 역색인 (정규화 브랜드 → 행, 이름 트라이그램 → 행). 정확·접두·부분·오타 허용 검색.
+    카탈로그 색인은 만든 뒤 바뀌지 않는다. AI 로 얻은 향수는 extra 에 따로 두고 정확한 (브랜드, 이름) 으로만 찾는다."""
+
+    def __init__(self, brands, names, extra_ttl_sec: float = EXTRA_TTL_SEC, extra_max: int = EXTRA_MAX_ENTRIES):
+        self.brands = [normalize_brand(b) for b in brands]
+        self.names = [normalize_text(n) for n in names]
+        self.name_lens = np.array([len(safe_text(n)) for n in names], dtype=np.int64)
+
+        brand_rows = defaultdict(list)
+        for row, b in enumerate(self.brands):
+            brand_rows[b].append(row)
+        self.brand_rows = {b: np.array(rows, dtype=np.int64) for b, rows in brand_rows.items()}
+        self.brand_runs = {b: _word_runs(b) for b in self.brand_rows}
+        self.brand_grams = {b: _trigrams(b.replace(" ", "")) for b in self.brand_rows}
+
+        # 이름 트라이그램은 공백 제거형 기준 (부분 문자열이면 공백 제거형에서도 부분 문자열)
+        gram_rows = defaultdict(list)
+        gram_counts = []
+        for row, n in enumerate(self.names):
+            grams = _trigrams(n.replace(" ", ""))
+            gram_counts.append(len(grams))
+            for g in grams:
+                gram_rows[g].append(row)
+        self.gram_rows = {g: np.array(rows, dtype=np.int64) for g, rows in gram_rows.items()}
+        self.gram_counts = np.array(gram_counts, dtype=np.int64)
+
+        # 카탈로그 밖에서 추가된 향수 (AI 노트 캐시 등): (정규화 브랜드, 이름) → (record, 추가 시각), 오래 안 쓴 순서
+        self.base_rows = len(self.names)
+        self.extra = OrderedDict()
+        self.extra_ttl_sec = extra_ttl_sec
+        self.extra_max = extra_max
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, brand, name, record: dict):
+        """카탈로그에 없는 향수를 보관. 같은 브랜드/이름이면 record 만 갱신, 한도를 넘으면 가장 오래 안 쓴 것부터 버린다."""
+        key = (normalize_brand(brand), normalize_text(name))
+        with self._lock:
+            self.extra[key] = (record, time.time())
+            self.extra.move_to_end(key)
+            while len(self.extra) > self.extra_max:
+                self.extra.popitem(last=False)
+
+    def lookup_extra(self, brand, name):
+        """add 로 넣은 향수를 정확한 (브랜드, 이름) 으로 찾는다. 없거나 TTL 이 지났으면 None."""
+        key = (normalize_brand(brand), normalize_text(name))
+        with self._lock:
+            entry = self.extra.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[1] > self.extra_ttl_sec:
+                del self.extra[key]
+                return None
+            self.extra.move_to_end(key)
+            return entry[0]
+
+    def _rows_with_brand(self, bq: str) -> np.ndarray:
+        compact = bq.replace(" ", "")
+        hits = [rows for b, rows in self.brand_rows.items() if bq in b or compact in self.brand_runs[b]]
+        if not hits:
+            q = _trigrams(compact)
+            hits = [rows for b, rows in self.brand_rows.items() if _dice(q, self.brand_grams[b]) >= FUZZY_MIN_SIM]
+        return np.sort(np.concatenate(hits)) if hits else np.array([], dtype=np.int64)
+
+    def _rows_with_name(self, nq: str) -> np.ndarray:
+        compact = nq.replace(" ", "")
+        if len(compact) < 3:
+            return np.array([r for r, n in enumerate(self.names) if nq in n], dtype=np.int64)
+        # 쿼리 트라이그램을 모두 가진 행만 후보로 두고 실제 포함 여부 확인
+        postings = [self.gram_rows.get(compact[i:i + 3]) for i in range(len(compact) - 2)]
+        if any(p is None for p in postings):
+            return np.array([], dtype=np.int64)
+        cand = functools.reduce(lambda a, b: np.intersect1d(a, b, assume_unique=True), sorted(postings, key=len))
+        return np.array([r for r in cand if nq in self.names[r]], dtype=np.int64)
+
+    def _fuzzy_rows(self, nq: str, brand_rows: np.ndarray):
+        q = _trigrams(nq.replace(" ", ""))
+        postings = [self.gram_rows[g] for g in q if g in self.gram_rows]
+        if not postings:
+            return np.array([], dtype=np.int64), np.array([])
+        shared = np.bincount(np.concatenate(postings), minlength=len(self.names))
+        sim = 2 * shared / (len(q) + self.gram_counts)
+        rows = np.flatnonzero(sim >= FUZZY_MIN_SIM)
+        rank = sim[rows] + 0.2 * np.isin(rows, brand_rows)
+        return rows, rank
+
+    def search(self, brand_input: str, name_input: str, limit: int = 5) -> list:
+        """[{row, kind, score}] 순위 목록. 브랜드+이름 포함 → 이름만 포함 → 트라이그램 유사도 순으로 완화."""
+        return self._search(normalize_brand(brand_input), normalize_text(name_input), limit)
+
+    def _search(self, bq: str, nq: str, limit: int) -> list:
+        brand_rows = self._rows_with_brand(bq)
+        name_rows = self._rows_with_name(nq)
+
+        hits = np.intersect1d(name_rows, brand_rows, assume_unique=True)
+        if len(hits) == 0:
+            hits = name_rows
+        if len(hits) > 0:
+            # 기존 규칙 유지: 포함 매칭 중에서는 이름이 가장 짧은 것이 우선
+            hits = hits[np.lexsort((hits, self.name_lens[hits]))][:limit]
+            out = []
+            for r in hits:
+                kind = "exact" if self.names[r] == nq else ("prefix" if self.names[r].startswith(nq) else "contains")
+                out.append({"row": int(r), "kind": kind, "score": 1.0})
+            return out
+
+        rows, rank = self._fuzzy_rows(nq, brand_rows)
+        order = np.lexsort((self.name_lens[rows], -rank))[:limit]
+        return [{"row": int(rows[i]), "kind": "fuzzy", "score": float(rank[i])} for i in order]
+
+
+_PERFUME_INDEXES = {}
+
+def perfume_index(df: pd.DataFrame) -> PerfumeIndex:
+    """카탈로그 df 마다 한 번 만드는 기본 PerfumeIndex."""
+    return _per_catalogue(_PERFUME_INDEXES, df, lambda d: PerfumeIndex(d["Brand"], d["Name"]))
+
+def find_perfume_in_db(df, brand_input: str, name_input: str, index: PerfumeIndex = None):
+    """DB에서 향수 검색. 역색인으로 포함 매칭 후 없으면 오타 허용(트라이그램) 매칭.
+    카탈로그에서 못 찾으면 index 에 보관된 AI 노트 향수를 정확한 (브랜드, 이름) 으로만 찾는다.
+    index 를 안 주면 df 별로 캐시한 색인을 쓴다."""
+    if df.empty:
+        return None
+    if index is None or index.base_rows != len(df):
+        index = perfume_index(df)
+    hits = index.search(brand_input, name_input, limit=1)
+    if hits:
+        return df.iloc[hits[0]["row"]]
+    record = index.lookup_extra(brand_input, name_input)
+    return pd.Series(record) if record is not None else None
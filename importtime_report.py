@@ -0,0 +1,125 @@
+# =========================================================
+# 콜드 스타트 import 시간 점검 (python -X importtime 출력 파싱)
+#   python importtime_report.py                  # engine / app 첫 화면 리포트, 예산을 넘거나 금지 모듈이 올라오면 exit 1
+#   python importtime_report.py --repeat 5 --top 20 --json importtime.json
+#   python importtime_report.py --budget app=2500 # 느린 머신에서는 예산(ms)을 덮어쓴다
+#   engine: `import engine` 의 누적 import 시간
+#   app   : streamlit AppTest 로 step 1 첫 화면을 한 번 그리는 동안 새로 import 된 모듈 (시크릿 없음 = AI 꺼짐)
+# =========================================================
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+
+# 측정값(여러 번 중 최솟값)이 넘으면 실패로 보는 예산 (ms)
+IMPORT_BUDGET_MS = {"engine": 800, "app": 900}
+
+# 첫 화면 전에 올라오면 안 되는 무거운 의존성 (처음 쓸 때 import 해야 함)
+DEFERRED_MODULES = ("openai", "qrcode", "korean_lunar_calendar")
+
+BEGIN, END = "@@importtime-begin", "@@importtime-end"
+
+TARGETS = {
+    "engine": f"""
+import sys
+sys.stderr.write("{BEGIN}\\n"); sys.stderr.flush()
+import engine
+sys.stderr.write("{END}\\n"); sys.stderr.flush()
+""",
+    "app": f"""
+import sys
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({os.path.join(base_dir, "app.py")!r}, default_timeout=120)
+sys.stderr.write("{BEGIN}\\n"); sys.stderr.flush()
+at.run()
+sys.stderr.write("{END}\\n"); sys.stderr.flush()
+if at.exception:
+    raise SystemExit(str(at.exception))
+""",
+}
+
+
+def parse_importtime(stderr: str) -> list:
+    """BEGIN~END 사이의 '-X importtime' 줄 → [(모듈, 깊이, self_us, cumulative_us)]."""
+    rows, inside = [], False
+    for line in stderr.splitlines():
+        if line == BEGIN:
+            inside = True
+        elif line == END:
+            break
+        elif inside and line.startswith("import time:") and "|" in line:
+            parts = line[len("import time:"):].split("|")
+            if len(parts) != 3 or not parts[0].strip().isdigit():
+                continue  # 머리말 줄
+            name = parts[2]
+            depth = (len(name) - len(name.lstrip()) - 1) // 2
+            rows.append((name.strip(), depth, int(parts[0]), int(parts[1])))
+    return rows
+
+
+def measure(target: str) -> list:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", TARGETS[target]],
+        cwd=base_dir, capture_output=True, text=True, env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1"),
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"{target}: 측정 실패\n{proc.stderr[-2000:]}")
+    return parse_importtime(proc.stderr)
+
+
+def summarise(rows: list, top: int) -> dict:
+    top_level = [r for r in rows if r[1] == 0]
+    modules = {r[0] for r in rows}
+    return {
+        "total_ms": round(sum(r[3] for r in top_level) / 1000, 1),
+        "modules": len(modules),
+        "top": [(name, round(cum / 1000, 1)) for name, _, _, cum in sorted(top_level, key=lambda r: -r[3])[:top]],
+        "deferred_loaded": sorted(m for m in DEFERRED_MODULES if m in modules),
+    }
+
+
+def main():
+    p = argparse.ArgumentParser(description="Fate Scent import 시간 예산 점검")
+    p.add_argument("targets", nargs="*", default=list(TARGETS), help=f"측정 대상 ({', '.join(TARGETS)})")
+    p.add_argument("--repeat", type=int, default=3, help="대상별 측정 횟수 (총 시간이 가장 짧은 회차로 판정)")
+    p.add_argument("--top", type=int, default=10, help="리포트에 보일 최상위 import 수")
+    p.add_argument("--budget", action="append", default=[], metavar="TARGET=MS", help="예산 덮어쓰기")
+    p.add_argument("--json", default=None, help="리포트를 JSON 으로도 저장할 경로")
+    args = p.parse_args()
+    unknown = [t for t in args.targets if t not in TARGETS]
+    if unknown:
+        p.error(f"unknown target: {', '.join(unknown)}")
+
+    budgets = dict(IMPORT_BUDGET_MS)
+    for item in args.budget:
+        target, _, ms = item.partition("=")
+        budgets[target] = float(ms)
+
+    report, failures = {}, []
+    for target in args.targets:
+        runs = [summarise(measure(target), args.top) for _ in range(max(args.repeat, 1))]
+        best = min(runs, key=lambda r: r["total_ms"])
+        best["budget_ms"] = budgets.get(target)
+        report[target] = best
+
+        print(f"[{target}] {best['total_ms']:,.1f} ms (예산 {best['budget_ms']:,.0f} ms) · 모듈 {best['modules']:,}개")
+        for name, ms in best["top"]:
+            print(f"    {ms:>9,.1f} ms  {name}")
+        if best["deferred_loaded"]:
+            failures.append(f"{target}: 지연 import 대상이 먼저 올라옴 → {', '.join(best['deferred_loaded'])}")
+        if best["budget_ms"] is not None and best["total_ms"] > best["budget_ms"]:
+            failures.append(f"{target}: {best['total_ms']:,.1f} ms > 예산 {best['budget_ms']:,.0f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    for msg in failures:
+        print(f"FAIL {msg}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
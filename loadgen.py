@@ -0,0 +1,243 @@
+# =========================================================
+# server.py 부하 테스트: 지연 p50/p95/p99 와 초당 요청 수
+#   python loadgen.py --workers 2 --concurrency 16 --duration 20
+#   OpenAI 호환 스텁 서버를 띄우고 (고정 지연), 그 주소를 OPENAI_BASE_URL 로 넘겨 server.py 를 실행한 뒤 부하를 준다.
+#   --url 을 주면 이미 떠 있는 서비스에 부하만 준다 (스텁은 띄우지 않음).
+# =========================================================
+import argparse
+import datetime
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from engine import DATA_PATH, TAG_TO_KEYWORDS, GENDER_FILTER_OPTIONS, BRAND_FILTER_OPTIONS, load_catalogue_frame
+
+STUB_NOTES = "bergamot, rose, sandalwood, musk"
+
+
+# =========================================================
+# OpenAI 스텁
+# =========================================================
+class _StubOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency_sec = 0.3
+    calls = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        type(self).calls += 1
+        time.sleep(self.latency_sec)
+        body = json.dumps({
+            "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": "stub",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": STUB_NOTES}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 40, "completion_tokens": 10, "total_tokens": 50},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def start_stub_openai(latency_sec: float):
+    _StubOpenAIHandler.latency_sec = latency_sec
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubOpenAIHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-openai", daemon=True).start()
+    return server
+
+
+# =========================================================
+# 서비스 실행 / 요청 생성
+# =========================================================
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_service(port: int, workers: int, db: str, stub_url: str):
+    env = dict(os.environ, FATESCENT_DB=db, OPENAI_API_KEY="stub", OPENAI_BASE_URL=stub_url)
+    server_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+    return subprocess.Popen([sys.executable, server_py, "--port", str(port), "--workers", str(workers)], env=env)
+
+def wait_ready(url: str, timeout: float = 120.0):
+    deadline = time.time() + timeout
+    u = urllib.parse.urlsplit(url)
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(u.hostname, u.port, timeout=2)
+            conn.request("GET", "/healthz")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"service did not become ready: {url}")
+
+class RequestMix:
+    """추천 60% / 사주 25% / 궁합 15% (궁합의 절반은 DB에 없는 향수 → AI 스텁 경로)."""
+
+    def __init__(self, perfumes: list, seed: int = 0, unknown_pool: int = 200):
+        self.perfumes = perfumes
+        self.rnd = random.Random(seed)
+        self.lock = threading.Lock()
+        # 오타 허용 검색에 서로 걸리지 않도록 무작위 철자 이름을 쓴다
+        letters = "abcdefghijklmnopqrstuvwxyz"
+        self.unknown = [" ".join("".join(self.rnd.choices(letters, k=6)) for _ in range(2)) for _ in range(unknown_pool)]
+
+    def _birth(self, r):
+        d = datetime.date(1950, 1, 1) + datetime.timedelta(days=r.randrange(365 * 60))
+        t = r.choice(["", f"{r.randrange(24):02d}:{r.randrange(60):02d}"])
+        return {"birth_date": d.isoformat(), "birth_time": t}
+
+    def next(self):
+        with self.lock:
+            r = random.Random(self.rnd.random())
+        body = self._birth(r)
+        roll = r.random()
+        if roll < 0.60:
+            tags = list(TAG_TO_KEYWORDS)
+            pref = r.sample(tags, r.randint(0, 2))
+            body.update(
+                pref_tags=pref, dislike_tags=r.sample([t for t in tags if t not in pref], r.randint(0, 1)),
+                gender_filter=r.choice(GENDER_FILTER_OPTIONS), brand_filter=r.choice(BRAND_FILTER_OPTIONS), k=3,
+            )
+            return "recommend", "/v1/recommend", body
+        if roll < 0.85:
+            return "saju", "/v1/saju", body
+        if r.random() < 0.5 and self.perfumes:
+            brand, name = r.choice(self.perfumes)
+        else:
+            brand, name = "Stub Parfum", r.choice(self.unknown)
+        body.update(brand=brand, name=name)
+        return "compatibility", "/v1/compatibility", body
+
+
+# =========================================================
+# 부하 루프 / 리포트
+# =========================================================
+def run_load(url: str, mix: RequestMix, concurrency: int, duration: float, warmup: float):
+    u = urllib.parse.urlsplit(url)
+    samples = []  # (endpoint, latency_sec, ok)
+    lock = threading.Lock()
+    start = time.perf_counter()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+
+    def _client():
+        conn = http.client.HTTPConnection(u.hostname, u.port, timeout=60)
+        local = []
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                break
+            name, path, body = mix.next()
+            payload = json.dumps(body).encode("utf-8")
+            t0 = time.perf_counter()
+            try:
+                conn.request("POST", path, body=payload, headers={"Content-Type": "application/json"})
+                resp = conn.getresponse()
+                resp.read()
+                ok = resp.status == 200
+            except (OSError, http.client.HTTPException):
+                ok = False
+                conn.close()
+                conn = http.client.HTTPConnection(u.hostname, u.port, timeout=60)
+            t1 = time.perf_counter()
+            if t0 >= measure_from:
+                local.append((name, t1 - t0, ok))
+        conn.close()
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=_client, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples, duration
+
+def summarise(samples: list, duration: float) -> dict:
+    report = {}
+    groups = {"all": samples}
+    for name in sorted({s[0] for s in samples}):
+        groups[name] = [s for s in samples if s[0] == name]
+    for name, group in groups.items():
+        lat = np.array([s[1] for s in group if s[2]]) * 1000
+        report[name] = {
+            "requests": len(group),
+            "errors": sum(1 for s in group if not s[2]),
+            "rps": round(len(group) / duration, 1),
+            "p50_ms": round(float(np.percentile(lat, 50)), 2) if len(lat) else None,
+            "p95_ms": round(float(np.percentile(lat, 95)), 2) if len(lat) else None,
+            "p99_ms": round(float(np.percentile(lat, 99)), 2) if len(lat) else None,
+            "max_ms": round(float(lat.max()), 2) if len(lat) else None,
+        }
+    return report
+
+def print_report(report: dict, stub_calls=None):
+    header = f"{'endpoint':<15}{'requests':>10}{'errors':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, r in report.items():
+        cells = [r[k] if r[k] is not None else "-" for k in ("p50_ms", "p95_ms", "p99_ms", "max_ms")]
+        print(f"{name:<15}{r['requests']:>10,}{r['errors']:>8,}{r['rps']:>9}" + "".join(f"{c:>10}" for c in cells))
+    if stub_calls is not None:
+        print(f"stub OpenAI calls: {stub_calls:,}")
+
+
+def main():
+    p = argparse.ArgumentParser(description="Fate Scent 서비스 부하 테스트")
+    p.add_argument("--url", default=None, help="이미 떠 있는 서비스 주소 (없으면 스텁 + server.py 를 직접 띄움)")
+    p.add_argument("--db", default=DATA_PATH, help="향수 카탈로그 CSV")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="server.py 워커 수")
+    p.add_argument("--concurrency", type=int, default=16, help="동시 접속 수")
+    p.add_argument("--duration", type=float, default=20.0, help="측정 시간(초)")
+    p.add_argument("--warmup", type=float, default=3.0, help="측정 전 예열 시간(초)")
+    p.add_argument("--stub-latency-ms", type=float, default=300.0, help="스텁 OpenAI 응답 지연")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--json", default=None, help="리포트를 JSON 으로도 저장할 경로")
+    args = p.parse_args()
+
+    catalogue = load_catalogue_frame(args.db)
+    perfumes = list(zip(catalogue["Brand"], catalogue["Name"])) if not catalogue.empty else []
+    del catalogue
+
+    stub = proc = None
+    url = args.url
+    try:
+        if url is None:
+            stub = start_stub_openai(args.stub_latency_ms / 1000)
+            port = _free_port()
+            proc = start_service(port, args.workers, args.db, f"http://127.0.0.1:{stub.server_address[1]}/v1")
+            url = f"http://127.0.0.1:{port}"
+        wait_ready(url)
+        samples, duration = run_load(url, RequestMix(perfumes, args.seed), args.concurrency, args.duration, args.warmup)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+        if stub is not None:
+            stub.shutdown()
+
+    report = summarise(samples, duration)
+    print_report(report, _StubOpenAIHandler.calls if stub is not None else None)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "report": report}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# =========================================================
+# 카탈로그 메모리 리포트: 향수 1개당 바이트 (예전 레이아웃 → 현재 컴팩트 레이아웃)
+#   python memory_report.py [--db CSV] [--min-ratio 3] [--json out.json]
+#   예전: 문자열 전부 Python str(object) + all_text 컬럼 + float64 오행/성별 점수 + element_sum
+#   현재: Brand/Gender category, 점수 float32, 나머지 문자열 Arrow(mmap), all_text 없음(키워드 비트맵 인덱스)
+#   DataFrame.memory_usage(deep=True) 기준. 현재 레이아웃의 숫자·Arrow 버퍼는 mmap 이라 워커끼리 공유된다.
+# =========================================================
+import argparse
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+
+from engine import (
+    DATA_PATH, ELEMENTS, TEXT_COLUMNS, FLOAT32_COLUMNS,
+    load_catalogue_frame, catalogue_search_text,
+)
+
+
+def legacy_layout(df: pd.DataFrame) -> pd.DataFrame:
+    """컴팩트 카탈로그 → 예전 load_data 와 같은 모양 (행마다 따로 만든 str, float64, all_text, element_sum)."""
+    data = {}
+    for c in df.columns:
+        if c in TEXT_COLUMNS:
+            data[c] = pd.Series(df[c].astype(str).tolist(), dtype=object)
+        elif c in FLOAT32_COLUMNS:
+            data[c] = pd.Series(df[c].to_numpy(dtype=np.float64))
+        else:
+            data[c] = pd.Series(np.asarray(df[c]))
+    legacy = pd.DataFrame(data)
+    legacy["all_text"] = pd.Series(catalogue_search_text(df).tolist(), dtype=object)
+    legacy["element_sum"] = legacy[ELEMENTS].sum(axis=1)
+    return legacy
+
+
+def column_bytes(df: pd.DataFrame) -> dict:
+    return {c: int(v) for c, v in df.memory_usage(deep=True, index=False).items()}
+
+
+def main():
+    p = argparse.ArgumentParser(description="Fate Scent 카탈로그 메모리 리포트")
+    p.add_argument("--db", default=DATA_PATH, help="향수 카탈로그 CSV")
+    p.add_argument("--min-ratio", type=float, default=3.0, help="예전/현재 비율이 이보다 작으면 exit 1")
+    p.add_argument("--json", default=None, help="리포트를 JSON 으로도 저장할 경로")
+    args = p.parse_args()
+
+    compact = load_catalogue_frame(args.db)
+    if compact.empty:
+        print(f"catalogue not found or empty: {args.db}", file=sys.stderr)
+        return 1
+    n = len(compact)
+    before, after = column_bytes(legacy_layout(compact)), column_bytes(compact)
+
+    print(f"{n:,} perfumes")
+    header = f"{'column':<20}{'before B/perfume':>18}{'after B/perfume':>18}{'after dtype':>22}"
+    print(header)
+    print("-" * len(header))
+    for c in list(before) + [c for c in after if c not in before]:
+        b = before.get(c)
+        a = after.get(c)
+        dtype = str(compact[c].dtype) if c in compact.columns else "(제거)"
+        cells = [f"{x / n:,.1f}" if x is not None else "-" for x in (b, a)]
+        print(f"{c:<20}{cells[0]:>18}{cells[1]:>18}{dtype[:20]:>22}")
+
+    total_before, total_after = sum(before.values()), sum(after.values())
+    ratio = total_before / max(total_after, 1)
+    print("-" * len(header))
+    print(f"{'total':<20}{total_before / n:>18,.1f}{total_after / n:>18,.1f}")
+    print(f"{total_before / 1e6:,.2f} MB → {total_after / 1e6:,.2f} MB ({ratio:.1f}x)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"rows": n, "before": before, "after": after, "ratio": ratio}, f, ensure_ascii=False, indent=2)
+    if ratio < args.min_ratio:
+        print(f"FAIL ratio {ratio:.2f}x < {args.min_ratio:.1f}x", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
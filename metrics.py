@@ -0,0 +1,241 @@
+# =========================================================
+# Fate Scent 단계별 지연 시간 · 캐시 적중률 · LLM 토큰 계측 (Streamlit 없이 import 가능)
+#   FATESCENT_METRICS=1 일 때만 기록한다. 꺼져 있으면 stage() 는 미리 만든 nullcontext 를 돌려줄 뿐이다.
+#   FATESCENT_METRICS_FILE=/var/lib/node_exporter/fatescent.prom  → 주기적으로 Prometheus 텍스트 형식 파일로 내보냄
+#   FATESCENT_METRICS_INTERVAL=15                                  → 파일 갱신 주기(초)
+#   사용: with metrics.stage("saju"): ...  /  metrics.cache_lookup("llm_reading", hit)  /  metrics.add_tokens("reading", n)
+# =========================================================
+import atexit
+import bisect
+import contextlib
+import os
+import threading
+import time
+
+ENABLED = os.environ.get("FATESCENT_METRICS") == "1"
+
+# 히스토그램 버킷 상한(초). 사주 조회(수 µs)부터 LLM 호출(수십 초)까지 한 벌로 쓴다
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0)
+
+# 관리자 화면 · 리포트에 보이는 순서 (처음 기록될 때 이름이 정해지므로 여기 없는 단계도 받는다)
+STAGES = (
+    "step1_submit", "saju", "db_lookup", "ai_notes", "compat_llm",
+    "step3_submit", "scoring", "reading_llm", "logging", "log_flush", "qr", "share_card",
+)
+
+_NOOP = contextlib.nullcontext()
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "n", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # 마지막 칸은 +Inf
+        self.total = 0.0
+        self.n = 0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.n += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """버킷 안에서 선형 보간한 분위수 (Prometheus histogram_quantile 과 같은 방식)."""
+        if self.n == 0:
+            return 0.0
+        rank = q * self.n
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= rank:
+                if i == len(BUCKETS):
+                    return self.max
+                lower = BUCKETS[i - 1] if i else 0.0
+                return min(lower + (BUCKETS[i] - lower) * (rank - seen) / c, self.max)
+            seen += c
+        return self.max
+
+
+class Registry:
+    """프로세스 단위 집계. 요청 스레드와 LLM 이벤트 루프 스레드가 함께 기록하므로 잠금 하나로 보호한다."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.stages = {}
+        self.caches = {}   # 이름 → [적중, 미스]
+        self.tokens = {}   # 종류 → [호출 수, 토큰 수]
+
+    def observe(self, name: str, seconds: float):
+        with self.lock:
+            hist = self.stages.get(name)
+            if hist is None:
+                hist = self.stages[name] = Histogram()
+            hist.observe(seconds)
+
+    def cache_lookup(self, name: str, hit: bool):
+        with self.lock:
+            self.caches.setdefault(name, [0, 0])[0 if hit else 1] += 1
+
+    def add_tokens(self, kind: str, tokens: int):
+        with self.lock:
+            entry = self.tokens.setdefault(kind, [0, 0])
+            entry[0] += 1
+            entry[1] += int(tokens or 0)
+
+    def reset(self):
+        with self.lock:
+            self.stages.clear()
+            self.caches.clear()
+            self.tokens.clear()
+            self.started = time.time()
+
+    def _ordered_stages(self):
+        names = [s for s in STAGES if s in self.stages] + sorted(s for s in self.stages if s not in STAGES)
+        return [(s, self.stages[s]) for s in names]
+
+    def snapshot(self) -> dict:
+        """관리자 화면용 요약 (ms 단위)."""
+        with self.lock:
+            return {
+                "enabled": ENABLED,
+                "uptime_sec": time.time() - self.started,
+                "stages": [
+                    {
+                        "stage": name, "count": h.n, "mean_ms": h.total / h.n * 1000 if h.n else 0.0,
+                        "p50_ms": h.quantile(0.5) * 1000, "p95_ms": h.quantile(0.95) * 1000, "max_ms": h.max * 1000,
+                    }
+                    for name, h in self._ordered_stages()
+                ],
+                "caches": [
+                    {"cache": name, "hits": hits, "misses": misses, "hit_rate": hits / max(hits + misses, 1)}
+                    for name, (hits, misses) in sorted(self.caches.items())
+                ],
+                "tokens": [
+                    {"kind": kind, "calls": calls, "tokens": tokens}
+                    for kind, (calls, tokens) in sorted(self.tokens.items())
+                ],
+            }
+
+    def render_prometheus(self) -> str:
+        """Prometheus 텍스트 노출 형식 (version 0.0.4)."""
+        lines = [
+            "# HELP fatescent_stage_seconds Latency of one request stage.",
+            "# TYPE fatescent_stage_seconds histogram",
+        ]
+        with self.lock:
+            for name, h in self._ordered_stages():
+                label = f'stage="{_escape(name)}"'
+                cumulative = 0
+                for bound, c in zip(BUCKETS + (float("inf"),), h.counts):
+                    cumulative += c
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'fatescent_stage_seconds_bucket{{{label},le="{le}"}} {cumulative}')
+                lines.append(f"fatescent_stage_seconds_sum{{{label}}} {h.total!r}")
+                lines.append(f"fatescent_stage_seconds_count{{{label}}} {h.n}")
+
+            lines += [
+                "# HELP fatescent_cache_requests_total Cache lookups by result.",
+                "# TYPE fatescent_cache_requests_total counter",
+            ]
+            for name, (hits, misses) in sorted(self.caches.items()):
+                lines.append(f'fatescent_cache_requests_total{{cache="{_escape(name)}",result="hit"}} {hits}')
+                lines.append(f'fatescent_cache_requests_total{{cache="{_escape(name)}",result="miss"}} {misses}')
+
+            lines += [
+                "# HELP fatescent_llm_requests_total Completed LLM calls.",
+                "# TYPE fatescent_llm_requests_total counter",
+            ]
+            lines += [f'fatescent_llm_requests_total{{kind="{_escape(k)}"}} {calls}' for k, (calls, _) in sorted(self.tokens.items())]
+            lines += [
+                "# HELP fatescent_llm_tokens_total Total tokens reported by the LLM API.",
+                "# TYPE fatescent_llm_tokens_total counter",
+            ]
+            lines += [f'fatescent_llm_tokens_total{{kind="{_escape(k)}"}} {tokens}' for k, (_, tokens) in sorted(self.tokens.items())]
+
+            lines += [
+                "# HELP fatescent_process_start_time_seconds Start of the metrics window (unix time).",
+                "# TYPE fatescent_process_start_time_seconds gauge",
+                f"fatescent_process_start_time_seconds {self.started:.3f}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+REGISTRY = Registry()
+
+
+# =========================================================
+# 기록 API (꺼져 있으면 바로 돌아간다)
+# =========================================================
+class _StageTimer:
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        REGISTRY.observe(self.name, time.perf_counter() - self.t0)
+        return False
+
+
+def stage(name: str):
+    """with stage("scoring"): ... — 예외로 빠져나가도 걸린 시간은 기록한다."""
+    return _StageTimer(name) if ENABLED else _NOOP
+
+def observe(name: str, seconds: float):
+    if ENABLED:
+        REGISTRY.observe(name, seconds)
+
+def cache_lookup(name: str, hit: bool):
+    if ENABLED:
+        REGISTRY.cache_lookup(name, hit)
+
+def add_tokens(kind: str, tokens: int):
+    if ENABLED:
+        REGISTRY.add_tokens(kind, tokens)
+
+def set_enabled(flag: bool):
+    """벤치마크 · 점검 스크립트에서 환경변수 없이 켜고 끌 때."""
+    global ENABLED
+    ENABLED = bool(flag)
+
+
+# =========================================================
+# 파일 내보내기 (node_exporter textfile collector 등)
+# =========================================================
+def write_prometheus_file(path: str):
+    """읽는 쪽이 반쯤 쓰인 파일을 보지 않도록 임시 파일에 쓰고 교체한다."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(REGISTRY.render_prometheus())
+    os.replace(tmp_path, path)
+
+def start_file_exporter(path: str, interval: float = 15.0) -> threading.Thread:
+    def _run():
+        while True:
+            time.sleep(interval)
+            try:
+                write_prometheus_file(path)
+            except Exception:
+                pass
+
+    def _final_write():
+        try:
+            write_prometheus_file(path)
+        except Exception:
+            pass
+
+    thread = threading.Thread(target=_run, name="metrics-file-exporter", daemon=True)
+    thread.start()
+    atexit.register(_final_write)
+    return thread
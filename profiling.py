@@ -0,0 +1,164 @@
+# =========================================================
+# 느린 요청 한 건을 들여다보는 선택형 프로파일러 (Streamlit 없이 import 가능)
+#   with profiling.profile(session_id, "step3"): ...   → 그 구간만 cProfile + 스택 샘플링
+#   결과는 PROFILE_DIR 에 세션 ID 별로 저장:
+#     {session_id}_{label}_{시각}.prof    cProfile 통계 (snakeviz, gprof2dot, python -m pstats)
+#     {session_id}_{label}_{시각}.folded  접힌 스택 "f1;f2;f3 샘플수" (speedscope, flamegraph.pl, inferno)
+#   FATESCENT_PROFILE_DIR / _MAX_RUNS / _MAX_AGE_DAYS / _MAX_MB 로 저장 위치와 보관 한도를 바꾼다.
+# =========================================================
+import contextlib
+import cProfile
+import datetime
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+
+PROFILE_DIR = os.environ.get("FATESCENT_PROFILE_DIR") or os.path.join(base_dir, "profiles")
+PROFILE_MAX_RUNS = int(os.environ.get("FATESCENT_PROFILE_MAX_RUNS", "50"))
+PROFILE_MAX_AGE_SEC = float(os.environ.get("FATESCENT_PROFILE_MAX_AGE_DAYS", "7")) * 24 * 3600
+PROFILE_MAX_BYTES = int(float(os.environ.get("FATESCENT_PROFILE_MAX_MB", "200")) * 1024 * 1024)
+SAMPLE_INTERVAL_SEC = 0.005
+PROFILE_SUFFIXES = (".prof", ".folded")
+
+# cProfile 은 프로세스에 하나만 켤 수 있다 (3.12+ 는 sys.monitoring 공유 → 두 번째 enable() 이 ValueError).
+# 동시에 들어온 두 번째 요청은 프로파일 없이 그대로 실행한다.
+_ACTIVE = threading.Lock()
+
+
+class StackSampler:
+    """대상 스레드의 호출 스택을 일정 간격으로 찍어 접힌 스택(folded) 빈도로 모은다.
+    LLM 응답을 기다리는 시간처럼 CPU 를 쓰지 않는 구간도 벽시계 기준으로 드러난다."""
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL_SEC):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+def _safe_name(value: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]+", "-", str(value))[:64] or "anon"
+
+
+class ProfileRun:
+    """with 블록 하나를 프로파일링해서 파일로 남긴다. st.stop()/st.rerun() 같은 예외로 빠져나가도 저장한다.
+    다른 실행이 프로파일링 중이거나 enable() 이 실패하면 아무것도 하지 않는다 (active=False)."""
+
+    def __init__(self, session_id: str, label: str, out_dir: str = None):
+        self.session_id = session_id
+        self.label = label
+        self.out_dir = out_dir or PROFILE_DIR
+        self.paths = []
+        self.active = False
+
+    def __enter__(self):
+        if not _ACTIVE.acquire(blocking=False):
+            return self
+        self._profiler = cProfile.Profile()
+        try:
+            self._profiler.enable()
+        except Exception:
+            _ACTIVE.release()  # 다른 프로파일러(디버거, coverage 등)가 이미 켜져 있음
+            return self
+        self._sampler = StackSampler(threading.get_ident()).start()
+        self._t0 = time.perf_counter()
+        self.active = True
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.active:
+            return False
+        try:
+            self._profiler.disable()
+            self._sampler.stop()
+            self.elapsed = time.perf_counter() - self._t0
+            self._save()
+        except Exception:
+            pass  # 프로파일 저장 실패가 요청을 깨뜨리면 안 된다
+        finally:
+            self.active = False
+            _ACTIVE.release()
+        return False
+
+    def _save(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")
+        stem = os.path.join(self.out_dir, f"{_safe_name(self.session_id)}_{_safe_name(self.label)}_{stamp}")
+        self._profiler.dump_stats(stem + ".prof")
+        with open(stem + ".folded", "w", encoding="utf-8") as f:
+            f.write(self._sampler.folded())
+        self.paths = [stem + suffix for suffix in PROFILE_SUFFIXES]
+        prune_profiles(self.out_dir)
+
+
+def profile(session_id: str, label: str, out_dir: str = None):
+    """프로파일링 중인 실행이 이미 있으면 nullcontext (그 요청은 프로파일 없이 진행)."""
+    if _ACTIVE.locked():
+        return contextlib.nullcontext()
+    return ProfileRun(session_id, label, out_dir)
+
+
+def list_profiles(out_dir: str = None) -> list:
+    """[(stem, 수정 시각, 바이트)] 최신순. .prof/.folded 한 벌을 실행 한 번으로 센다."""
+    out_dir = out_dir or PROFILE_DIR
+    runs = {}
+    try:
+        names = os.listdir(out_dir)
+    except FileNotFoundError:
+        return []
+    for name in names:
+        stem, suffix = os.path.splitext(name)
+        if suffix not in PROFILE_SUFFIXES:
+            continue
+        try:
+            stat = os.stat(os.path.join(out_dir, name))
+        except FileNotFoundError:
+            continue
+        mtime, size = runs.get(stem, (0.0, 0))
+        runs[stem] = (max(mtime, stat.st_mtime), size + stat.st_size)
+    return sorted(((stem, mtime, size) for stem, (mtime, size) in runs.items()), key=lambda r: -r[1])
+
+def prune_profiles(out_dir: str = None, max_runs: int = PROFILE_MAX_RUNS,
+                   max_age_sec: float = PROFILE_MAX_AGE_SEC, max_bytes: int = PROFILE_MAX_BYTES):
+    """보관 한도를 넘는 실행은 오래된 것부터 지운다: 개수, 나이, 전체 용량."""
+    out_dir = out_dir or PROFILE_DIR
+    now = time.time()
+    kept_runs, kept_bytes = 0, 0
+    for stem, mtime, size in list_profiles(out_dir):
+        if kept_runs < max_runs and now - mtime <= max_age_sec and kept_bytes + size <= max_bytes:
+            kept_runs += 1
+            kept_bytes += size
+            continue
+        for suffix in PROFILE_SUFFIXES:
+            try:
+                os.remove(os.path.join(out_dir, stem + suffix))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,166 @@
+# =========================================================
+# 벡터 후보 검색 인덱스 (NumPy 만 사용, Streamlit 없이 import 가능)
+#   유사도 상위 후보를 빠르게 뽑고, 최종 순위는 engine.score_perfumes 가 다시 매긴다.
+#   metric: cosine (행 정규화 후 내적) / ip (내적 그대로 — 점수식의 선형 부분을 내적으로 펼친 특성 벡터용)
+#   brute: 전체 행렬 곱 (정확, 기준선)
+#   ivf  : k-means 로 벡터를 n_lists 개 묶음으로 나누고, 질의와 가까운 n_probe 개 묶음만 검사 (근사)
+#   지금은 오행 + 태그 특성 수십 차원이지만 노트/어코드 임베딩(수백 차원)이 붙어도 같은 인터페이스로 쓴다.
+#   build_index("ivf", vectors, metric="ip", n_lists=..., n_probe=...) / measure_recall(index, exact, queries, k)
+# =========================================================
+import time
+
+import numpy as np
+
+ASSIGN_CHUNK_ROWS = 16384  # 배정 단계에서 (행 x 묶음) 유사도 행렬을 이 행 수씩 나눠 계산 (메모리 상한)
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """행 단위 L2 정규화 (float32). 0 벡터는 0 으로 둔다 → 어떤 질의와도 유사도 0 (engine 의 정확 계산과 같음)."""
+    mat = np.ascontiguousarray(vectors, dtype=np.float32)
+    if mat.ndim == 1:
+        mat = mat[None, :]
+    norms = np.sqrt(np.einsum("ij,ij->i", mat, mat))
+    return np.divide(mat, norms[:, None], out=np.zeros_like(mat), where=norms[:, None] > 0)
+
+def _top_k(sims: np.ndarray, k: int) -> np.ndarray:
+    """유사도 내림차순 상위 k 위치 (동점은 앞 위치 우선)."""
+    if k >= len(sims):
+        return np.argsort(-sims, kind="stable")
+    part = np.argpartition(-sims, k - 1)[:k]
+    return part[np.lexsort((part, -sims[part]))]
+
+
+METRICS = ("cosine", "ip")
+
+def _prepare(vectors, metric: str) -> np.ndarray:
+    if metric not in METRICS:
+        raise ValueError(f"unknown metric: {metric} (choose from {', '.join(METRICS)})")
+    if metric == "cosine":
+        return normalize_rows(vectors)
+    mat = np.ascontiguousarray(vectors, dtype=np.float32)
+    return mat[None, :] if mat.ndim == 1 else mat
+
+
+class BruteForceIndex:
+    """정확 검색. 질의마다 (허용된) 전체 벡터와 내적."""
+    kind = "brute"
+
+    def __init__(self, vectors, metric: str = "cosine"):
+        self.metric = metric
+        self.vectors = _prepare(vectors, metric)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def similarity(self, ids: np.ndarray, query) -> np.ndarray:
+        return self.vectors[ids] @ _prepare(query, self.metric)[0]
+
+    def search(self, query, k: int, rows: np.ndarray = None):
+        """유사도 상위 k 개의 (행 번호, 유사도). rows 를 주면 그 행들 안에서만 찾는다."""
+        q = _prepare(query, self.metric)[0]
+        ids = np.arange(len(self.vectors)) if rows is None else np.asarray(rows, dtype=np.int64)
+        sims = (self.vectors if rows is None else self.vectors[ids]) @ q
+        top = _top_k(sims, k)
+        return ids[top], sims[top]
+
+
+class IVFIndex:
+    """역파일(IVF) 근사 검색. 묶음별 벡터를 연속 메모리에 모아 두고 질의와 내적이 큰 중심의 묶음만 훑는다.
+    cosine 은 구면 k-means, ip 는 유클리드 k-means 로 묶는다.
+    필터로 허용된 행이 k 개보다 적게 잡히면 n_probe 를 두 배씩 늘려 다시 찾는다."""
+    kind = "ivf"
+
+    def __init__(self, vectors, metric: str = "cosine", n_lists: int = None, n_probe: int = 8, iters: int = 10,
+                 train_per_list: int = 64, seed: int = 0):
+        self.metric = metric
+        data = _prepare(vectors, metric)
+        n = len(data)
+        self.n_lists = int(max(1, min(n_lists or int(np.sqrt(n)), n, 4096)))
+        self.n_probe = int(max(1, min(n_probe, self.n_lists)))
+
+        rng = np.random.default_rng(seed)
+        train = data[rng.choice(n, min(n, self.n_lists * train_per_list), replace=False)] if n else data
+        centroids = train[rng.choice(len(train), self.n_lists, replace=False)] if n else np.zeros((1, data.shape[1]), np.float32)
+        for _ in range(iters):
+            assign = self._assign(train, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, train)
+            sizes = np.bincount(assign, minlength=self.n_lists)
+            empty = sizes == 0
+            sums[empty] = centroids[empty]  # 빈 묶음은 이전 중심 유지
+            sizes[empty] = 1
+            centroids = normalize_rows(sums) if metric == "cosine" else (sums / sizes[:, None]).astype(np.float32)
+
+        assign = self._assign(data, centroids)
+        order = np.argsort(assign, kind="stable")
+        self.centroids = centroids
+        self.ids = order.astype(np.int64)
+        self.vectors = np.ascontiguousarray(data[order])
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=self.n_lists))]).astype(np.int64)
+
+    def _assign(self, data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        """가장 가까운 중심 번호. cosine 은 내적 최대, ip 는 유클리드 거리 최소 (= x·c - |c|²/2 최대)."""
+        bias = 0.0 if self.metric == "cosine" else 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+        out = np.empty(len(data), dtype=np.int64)
+        for start in range(0, len(data), ASSIGN_CHUNK_ROWS):
+            chunk = data[start:start + ASSIGN_CHUNK_ROWS]
+            out[start:start + len(chunk)] = np.argmax(chunk @ centroids.T - bias, axis=1)
+        return out
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query, k: int, rows: np.ndarray = None, n_probe: int = None):
+        q = _prepare(query, self.metric)[0]
+        allowed = None
+        if rows is not None:
+            allowed = np.zeros(len(self.ids), dtype=bool)
+            allowed[rows] = True
+            k = min(k, int(allowed.sum()))
+        order = np.argsort(-(self.centroids @ q), kind="stable")
+        probe = n_probe or self.n_probe
+        while True:
+            lists = order[:probe]
+            slices = [np.arange(self.offsets[c], self.offsets[c + 1]) for c in lists]
+            pos = np.concatenate(slices) if slices else np.array([], dtype=np.int64)
+            ids = self.ids[pos]
+            if allowed is not None:
+                keep = allowed[ids]
+                pos, ids = pos[keep], ids[keep]
+            if len(ids) >= k or probe >= self.n_lists:
+                break
+            probe *= 2
+        sims = self.vectors[pos] @ q
+        top = _top_k(sims, k)
+        return ids[top], sims[top]
+
+
+INDEX_TYPES = {"brute": BruteForceIndex, "ivf": IVFIndex}
+
+def build_index(kind: str, vectors, **params):
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"unknown index type: {kind} (choose from {', '.join(INDEX_TYPES)})")
+    return INDEX_TYPES[kind](vectors, **params)
+
+
+def measure_recall(index, exact: BruteForceIndex, queries, k: int, rows: np.ndarray = None) -> dict:
+    """정확 검색(exact) 대비 recall@k 와 질의당 지연 시간.
+    경계 유사도와 같은 값을 가진 다른 행을 고른 경우(동점)는 정답으로 친다."""
+    recalls, times = [], []
+    for q in queries:
+        truth, truth_sims = exact.search(q, k, rows)
+        t0 = time.perf_counter()
+        got, _ = index.search(q, k, rows)
+        times.append(time.perf_counter() - t0)
+        if len(truth) == 0:
+            continue
+        got_sims = exact.similarity(got, q)
+        hit = np.count_nonzero(got_sims >= truth_sims.min() - 1e-6)
+        recalls.append(min(hit, len(truth)) / len(truth))
+    ms = np.array(times) * 1000
+    return {
+        "recall": float(np.mean(recalls)) if recalls else 1.0,
+        "p50_ms": float(np.percentile(ms, 50)) if len(ms) else 0.0,
+        "p95_ms": float(np.percentile(ms, 95)) if len(ms) else 0.0,
+        "queries": len(queries),
+    }
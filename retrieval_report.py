@@ -0,0 +1,202 @@
+# =========================================================
+# 후보 검색 인덱스(retrieval.py) recall · 지연 시간 리포트
+#   python retrieval_report.py                              # 실제 카탈로그: brute / ivf 를 정확 추천과 비교
+#   python retrieval_report.py --synthetic 1M --n-probe 64  # benchmark.py 합성 카탈로그
+#   python retrieval_report.py --embedding-dim 256 --embedding-rows 200000   # 임베딩(수백 차원) 가정 시뮬레이션
+#   retrieval : 감점 전 점수(내적) 상위 --candidates 개가 정확 검색 결과와 얼마나 겹치는지 (recall@candidates)
+#   end-to-end: 후보만 다시 점수 매긴 추천 Top k 가 전체를 점수 매긴 Top k 와 얼마나 같은지 (recall@k)
+#   penalty   : 싫어하는 향 감점(-0.5)으로 감점 전 점수 순위가 뒤집히는 소형 카탈로그 (무작위 질의로는 거의 안 걸림)
+#   --min-recall 을 주면 end-to-end recall 이 그보다 낮은 인덱스가 있을 때 exit 1 (penalty 포함)
+# =========================================================
+import argparse
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import retrieval
+from engine import (
+    DATA_PATH, ELEMENTS, TAG_TO_KEYWORDS, GENDER_FILTER_OPTIONS, BRAND_FILTER_OPTIONS, RETRIEVAL_CANDIDATES,
+    load_catalogue_frame, retrieval_features, retrieval_query, recommend_rows, build_retriever,
+)
+
+TAG_SETS = ([], ["나무향(우디)"], ["꽃향기(플로럴)", "포근한(머스크)"], ["상큼한(시트러스)", "시원한(아쿠아/마린)"])
+
+# 감점 사례: 감점 전 점수는 머스크 향수가 높지만 '포근한(머스크)' 를 싫어하면 감점돼 삼나무 향수가 정답이 된다
+PENALTY_GROUPS = (  # (브랜드 접두, 노트, 행 수, 오행 Wood, Fire, Earth, Metal, Water)
+    ("Musk House", "white musk", 400, (0.5, 0.1, 0.5, 0.5, 1.0)),
+    ("Cedar House", "cedar", 100, (0.3, 0.1, 0.1, 0.1, 0.6)),
+)
+PENALTY_PROFILES = [
+    ("Water", "Fire", [], ["포근한(머스크)"], brand_filter, gender_filter)
+    for brand_filter, gender_filter in itertools.product(BRAND_FILTER_OPTIONS, GENDER_FILTER_OPTIONS)
+]
+
+
+def query_profiles() -> list:
+    """(weak, strong, pref, dislike, brand_filter, gender_filter) 조합. 오행 쌍 x 취향 x 필터."""
+    tags = list(TAG_TO_KEYWORDS)
+    out = []
+    for (weak, strong), pref in itertools.product(itertools.permutations(ELEMENTS, 2), TAG_SETS):
+        dislike = [t for t in tags if t not in pref][-1:]
+        for brand_filter, gender_filter in itertools.product(BRAND_FILTER_OPTIONS, GENDER_FILTER_OPTIONS):
+            out.append((weak, strong, pref, dislike, brand_filter, gender_filter))
+    return out
+
+
+def _ms(times) -> dict:
+    ms = np.asarray(times) * 1000
+    return {"p50_ms": round(float(np.percentile(ms, 50)), 3), "p95_ms": round(float(np.percentile(ms, 95)), 3)}
+
+
+def end_to_end(df, retriever, profiles, k: int, candidates: int) -> dict:
+    """retriever 를 쓴 추천 Top k 와 정확 추천 Top k 비교. 점수가 정확 k 위 점수 이상이면 맞힌 것으로 (동점 허용)."""
+    hits = total = 0
+    exact_times, times = [], []
+    for args in profiles:
+        t0 = time.perf_counter()
+        exact = recommend_rows(df, *args, k=k)
+        exact_times.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        got = recommend_rows(df, *args, k=k, retriever=retriever, candidates=candidates)
+        times.append(time.perf_counter() - t0)
+        if exact:
+            floor = min(r.score for r in exact) - 1e-9
+            hits += min(sum(r.score >= floor for r in got), len(exact))
+            total += len(exact)
+    return {"recall": hits / max(total, 1), "exact": _ms(exact_times), "retriever": _ms(times)}
+
+
+def catalogue_report(df, args) -> dict:
+    features = retrieval_features(df)
+    report = {"rows": len(df), "dim": features.shape[1], "indexes": {}}
+    exact = retrieval.build_index("brute", features, metric="ip")
+    profiles = query_profiles()
+    queries = [retrieval_query(*p[:4]) for p in profiles[::len(BRAND_FILTER_OPTIONS) * len(GENDER_FILTER_OPTIONS)]]
+
+    for kind in args.index:
+        params = {"n_lists": args.n_lists, "n_probe": args.n_probe} if kind == "ivf" else {}
+        t0 = time.perf_counter()
+        index = build_retriever(df, kind, **params)
+        build_sec = time.perf_counter() - t0
+        search = retrieval.measure_recall(index, exact, queries, args.candidates)
+        report["indexes"][kind] = {
+            "build_sec": round(build_sec, 3),
+            "params": {"n_lists": index.n_lists, "n_probe": index.n_probe} if kind == "ivf" else {},
+            "retrieval": {"recall": round(search["recall"], 4), "p50_ms": round(search["p50_ms"], 3), "p95_ms": round(search["p95_ms"], 3)},
+            "end_to_end": end_to_end(df, index, profiles, args.k, args.candidates),
+        }
+    return report
+
+
+def penalty_catalogue_csv(data_dir: str) -> str:
+    path = os.path.join(data_dir, "penalty.csv")
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        records = [
+            {"Brand": f"{brand} {i}", "Name": f"{notes.title()} {i}", "Notes": notes, "Female_Score": 0.5, "Male_Score": 0.5,
+             **dict(zip(ELEMENTS, elements))}
+            for brand, notes, n, elements in PENALTY_GROUPS for i in range(n)
+        ]
+        pd.DataFrame(records).to_csv(path, index=False, encoding="utf-8-sig")
+    return path
+
+
+def penalty_report(args) -> dict:
+    df = load_catalogue_frame(penalty_catalogue_csv(os.path.join(tempfile.gettempdir(), "fatescent-retrieval")))
+    report = {"rows": len(df), "indexes": {}}
+    for kind in args.index:
+        params = {"n_lists": args.n_lists, "n_probe": args.n_probe} if kind == "ivf" else {}
+        report["indexes"][kind] = end_to_end(df, build_retriever(df, kind, **params), PENALTY_PROFILES, args.k, args.candidates)
+    return report
+
+
+def embedding_report(args) -> dict:
+    """노트/어코드 임베딩을 가정한 고차원 벡터: 가우시안 군집 + 잡음, cosine recall@k."""
+    rng = np.random.default_rng(args.seed)
+    n, dim = args.embedding_rows, args.embedding_dim
+    centers = rng.standard_normal((max(16, n // 500), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    queries = centers[rng.integers(0, len(centers), 50)] + 0.6 * rng.standard_normal((50, dim)).astype(np.float32)
+
+    exact = retrieval.build_index("brute", vectors)
+    report = {"rows": n, "dim": dim, "indexes": {}}
+    for kind in args.index:
+        params = {"n_lists": args.n_lists, "n_probe": args.n_probe} if kind == "ivf" else {}
+        t0 = time.perf_counter()
+        index = retrieval.build_index(kind, vectors, **params)
+        build_sec = time.perf_counter() - t0
+        search = retrieval.measure_recall(index, exact, queries, args.embedding_k)
+        report["indexes"][kind] = {"build_sec": round(build_sec, 3), **{k: round(v, 4) for k, v in search.items()}}
+    return report
+
+
+def main():
+    p = argparse.ArgumentParser(description="Fate Scent 후보 검색 인덱스 recall 리포트")
+    p.add_argument("--db", default=DATA_PATH, help="향수 카탈로그 CSV")
+    p.add_argument("--synthetic", default=None, help="benchmark.py 합성 카탈로그 크기 (1k, 10k, 100k, 1M)")
+    p.add_argument("--index", default="brute,ivf", help="비교할 인덱스 (쉼표 구분)")
+    p.add_argument("--n-lists", type=int, default=None, help="ivf 묶음 수 (기본 √N)")
+    p.add_argument("--n-probe", type=int, default=8, help="ivf 질의당 검사할 묶음 수")
+    p.add_argument("--candidates", type=int, default=RETRIEVAL_CANDIDATES, help="다시 점수 매길 후보 수")
+    p.add_argument("-k", type=int, default=3, help="추천 개수")
+    p.add_argument("--embedding-dim", type=int, default=0, help="0 보다 크면 고차원 임베딩 시뮬레이션도 실행")
+    p.add_argument("--embedding-rows", type=int, default=100_000)
+    p.add_argument("--embedding-k", type=int, default=10)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--min-recall", type=float, default=None, help="end-to-end recall 하한 (주면 미달 시 exit 1)")
+    p.add_argument("--json", default=None, help="리포트를 JSON 으로도 저장할 경로")
+    args = p.parse_args()
+    args.index = [s.strip() for s in args.index.split(",") if s.strip()]
+    unknown = [s for s in args.index if s not in retrieval.INDEX_TYPES]
+    if unknown:
+        p.error(f"unknown index: {', '.join(unknown)}")
+
+    if args.synthetic:
+        from benchmark import DEFAULT_DATA_DIR, catalogue_csv
+        args.db = catalogue_csv(args.synthetic, DEFAULT_DATA_DIR, args.seed)
+    df = load_catalogue_frame(args.db)
+    if df.empty:
+        print(f"catalogue not found or empty: {args.db}", file=sys.stderr)
+        return 1
+
+    report = {"catalogue": catalogue_report(df, args)}
+    cat = report["catalogue"]
+    print(f"catalogue {cat['rows']:,} perfumes · 특성 {cat['dim']}차원 · 후보 {args.candidates} · Top {args.k}")
+    header = f"{'index':<8}{'build s':>9}{'retr recall':>13}{'retr p50':>10}{'e2e recall':>12}{'exact p50':>11}{'e2e p50':>9}{'e2e p95':>9}"
+    print(header)
+    print("-" * len(header))
+    for kind, r in cat["indexes"].items():
+        e2e = r["end_to_end"]
+        print(f"{kind:<8}{r['build_sec']:>9.2f}{r['retrieval']['recall']:>13.4f}{r['retrieval']['p50_ms']:>10.2f}"
+              f"{e2e['recall']:>12.4f}{e2e['exact']['p50_ms']:>11.2f}{e2e['retriever']['p50_ms']:>9.2f}{e2e['retriever']['p95_ms']:>9.2f}")
+
+    report["penalty"] = pen = penalty_report(args)
+    print(f"\npenalty {pen['rows']} perfumes · 싫어하는 향 감점으로 순위가 뒤집히는 경우")
+    for kind, r in pen["indexes"].items():
+        print(f"{kind:<8}{'':>9}{'':>13}{'':>10}{r['recall']:>12.4f}{r['exact']['p50_ms']:>11.2f}{r['retriever']['p50_ms']:>9.2f}{r['retriever']['p95_ms']:>9.2f}")
+
+    if args.embedding_dim > 0:
+        report["embedding"] = emb = embedding_report(args)
+        print(f"\nembedding {emb['rows']:,} x {emb['dim']}차원 · cosine recall@{args.embedding_k}")
+        for kind, r in emb["indexes"].items():
+            print(f"{kind:<8}{r['build_sec']:>9.2f}{r['recall']:>13.4f}{r['p50_ms']:>10.2f} ms (p95 {r['p95_ms']:.2f} ms)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    checks = [(kind, r["end_to_end"]["recall"]) for kind, r in cat["indexes"].items()]
+    checks += [(f"{kind} (penalty)", r["recall"]) for kind, r in pen["indexes"].items()]
+    failed = [(name, recall) for name, recall in checks if args.min_recall is not None and recall < args.min_recall]
+    for name, recall in failed:
+        print(f"FAIL {name}: end-to-end recall {recall:.4f} < {args.min_recall}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+# =========================================================
+# 사주 조회 테이블: (양력 날짜, 시지) → 사주 이름 · 오행 개수
+#   생성: python saju_table.py [시작 YYYY-MM-DD] [끝 YYYY-MM-DD] [출력 경로]
+#   앱은 생성된 .npy를 mmap으로 열고, 범위 밖 날짜만 만세력(KoreanLunarCalendar)으로 계산한다.
+#   .npy 는 저장소에 넣지 않으므로 배포(빌드) 단계에서 한 번 실행해야 한다. 없으면 앱은 모든 날짜를 만세력으로 계산한다.
+# =========================================================
+import datetime
+import os
+import sys
+
+import numpy as np
+
+STEMS = "갑을병정무기경신임계"
+BRANCHES = "자축인묘진사오미신유술해"
+ELEMENTS = ["Wood", "Fire", "Earth", "Metal", "Water"]
+
+# 천간/지지 → 오행 번호 (ELEMENTS 순서)
+STEM_ELEMENT = np.array([0, 0, 1, 1, 2, 2, 3, 3, 4, 4], dtype=np.uint8)
+BRANCH_ELEMENT = np.array([4, 2, 0, 0, 2, 1, 1, 2, 3, 3, 2, 4], dtype=np.uint8)
+
+# 시간 구간: 0 = 시간 모름, 1..12 = 자시..해시
+N_TIME_BUCKETS = 13
+
+TABLE_DTYPE = np.dtype([
+    ("ordinal", "<i4"),           # datetime.date.toordinal()
+    ("pillars", "u1", (6,)),      # 연간, 연지, 월간, 월지, 일간, 일지 (STEMS/BRANCHES 인덱스)
+    ("leap", "u1"),               # 윤달 여부 (만세력 문자열의 '(윤월)')
+    ("counts", "u1", (N_TIME_BUCKETS, len(ELEMENTS))),
+])
+
+DEFAULT_START = datetime.date(1950, 1, 1)
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "saju_table.npy")
+
+
+def time_branch_index(hour, minute) -> int:
+    total_mins = hour * 60 + minute
+    return 0 if total_mins >= 1410 or total_mins < 90 else ((total_mins - 90) // 120 + 1) % 12
+
+
+def time_bucket(hour=None, minute=None) -> int:
+    if hour is None or minute is None:
+        return 0
+    return time_branch_index(hour, minute) + 1
+
+
+def time_buckets(hours, minutes) -> np.ndarray:
+    """time_bucket 의 배열 버전. 시/분이 NaN이면 0(시간 모름)."""
+    hours = np.asarray(hours, dtype=float)
+    minutes = np.asarray(minutes, dtype=float)
+    known = ~(np.isnan(hours) | np.isnan(minutes))
+    total = np.where(known, hours * 60 + minutes, 0).astype(np.int64)
+    branch = np.where((total >= 1410) | (total < 90), 0, ((total - 90) // 120 + 1) % 12)
+    return np.where(known, branch + 1, 0).astype(np.int64)
+
+
+def build_table(start=DEFAULT_START, end=None) -> np.ndarray:
+    """start~end 의 모든 날짜를 만세력으로 계산해 테이블 생성. 만세력 지원 범위를 벗어나면 거기서 멈춘다."""
+    from korean_lunar_calendar import KoreanLunarCalendar
+
+    end = end or datetime.date(datetime.date.today().year + 1, 12, 31)
+    n = (end - start).days + 1
+    table = np.zeros(n, dtype=TABLE_DTYPE)
+    cal = KoreanLunarCalendar()
+    for i in range(n):
+        d = start + datetime.timedelta(days=i)
+        if not cal.setSolarDate(d.year, d.month, d.day):
+            table = table[:i]
+            break
+        gapja = cal.getGapJaString().split()
+        table[i]["ordinal"] = d.toordinal()
+        table[i]["pillars"] = [
+            STEMS.index(gapja[0][0]), BRANCHES.index(gapja[0][1]),
+            STEMS.index(gapja[1][0]), BRANCHES.index(gapja[1][1]),
+            STEMS.index(gapja[2][0]), BRANCHES.index(gapja[2][1]),
+        ]
+        table[i]["leap"] = len(gapja) > 3
+
+    pillars = table["pillars"].astype(np.int64)
+    rows = np.arange(len(table))
+    base = np.zeros((len(table), len(ELEMENTS)), dtype=np.uint8)
+    for col in range(6):
+        element_map = STEM_ELEMENT if col % 2 == 0 else BRANCH_ELEMENT
+        np.add.at(base, (rows, element_map[pillars[:, col]]), 1)
+
+    counts = np.repeat(base[:, None, :], N_TIME_BUCKETS, axis=1)
+    for branch in range(12):
+        time_stem = ((pillars[:, 4] % 5) * 2 + branch) % 10
+        np.add.at(counts, (rows, branch + 1, STEM_ELEMENT[time_stem]), 1)
+        counts[:, branch + 1, BRANCH_ELEMENT[branch]] += 1
+    table["counts"] = counts
+    return table
+
+
+def save_table(table: np.ndarray, path=DEFAULT_PATH):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, table)
+    os.replace(tmp_path, path)
+
+
+class SajuTable:
+    """mmap으로 연 사주 테이블. 범위 밖 날짜는 lookup 이 None 을 돌려준다."""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.rows = np.load(path, mmap_mode="r")
+        if self.rows.dtype != TABLE_DTYPE or len(self.rows) == 0:
+            raise ValueError(f"invalid saju table: {path}")
+        self.start = int(self.rows[0]["ordinal"])
+
+    def __len__(self):
+        return len(self.rows)
+
+    def row_index(self, ordinals) -> np.ndarray:
+        """날짜 ordinal → 행 번호 (범위 밖은 -1)."""
+        idx = np.asarray(ordinals, dtype=np.int64) - self.start
+        return np.where((idx >= 0) & (idx < len(self.rows)), idx, -1)
+
+    def lookup(self, year, month, day, hour=None, minute=None):
+        """(saju_name, counts, gapja_str) 또는 범위 밖이면 None. get_real_saju_elements 와 같은 형식."""
+        i = int(self.row_index(datetime.date(year, month, day).toordinal()))
+        if i < 0:
+            return None
+        row = self.rows[i]
+        p = row["pillars"]
+        pillars = [f"{STEMS[p[0]]}{BRANCHES[p[1]]}년", f"{STEMS[p[2]]}{BRANCHES[p[3]]}월", f"{STEMS[p[4]]}{BRANCHES[p[5]]}일"]
+        gapja_str = " ".join(pillars) + (" (윤월)" if row["leap"] else "")
+        saju_name = " ".join(pillars)
+
+        bucket = time_bucket(hour, minute)
+        if bucket:
+            branch = bucket - 1
+            saju_name += f" {STEMS[((p[4] % 5) * 2 + branch) % 10]}{BRANCHES[branch]}시"
+        else:
+            saju_name += " (시간 모름·6글자 기준)"
+
+        counts = {e: int(c) for e, c in zip(ELEMENTS, row["counts"][bucket])}
+        return saju_name, counts, gapja_str
+
+    def element_counts_many(self, ordinals, buckets):
+        """대량 집계용: (N x 5) 오행 개수와 테이블 적중 마스크. 범위 밖 행은 0."""
+        idx = self.row_index(ordinals)
+        hit = idx >= 0
+        out = np.zeros((len(idx), len(ELEMENTS)), dtype=np.uint8)
+        out[hit] = self.rows["counts"][idx[hit], np.asarray(buckets, dtype=np.int64)[hit]]
+        return out, hit
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    start = datetime.date.fromisoformat(args[0]) if len(args) > 0 else DEFAULT_START
+    end = datetime.date.fromisoformat(args[1]) if len(args) > 1 else None
+    path = args[2] if len(args) > 2 else DEFAULT_PATH
+    table = build_table(start, end)
+    save_table(table, path)
+    first = datetime.date.fromordinal(int(table[0]["ordinal"]))
+    last = datetime.date.fromordinal(int(table[-1]["ordinal"]))
+    print(f"saved {len(table):,} days ({first} ~ {last}, {table.nbytes / 1e6:.1f} MB) → {path}")
@@ -0,0 +1,309 @@
+# =========================================================
+# Fate Scent 추천 HTTP/JSON 서비스 (ASGI, Streamlit 없이 engine.py 만 사용)
+#   pip install uvicorn starlette
+#   python server.py --port 8000 --workers 4
+#   부모 프로세스가 카탈로그 컴파일본 · 사주 테이블 · 향수 색인을 먼저 올린 뒤 워커를 fork 한다.
+#   카탈로그 숫자 컬럼과 사주 테이블은 mmap 이라 워커들이 같은 페이지 캐시를 공유한다.
+#   환경변수: FATESCENT_DB (카탈로그 CSV), OPENAI_API_KEY, OPENAI_BASE_URL (스텁 서버 지정용),
+#            FATESCENT_RETRIEVER (brute / ivf — 후보 검색 인덱스, 비우면 정확 경로)
+# =========================================================
+import argparse
+import asyncio
+import contextlib
+import datetime
+import functools
+import os
+import signal
+import socket
+import sys
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+import engine
+from engine import (
+    TAG_TO_KEYWORDS, GENDER_FILTER_OPTIONS, BRAND_FILTER_OPTIONS,
+    safe_text, get_real_saju_elements, compute_perfume_element_vector, compute_compatibility_score,
+    load_catalogue_frame, load_saju_table, recommend_perfumes, build_retriever, _data_signature,
+    normalize_brand, normalize_text, PerfumeIndex, find_perfume_in_db, perfume_notes_messages,
+)
+
+try:
+    from openai import AsyncOpenAI
+    OPENAI_SDK_AVAILABLE = True
+except Exception:
+    OPENAI_SDK_AVAILABLE = False
+
+DATA_PATH = os.environ.get("FATESCENT_DB", engine.DATA_PATH)
+LLM_MODEL = "gpt-4o-mini"
+LLM_TIMEOUT_SEC = 40
+LLM_MAX_CONCURRENCY = 8
+REC_CACHE_SIZE = 4096
+RETRIEVER_KIND = os.environ.get("FATESCENT_RETRIEVER", "")
+MAX_K = 50
+
+# 프로세스 상태: 카탈로그/색인/추천 캐시는 fork 전에 부모에서, LLM 클라이언트는 워커 이벤트 루프에서 만든다
+STATE = {}
+
+
+class BadRequest(Exception):
+    pass
+
+
+def load_shared_state(data_path=DATA_PATH):
+    if "catalogue" in STATE:
+        return STATE
+    signature = _data_signature(data_path)
+    catalogue = load_catalogue_frame(data_path, signature)
+    if catalogue.empty:
+        raise SystemExit(f"catalogue not found or empty: {data_path}")
+    load_saju_table()
+    retriever = build_retriever(catalogue, RETRIEVER_KIND) if RETRIEVER_KIND else None
+    STATE.update(
+        catalogue=catalogue,
+        index=PerfumeIndex(catalogue["Brand"], catalogue["Name"]),
+        top_k=functools.lru_cache(maxsize=REC_CACHE_SIZE)(functools.partial(_top_k_records, catalogue, retriever)),
+    )
+    return STATE
+
+
+def _top_k_records(catalogue, retriever, weakest, strongest, pref_key, dislike_key, brand_filter_mode, gender_filter, k):
+    rec = recommend_perfumes(
+        catalogue, weakest, strongest, list(pref_key), list(dislike_key), brand_filter_mode, gender_filter, k=k, retriever=retriever
+    )
+    return tuple(
+        (safe_text(r.get("Brand", "")), safe_text(r.get("Name", "")), float(r.get("score", 0.0)),
+         compute_perfume_element_vector(safe_text(r.get("Notes", ""))))
+        for _, r in rec.iterrows()
+    )
+
+
+# =========================================================
+# 요청 파싱
+# =========================================================
+async def _json_body(request: Request) -> dict:
+    try:
+        body = await request.json()
+    except Exception:
+        raise BadRequest("request body must be JSON")
+    if not isinstance(body, dict):
+        raise BadRequest("request body must be a JSON object")
+    return body
+
+def _parse_birth(body: dict):
+    try:
+        birth = datetime.date.fromisoformat(safe_text(body.get("birth_date")))
+    except Exception:
+        raise BadRequest("birth_date must be YYYY-MM-DD")
+    raw_time = safe_text(body.get("birth_time"))
+    if not raw_time:
+        return birth, None, None
+    try:
+        hour, minute = (int(p) for p in raw_time.split(":"))
+    except Exception:
+        raise BadRequest("birth_time must be HH:MM")
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise BadRequest("birth_time must be HH:MM")
+    return birth, hour, minute
+
+def _analyse_saju(body: dict) -> dict:
+    birth, hour, minute = _parse_birth(body)
+    saju_name, counts, strongest, weakest, gapja = get_real_saju_elements(birth.year, birth.month, birth.day, hour, minute)
+    if saju_name is None:
+        raise BadRequest("saju calculation failed")
+    return {"saju_name": saju_name, "gapja": gapja, "counts": counts, "strongest": strongest, "weakest": weakest}
+
+def _parse_tags(body: dict, key: str) -> tuple:
+    tags = body.get(key) or []
+    # 리스트 · dict 같은 해시 불가 값은 멤버십 검사 전에 걸러야 500 대신 400 이 된다
+    if not isinstance(tags, list) or any(not isinstance(t, str) or t not in TAG_TO_KEYWORDS for t in tags):
+        raise BadRequest(f"{key} must be a list of: {', '.join(TAG_TO_KEYWORDS)}")
+    return tuple(sorted(set(tags)))
+
+def _parse_option(body: dict, key: str, options: list, default: str) -> str:
+    value = body.get(key) or default
+    if value not in options:
+        raise BadRequest(f"{key} must be one of: {', '.join(options)}")
+    return value
+
+
+# =========================================================
+# AI 노트 조회 (DB에 없는 향수)
+# =========================================================
+async def _ai_notes(brand: str, name: str) -> str:
+    """같은 향수를 동시에 여러 요청이 물으면 AI 호출 하나를 같이 기다린다."""
+    client = STATE.get("client")
+    if client is None:
+        return ""
+    key = (normalize_brand(brand), normalize_text(name))
+    inflight = STATE["inflight"]
+    if key not in inflight:
+        inflight[key] = asyncio.ensure_future(_fetch_ai_notes(client, brand, name))
+        inflight[key].add_done_callback(lambda _: inflight.pop(key, None))
+    return await asyncio.shield(inflight[key])
+
+async def _fetch_ai_notes(client, brand: str, name: str) -> str:
+    try:
+        async with STATE["sem"]:
+            resp = await asyncio.wait_for(
+                client.chat.completions.create(
+                    model=LLM_MODEL, messages=perfume_notes_messages(brand, name), temperature=0.3, max_tokens=150
+                ),
+                LLM_TIMEOUT_SEC,
+            )
+        return resp.choices[0].message.content.strip() if resp and resp.choices else ""
+    except Exception:
+        return ""
+
+
+# =========================================================
+# 엔드포인트
+# =========================================================
+async def healthz(request: Request):
+    return JSONResponse({"ok": True, "pid": os.getpid(), "rows": len(STATE["catalogue"]), "ai": STATE.get("client") is not None})
+
+async def saju(request: Request):
+    return JSONResponse(_analyse_saju(await _json_body(request)))
+
+async def recommend(request: Request):
+    body = await _json_body(request)
+    result = _analyse_saju(body)
+    try:
+        k = int(body.get("k", 3))
+    except Exception:
+        raise BadRequest("k must be an integer")
+    if not 1 <= k <= MAX_K:
+        raise BadRequest(f"k must be between 1 and {MAX_K}")
+
+    top = STATE["top_k"](
+        result["weakest"], result["strongest"],
+        _parse_tags(body, "pref_tags"), _parse_tags(body, "dislike_tags"),
+        _parse_option(body, "brand_filter", BRAND_FILTER_OPTIONS, BRAND_FILTER_OPTIONS[1]),
+        _parse_option(body, "gender_filter", GENDER_FILTER_OPTIONS, GENDER_FILTER_OPTIONS[0]),
+        k,
+    )
+    result["items"] = [
+        {
+            "rank": rank, "brand": brand, "name": name, "score": round(score, 6),
+            "compatibility": compute_compatibility_score(result["counts"], perf_vec, result["weakest"], result["strongest"]),
+        }
+        for rank, (brand, name, score, perf_vec) in enumerate(top, start=1)
+    ]
+    return JSONResponse(result)
+
+async def compatibility(request: Request):
+    body = await _json_body(request)
+    result = _analyse_saju(body)
+    brand, name = safe_text(body.get("brand")), safe_text(body.get("name"))
+    if not brand or not name:
+        raise BadRequest("brand and name are required")
+
+    row = find_perfume_in_db(STATE["catalogue"], brand, name, index=STATE["index"])
+    if row is not None:
+        source = safe_text(row.get("_source", "")) or "db"
+        brand, name = safe_text(row.get("Brand", brand)), safe_text(row.get("Name", name))
+        notes = safe_text(row.get("Notes", ""))
+    else:
+        notes = await _ai_notes(brand, name)
+        source = "ai" if notes else "none"
+        if notes:
+            STATE["index"].add(brand, name, {"Brand": brand, "Name": name, "Notes": notes, "_source": "ai"})
+
+    perf_vec = compute_perfume_element_vector(notes)
+    result["perfume"] = {"brand": brand, "name": name, "source": source, "notes": notes, "elements": perf_vec}
+    result["score"] = compute_compatibility_score(result["counts"], perf_vec, result["weakest"], result["strongest"])
+    return JSONResponse(result)
+
+async def _bad_request(request: Request, exc: BadRequest):
+    return JSONResponse({"error": str(exc)}, status_code=400)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    load_shared_state()
+    api_key = os.environ.get("OPENAI_API_KEY")
+    STATE["client"] = AsyncOpenAI(api_key=api_key) if OPENAI_SDK_AVAILABLE and api_key else None
+    STATE["sem"] = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    STATE["inflight"] = {}
+    yield
+    if STATE["client"] is not None:
+        await STATE["client"].close()
+
+
+app = Starlette(
+    routes=[
+        Route("/healthz", healthz),
+        Route("/v1/saju", saju, methods=["POST"]),
+        Route("/v1/recommend", recommend, methods=["POST"]),
+        Route("/v1/compatibility", compatibility, methods=["POST"]),
+    ],
+    exception_handlers={BadRequest: _bad_request},
+    lifespan=lifespan,
+)
+
+
+# =========================================================
+# 프리포크 실행
+# =========================================================
+def _run_worker(sock: socket.socket):
+    config = uvicorn.Config(app, fd=sock.fileno(), log_level="warning", access_log=False, lifespan="on")
+    uvicorn.Server(config).run()
+
+def serve(host: str, port: int, workers: int):
+    load_shared_state()  # fork 전에 올려 두면 워커는 복사 없이 같은 페이지를 쓴다
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    print(f"fate-scent service on http://{host}:{port} ({workers} workers, {len(STATE['catalogue']):,} perfumes)", file=sys.stderr)
+
+    if workers <= 1 or not hasattr(os, "fork"):
+        _run_worker(sock)
+        return
+
+    children = set()
+    stopping = False
+
+    def _spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                _run_worker(sock)
+            finally:
+                os._exit(0)
+        children.add(pid)
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+    for _ in range(workers):
+        _spawn()
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            _spawn()  # 죽은 워커는 다시 띄운다
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Fate Scent 추천 HTTP 서비스")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8000)
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = p.parse_args()
+    serve(args.host, args.port, args.workers)